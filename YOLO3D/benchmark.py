@@ -0,0 +1,543 @@
+"""
+Benchmark YOLO3D inference throughput per device and latency per stage
+
+Usage:
+    $ python benchmark.py --reg_weights weights/resnet18.pkl --devices cpu 0
+    $ python benchmark.py --reg_weights weights/resnet18.pkl --devices cpu --cpu_threads 8 --source eval/image_2
+    $ python benchmark.py --reg_weights weights/resnet18.pkl --devices 0 --pipeline
+    $ python benchmark.py --reg_weights weights/resnet18.pkl --devices cpu --keyframe_every 5 --source video_frames/
+    $ python benchmark.py --random_weights --devices cpu --stages --json benchmark.json  # offline, no weights needed
+    $ python benchmark.py --reg_weights weights/resnet18.pkl --devices cpu --reg_backend onnx
+    $ python benchmark.py --random_weights --devices cpu --compare_regressors resnet18 resnet18_pooled mobilenet_v3_small
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLO3D root directory
+if str(ROOT.parent) not in sys.path:
+    sys.path.append(str(ROOT.parent))  # add repository root to PATH
+
+from ultralytics import YOLO
+
+from YOLO3D import export_regressor
+from YOLO3D.inference import (
+    DETECTOR_WEIGHTS,
+    REG_BACKENDS,
+    colors,
+    create_roi_filter,
+    create_roi_prefilter,
+    detect2DFromCVImgs,
+    detect3DFromCVImg,
+    iter_frames,
+    model_factory,
+    regress_batch,
+    regressor_factory,
+    regressor_weights,
+    registry,
+    render3d,
+    setup_device,
+)
+from YOLO3D.keyframes import KeyframeDetector
+from YOLO3D.library.Calib import get_calibration
+from YOLO3D.library.Detections import Detections3D
+from YOLO3D.library.Math import calc_locations
+from YOLO3D.script import ClassAverages
+from YOLO3D.script.Dataset import format_imgs
+from YOLO3D.script.Model import REG_PRECISIONS
+from YOLO3D.library.Tracker import box_iou
+from YOLO3D.pipeline import Pipeline3D
+from YOLO3D.utils.general import LOGGER, print_args
+from YOLO3D.utils.torch_utils import time_sync
+
+try:
+    import thop  # for FLOPs computation
+except ImportError:
+    thop = None
+
+
+def load_frames(source=None, n=8, imgsz=(900, 1600)):
+    """
+    Read up to n frames from source (images, video, see iter_frames), or make
+    n synthetic nuScenes-sized frames
+    """
+    if source:
+        return [img for _, img in itertools.islice(iter_frames(source), n)]
+
+    rng = np.random.default_rng(0)
+    h, w = imgsz
+    # blocky noise, so the detector sees edges instead of pure noise
+    return [
+        cv2.resize(rng.integers(0, 255, (h // 8, w // 8, 3), dtype=np.uint8), (w, h), interpolation=cv2.INTER_NEAREST)
+        for _ in range(n)
+    ]
+
+
+def load_sequence(n=32, imgsz=(900, 1600), shift=(3, 1)):
+    """
+    Synthetic video: a window panning over a larger blocky canvas by shift px per frame
+    """
+    rng = np.random.default_rng(0)
+    h, w = imgsz
+    dx, dy = shift
+    H, W = h + abs(dy) * n, w + abs(dx) * n
+    canvas = cv2.resize(rng.integers(0, 255, (H // 8, W // 8, 3), dtype=np.uint8), (W, H), interpolation=cv2.INTER_NEAREST)
+    canvas = cv2.GaussianBlur(canvas, (5, 5), 1)
+    return [canvas[i * abs(dy) : i * abs(dy) + h, i * abs(dx) : i * abs(dx) + w].copy() for i in range(n)]
+
+
+def box_array(dets):
+    return np.array([[*det.box_2d[0], *det.box_2d[1]] for det in dets], dtype=float).reshape(-1, 4)
+
+
+def box_centers(boxes):
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+
+def random_weights(model_select, directory):
+    """
+    Save randomly initialized detector and regressor weights, for benchmarks
+    that must run offline. The detector is YOLO11n from its yaml with the
+    nuScenes class names. It finds nothing on its own, see synthetic_detections.
+
+    Returns:
+        (detector weights, regressor weights) paths
+    """
+    detector = YOLO("yolo11n.yaml")
+    classes = list(colors)
+    detector.model.names = {i: classes[i % len(classes)] for i in range(len(detector.model.names))}
+    weights = os.path.join(directory, "yolo11n_random.pt")
+    detector.save(weights)
+
+    torch.manual_seed(0)
+    regressor = regressor_factory[model_select](model=model_factory[model_select](pretrained=False))
+    reg_weights = os.path.join(directory, f"{model_select}_random.pkl")
+    torch.save({"model_state_dict": regressor.state_dict()}, reg_weights)
+    return weights, reg_weights
+
+
+def latency(t, items=1):
+    """
+    Latency percentiles (ms) and throughput (items/s) of an array of durations (s)
+    """
+    t = np.asarray(t, dtype=float)
+    return {
+        "runs": len(t),
+        "mean_ms": 1e3 * t.mean(),
+        "p50_ms": 1e3 * np.percentile(t, 50),
+        "p90_ms": 1e3 * np.percentile(t, 90),
+        "p99_ms": 1e3 * np.percentile(t, 99),
+        "throughput": items / t.mean(),
+    }
+
+
+def timed(fn, repeat, warmup=1):
+    """
+    Durations (s) of repeat calls of fn, after warmup untimed calls
+    """
+    for _ in range(warmup):
+        fn()
+    t = []
+    for _ in range(repeat):
+        t0 = time_sync()
+        fn()
+        t.append(time_sync() - t0)
+    return t
+
+
+def synthetic_boxes(n, imgsz, rng):
+    """
+    n random 2D boxes (N, 4) x1y1x2y2 in the lower two thirds of the image
+    """
+    h, w = imgsz
+    x1, y1 = rng.integers(0, w - 200, n), rng.integers(h // 3, h - 150, n)
+    return np.stack([x1, y1, x1 + rng.integers(16, 200, n), y1 + rng.integers(16, 150, n)], 1)
+
+
+def synthetic_detections(detector, n, seed=0):
+    """
+    Replace the output of a randomly initialized detector, which finds nothing,
+    with n fixed car boxes per image, so --random_weights times the crop,
+    regression and geometry stages too. Letterbox, forward pass and NMS still run.
+    """
+    car = next(i for i, name in detector.names.items() if name == "car")
+
+    def inject(predictor):
+        for r in predictor.results:
+            boxes = torch.as_tensor(synthetic_boxes(n, r.orig_shape, np.random.default_rng(seed)), dtype=torch.float32)
+            r.update(boxes=torch.cat([boxes, torch.tensor([[0.9, car]]).expand(n, 2)], 1))
+
+    detector.add_callback("on_predict_postprocess_end", inject)
+
+
+def synthetic_objects(n, calib, imgsz=(900, 1600), seed=0):
+    """
+    n random cars in front of the camera: 2D boxes, class average dimensions,
+    orientations and rays, with locations from calc_locations
+    """
+    rng = np.random.default_rng(seed)
+    w = imgsz[1]
+    x1, y1, x2, y2 = synthetic_boxes(n, imgsz, rng).T
+    boxes = [[(int(a), int(b)), (int(c), int(d))] for a, b, c, d in zip(x1, y1, x2, y2)]
+
+    dims = np.tile(ClassAverages.ClassAverages().get_item("car"), (n, 1))
+    alphas = rng.uniform(-np.pi, np.pi, n)
+    fovx = calib.fovx(w)
+    theta_rays = np.arctan(2 * ((x1 + x2) / 2 - w / 2) * np.tan(fovx / 2) / w)
+    locations, _ = calc_locations(dims, calib.P, boxes, alphas, theta_rays)
+    return boxes, dims, alphas, theta_rays, np.asarray(locations)
+
+
+def benchmark_stages(opt, device, frames):
+    """
+    Latency and throughput of every stage on its own: 2D detection per batch
+    size, then cropping, regression, calc_location, ROI filtering and
+    rendering per object count, on synthetic objects.
+
+    Returns:
+        list of dicts with stage, device, batch or objects and the latency stats
+    """
+    device = setup_device(device, opt.cpu_threads)
+    regressor = registry.regressor(opt.reg_weights, opt.model_select, device, opt.half, opt.reg_precision)
+    calib = get_calibration(opt.calib_file)
+    img = frames[0]
+    results = []
+
+    def add(stage, t, items, **kwargs):
+        results.append({"stage": stage, "device": str(device), **kwargs, **latency(t, items)})
+
+    for batch in opt.batch_sizes:
+        batch_frames = (frames * batch)[:batch]
+        t = timed(
+            lambda: detect2DFromCVImgs(opt.weights, batch_frames, device=device, half=opt.half, batch_size=batch),
+            opt.repeat,
+        )
+        add("detect2d", t, batch, batch=batch)
+
+    roi_filter = create_roi_filter(opt.roi_r, opt.roi_w, opt.roi_d)
+    roi_prefilter = create_roi_prefilter(opt.roi_r, opt.roi_w, opt.roi_d)
+    for n in opt.object_counts:
+        boxes, dims, alphas, theta_rays, locations = synthetic_objects(n, calib, img.shape[:2])
+        crops = format_imgs(img, boxes, device=device)
+        box_arr = np.array([[*b[0], *b[1]] for b in boxes], dtype=float).reshape(-1, 4)
+        detections = Detections3D.from_arrays(
+            np.zeros(n), np.ones(n), box_arr, dims, alphas, theta_rays, locations, names={0: "car"}, proj_matrix=calib.P
+        )
+
+        add("crop", timed(lambda: format_imgs(img, boxes, device=device), opt.repeat), n, objects=n)
+        add("regress", timed(lambda: regress_batch(regressor, crops), opt.repeat), n, objects=n)
+        add("calc_location", timed(lambda: calc_locations(dims, calib.P, boxes, alphas, theta_rays), opt.repeat), n, objects=n)
+        add("roi_filter", timed(lambda: [roi_filter(r, l) for r, l in zip(theta_rays, locations)], opt.repeat), n, objects=n)
+        add("roi_prefilter", timed(lambda: roi_prefilter(box_arr, dims[:, 0], calib, img.shape[1]), opt.repeat), n, objects=n)
+        add("render", timed(lambda: render3d(img.copy(), detections), opt.repeat), n, objects=n)
+
+    LOGGER.info(f"\n{'stage':>14}{'device':>8}{'batch':>7}{'objects':>9}{'p50 (ms)':>10}{'p90 (ms)':>10}{'p99 (ms)':>10}{'items/s':>11}")
+    for r in results:
+        LOGGER.info(
+            f"{r['stage']:>14}{r['device']:>8}{str(r.get('batch', '-')):>7}{str(r.get('objects', '-')):>9}"
+            f"{r['p50_ms']:>10.2f}{r['p90_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['throughput']:>11.1f}"
+        )
+    return results
+
+
+def benchmark_regressors(opt, device):
+    """
+    Parameters, FLOPs per object (thop) and latency of randomly initialized
+    regressor architectures on one device, at opt.objects crops per batch
+    """
+    device = setup_device(device, opt.cpu_threads)
+    crops = torch.randn(opt.objects, 3, 224, 224)
+    results = []
+    for model_select in opt.compare_regressors:
+        model = regressor_factory[model_select](model=model_factory[model_select](pretrained=False)).to(device).eval()
+        if device.type == "cpu":
+            model = model.to(memory_format=torch.channels_last)
+        params = sum(p.numel() for p in model.parameters())
+        heads = sum(p.numel() for head in (model.orientation, model.confidence, model.dimension) for p in head.parameters())
+        # None (n/a) when thop is missing or fails, rather than a made up 0 GFLOPs
+        flops = None
+        if thop is None:
+            LOGGER.warning(f"WARNING: {model_select}: thop is not installed, GFLOPs n/a")
+        else:
+            try:
+                im = torch.zeros(1, 3, 224, 224, device=device)
+                flops = thop.profile(deepcopy(model), inputs=(im,), verbose=False)[0] / 1e9 * 2  # GFLOPs
+            except Exception:
+                LOGGER.warning(f"WARNING: {model_select}: FLOPs profiling failed, GFLOPs n/a", exc_info=True)
+
+        t = timed(lambda: regress_batch(model, crops), opt.repeat)
+        stats = latency(t, opt.objects)
+        results.append(
+            {
+                "model_select": model_select,
+                "device": str(device),
+                "params_m": params / 1e6,
+                "head_params_m": heads / 1e6,
+                "gflops": flops,
+                "ms_per_object": stats["mean_ms"] / opt.objects,
+                **stats,
+            }
+        )
+
+    LOGGER.info(f"\n{'regressor':>20}{'device':>8}{'params (M)':>12}{'heads (M)':>11}{'GFLOPs':>8}{'ms/object':>11}{'objects/s':>11}")
+    for r in results:
+        gflops = "n/a" if r["gflops"] is None else f"{r['gflops']:.2f}"
+        LOGGER.info(
+            f"{r['model_select']:>20}{r['device']:>8}{r['params_m']:>12.1f}{r['head_params_m']:>11.2f}"
+            f"{gflops:>8}{r['ms_per_object']:>11.2f}{r['throughput']:>11.1f}"
+        )
+    return results
+
+
+def benchmark_keyframes(opt, device, frames):
+    """
+    2D boxes per frame from the detector vs KeyframeDetector: throughput, and
+    drift of the propagated boxes against the per-frame detections
+    """
+    device = setup_device(device, opt.cpu_threads)
+    detect2DFromCVImgs(opt.weights, frames[:1], device=device, half=opt.half)  # warmup
+
+    t0 = time_sync()
+    reference = [detect2DFromCVImgs(opt.weights, [frame], device=device, half=opt.half)[0] for frame in frames]
+    t_ref = time_sync() - t0
+
+    detector = KeyframeDetector(opt.weights, every=opt.keyframe_every, scene_change=opt.scene_change, device=device, half=opt.half)
+    t0 = time_sync()
+    keyed = [detector(frame) for frame in frames]
+    t_key = time_sync() - t0
+
+    # best match of every per-frame box among the keyframe mode boxes
+    ious, drift = [], []
+    for ref, key in zip(reference, keyed):
+        a, b = box_array(ref), box_array(key)
+        if len(a) == 0:
+            continue
+        iou = box_iou(a, b) if len(b) else np.zeros((len(a), 1))
+        best = iou.argmax(1)
+        ious.append(iou.max(1))
+        if len(b):
+            drift.append(np.linalg.norm(box_centers(a) - box_centers(b[best]), axis=1)[iou.max(1) > 0])
+    ious = np.concatenate(ious) if ious else np.zeros(0)
+    drift = np.concatenate(drift) if drift else np.zeros(0)
+
+    # random weights only give the fixed synthetic boxes (synthetic_detections), which do not
+    # follow the scene, so the accuracy metrics are None (N/A) then
+    accuracy = not opt.random_weights and len(ious) > 0
+    mean_iou = float(ious.mean()) if accuracy else None
+    recall_50 = float((ious > 0.5).mean()) if accuracy else None
+    median_drift = float(np.median(drift)) if accuracy and len(drift) else None
+
+    stats = detector.stats()
+    LOGGER.info(
+        f"\nKeyframes every {opt.keyframe_every} on {device}: {stats['keyframes']}/{stats['frames']} keyframes, "
+        f"2D FPS {len(frames) / t_ref:.2f} -> {len(frames) / t_key:.2f}, "
+        f"mean IoU {'N/A' if mean_iou is None else f'{mean_iou:.3f}'}, "
+        f"recall@0.5 {'N/A' if recall_50 is None else f'{recall_50:.3f}'}, "
+        f"median drift {'N/A' if median_drift is None else f'{median_drift:.1f} px'}"
+    )
+    return {
+        "device": str(device),
+        "fps_per_frame": len(frames) / t_ref,
+        "fps_keyframes": len(frames) / t_key,
+        "keyframe_rate": stats["keyframe_rate"],
+        "mean_iou": mean_iou,
+        "recall_50": recall_50,
+        "median_drift_px": median_drift,
+    }
+
+
+def benchmark_device(opt, device, frames):
+    """
+    Time the full pipeline (detect3DFromCVImg) and the regressor alone on one device
+    """
+    device = setup_device(device, opt.cpu_threads)
+    if opt.random_weights:
+        synthetic_detections(registry.detector(opt.weights, device, opt.half), opt.objects)
+    registry.warmup(opt.reg_weights, opt.model_select, weights=opt.weights, device=device, half=opt.half)
+
+    kwargs = dict(
+        reg_weights=opt.reg_weights,
+        model_select=opt.model_select,
+        calib_file=opt.calib_file,
+        show_result=False,
+        save_result=False,
+        output_path=None,
+        device=device,
+        half=opt.half,
+        cpu_threads=opt.cpu_threads,
+        weights=opt.weights,
+        reg_precision=opt.reg_precision,
+    )
+
+    # full pipeline, one frame at a time like main.py
+    t = []
+    for _ in range(opt.repeat):
+        for frame in frames:
+            t0 = time_sync()
+            detect3DFromCVImg(imgs=frame, **kwargs)
+            t.append(time_sync() - t0)
+    t = np.array(t)
+
+    # regressor alone, a typical busy frame worth of crops
+    regressor = registry.regressor(opt.reg_weights, opt.model_select, device, opt.half, opt.reg_precision)
+    crops = [torch.randn(3, 224, 224) for _ in range(opt.objects)]
+    tr = []
+    for _ in range(opt.repeat * len(frames)):
+        t0 = time_sync()
+        regress_batch(regressor, crops)
+        tr.append(time_sync() - t0)
+    tr = np.array(tr)
+
+    result = {
+        "device": str(device),
+        "threads": torch.get_num_threads() if device.type == "cpu" else None,
+        "frame_ms": 1e3 * np.median(t),
+        "frame_p90_ms": 1e3 * np.percentile(t, 90),
+        "frame_p99_ms": 1e3 * np.percentile(t, 99),
+        "fps": 1 / np.median(t),
+        "regressor_ms": 1e3 * np.median(tr),
+        "objects_per_s": opt.objects / np.median(tr),
+        "pipeline_fps": None,
+    }
+
+    # pipelined stages over the whole frame stream
+    if opt.pipeline:
+        pipeline = Pipeline3D(
+            opt.reg_weights,
+            opt.model_select,
+            opt.calib_file,
+            device=device,
+            half=opt.half,
+            reg_precision=opt.reg_precision,
+            weights=opt.weights,
+        )
+        for _ in pipeline.run(frames * opt.repeat):
+            pass
+        pipeline.report()
+        result["pipeline_fps"] = len(frames) * opt.repeat / pipeline.wall
+    return result
+
+
+def run(opt):
+    if opt.random_weights:
+        opt.weights, opt.reg_weights = random_weights(opt.model_select, tempfile.mkdtemp(prefix="yolo3d-bench-"))
+        if opt.reg_backend != "pytorch":
+            export_regressor.run(opt.reg_weights, opt.model_select, include=[opt.reg_backend])
+    opt.reg_weights = regressor_weights(opt.reg_weights, opt.reg_backend)
+
+    frames = load_frames(opt.source, opt.frames)
+    devices = []
+    for device in opt.devices:
+        if device != "cpu" and not torch.cuda.is_available():
+            LOGGER.warning(f"WARNING: CUDA unavailable, skipping device {device}")
+            continue
+        devices.append(device)
+
+    results = [benchmark_device(opt, device, frames) for device in devices]
+
+    LOGGER.info(
+        f"\n{'device':>10}{'threads':>9}{'frame (ms)':>12}{'p90 (ms)':>10}{'FPS':>8}{'pipelined FPS':>15}"
+        f"{'regressor (ms)':>16}{'objects/s':>11}"
+    )
+    for r in results:
+        pipeline_fps = f"{r['pipeline_fps']:.2f}" if r["pipeline_fps"] else "-"
+        LOGGER.info(
+            f"{r['device']:>10}{str(r['threads'] or '-'):>9}{r['frame_ms']:>12.1f}{r['frame_p90_ms']:>10.1f}"
+            f"{r['fps']:>8.2f}{pipeline_fps:>15}{r['regressor_ms']:>16.1f}{r['objects_per_s']:>11.1f}"
+        )
+
+    regressors = []
+    if opt.compare_regressors:
+        for device in devices:
+            regressors.extend(benchmark_regressors(opt, device))
+
+    stages = []
+    if opt.stages:
+        for device in devices:
+            stages.extend(benchmark_stages(opt, device, frames))
+
+    # keyframe mode needs consecutive frames
+    keyframes = []
+    if opt.keyframe_every > 1:
+        sequence = load_frames(opt.source, opt.sequence) if opt.source else load_sequence(opt.sequence)
+        keyframes = [benchmark_keyframes(opt, device, sequence) for device in devices]
+
+    if opt.json:
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+            "model_select": opt.model_select,
+            "reg_backend": opt.reg_backend,
+            "reg_precision": opt.reg_precision,
+            "random_weights": opt.random_weights,
+            "source": opt.source or "synthetic",
+            "frame_shape": list(frames[0].shape),
+            "devices": results,
+            "stages": stages,
+            "regressors": regressors,
+            "keyframes": keyframes,
+        }
+        with open(opt.json, "w") as f:
+            json.dump(report, f, indent=2, default=float)
+        LOGGER.info(f"Results saved to {opt.json}")
+    return results
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="YOLO3D device benchmark")
+    parser.add_argument("--reg_weights", type=str, default=ROOT / "weights/resnet18.pkl", help="Regressor model weights")
+    parser.add_argument("--model_select", type=str, default="resnet18", help="Regressor model list: resnet, resnet18, vgg11")
+    parser.add_argument("--reg_backend", type=str, default="pytorch", choices=list(REG_BACKENDS), help="Regressor backend")
+    parser.add_argument("--reg_precision", type=str, default="fp32", choices=REG_PRECISIONS, help="Regressor precision: fp32, int8 or fp16")
+    parser.add_argument("--weights", type=str, default=DETECTOR_WEIGHTS, help="2D detector weights")
+    parser.add_argument("--calib_file", type=str, default="nuscenes", help="Calibration file or 'nuscenes'")
+    parser.add_argument("--source", type=str, default="", help="Images or video, synthetic frames if empty")
+    parser.add_argument("--devices", nargs="+", default=["cpu", "0"], help="Devices to compare, i.e. cpu 0")
+    parser.add_argument("--cpu_threads", type=int, default=None, help="Intra-op threads on the CPU")
+    parser.add_argument("--half", action="store_true", help="FP16 on CUDA devices")
+    parser.add_argument("--frames", type=int, default=8, help="Number of frames")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the frames")
+    parser.add_argument("--objects", type=int, default=30, help="Crops per regressor batch")
+    parser.add_argument("--pipeline", action="store_true", help="Also time the pipelined mode (pipeline.py)")
+    parser.add_argument("--keyframe_every", type=int, default=0, help="Compare keyframe 2D detection every K frames")
+    parser.add_argument("--scene_change", type=float, default=20.0, help="Keyframe scene change threshold")
+    parser.add_argument("--sequence", type=int, default=32, help="Consecutive frames for the keyframe comparison")
+    parser.add_argument("--stages", action="store_true", help="Also time every stage on its own")
+    parser.add_argument("--batch_sizes", nargs="+", type=int, default=[1, 4, 8], help="2D detection batch sizes")
+    parser.add_argument("--object_counts", nargs="+", type=int, default=[1, 10, 30, 100], help="Objects per frame")
+    parser.add_argument("--roi_r", type=float, default=20.0, help="ROI radius for the ROI filter stages")
+    parser.add_argument("--roi_w", type=float, default=4.0, help="ROI width for the ROI filter stages")
+    parser.add_argument("--roi_d", type=float, default=50.0, help="ROI depth for the ROI filter stages")
+    parser.add_argument(
+        "--compare_regressors", nargs="*", default=[], help="Regressor architectures to compare, i.e. resnet18 mobilenet_v3_small"
+    )
+    parser.add_argument("--random_weights", action="store_true", help="Random detector and regressor, runs offline")
+    parser.add_argument("--json", type=str, default="", help="Save the results to this JSON file")
+    opt = parser.parse_args()
+    print_args(FILE.stem, opt)
+    return opt
+
+
+def main(opt):
+    run(opt)
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
@@ -0,0 +1,234 @@
+"""
+Accuracy and latency of the regressor per inference precision on a KITTI-format split
+
+Objects are cropped from the ground truth 2D boxes, so the comparison isolates
+the regressor: orientation and dimension errors against the labels, deviation
+from the FP32 outputs, regressor latency and weight size for every precision.
+
+The split needs image_2/*.png and label_2/*.txt in the KITTI object format.
+
+Usage:
+    $ python eval_regressor.py --data dataset/KITTI/validation --reg_weights weights/resnet18.pkl --precisions fp32 int8
+    $ python eval_regressor.py --data dataset/KITTI/validation --device 0 --precisions fp32 fp16 --json eval.json
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLO3D root directory
+if str(ROOT.parent) not in sys.path:
+    sys.path.append(str(ROOT.parent))  # add repository root to PATH
+
+from YOLO3D.inference import decode_regression, regress_batch, registry, setup_device
+from YOLO3D.script import ClassAverages
+from YOLO3D.script.Dataset import format_imgs, generate_bins
+from YOLO3D.script.Model import REG_PRECISIONS
+from YOLO3D.utils.general import LOGGER, print_args
+from YOLO3D.utils.torch_utils import time_sync
+
+# KITTI classes evaluated, mapped to the classes of class_averages.json
+KITTI_CLASSES = {
+    "car": "car",
+    "van": "car",
+    "truck": "truck",
+    "pedestrian": "pedestrian",
+    "person_sitting": "pedestrian",
+    "cyclist": "bicycle",
+}
+
+
+def read_kitti_labels(label_file, min_height=10):
+    """
+    Objects of one KITTI label file: class, 2D box, alpha and dimensions
+    (height, width, length). Unmapped classes and boxes lower than min_height
+    pixels are skipped.
+    """
+    objects = []
+    with open(label_file) as f:
+        for line in f.read().splitlines():
+            line = line.split(" ")
+            class_ = KITTI_CLASSES.get(line[0].lower())
+            if class_ is None:
+                continue
+            x1, y1, x2, y2 = (int(round(float(v))) for v in line[4:8])
+            if y2 - y1 < min_height:
+                continue
+            objects.append(
+                {
+                    "class": class_,
+                    "box_2d": [(x1, y1), (x2, y2)],
+                    "alpha": float(line[3]),
+                    "dim": np.array([float(v) for v in line[8:11]]),
+                }
+            )
+    return objects
+
+
+def iter_kitti_split(path, max_images=None):
+    """
+    (image, objects) of every labelled image of a KITTI-format split
+    """
+    labels = sorted(glob.glob(os.path.join(str(path), "label_2", "*.txt")))[:max_images]
+    for label_file in labels:
+        objects = read_kitti_labels(label_file)
+        if not objects:
+            continue
+        img = cv2.imread(os.path.join(str(path), "image_2", Path(label_file).stem + ".png"))
+        if img is not None:
+            yield img, objects
+
+
+def weight_size(model):
+    """
+    Serialized state dict size in MB, also right for quantized modules
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / 1e6
+
+
+def angle_error(a, b):
+    """
+    Absolute difference of two angles, wrapped to [0, pi]
+    """
+    return np.abs((a - b + np.pi) % (2 * np.pi) - np.pi)
+
+
+@torch.inference_mode()
+def evaluate(regressors, split, averages=None, angle_bins=None, max_batch=None):
+    """
+    Run every regressor over every object of the split.
+
+    Args:
+        regressors (dict): Name -> regressor, the first one is the reference
+            for the deviation metrics.
+        split (Iterable): (image, objects) pairs, see iter_kitti_split.
+
+    Returns:
+        dict name -> metrics
+    """
+    averages = averages or ClassAverages.ClassAverages()
+    angle_bins = generate_bins(2) if angle_bins is None else angle_bins
+    names = list(regressors)
+    alphas, dims, times = {n: [] for n in names}, {n: [] for n in names}, {n: 0.0 for n in names}
+    gt_alpha, gt_dim = [], []
+
+    for img, objects in split:
+        classes = [obj["class"] for obj in objects]
+        gt_alpha.extend(obj["alpha"] for obj in objects)
+        gt_dim.extend(obj["dim"] for obj in objects)
+        for name, regressor in regressors.items():
+            crops = format_imgs(img, [obj["box_2d"] for obj in objects])
+            t0 = time_sync()
+            orient, conf, dim = regress_batch(regressor, crops, max_batch)
+            times[name] += time_sync() - t0
+            alpha, dim = decode_regression(orient, conf, dim, classes, averages, angle_bins)
+            alphas[name].append(alpha)
+            dims[name].append(dim)
+
+    gt_alpha, gt_dim = np.array(gt_alpha), np.array(gt_dim).reshape(-1, 3)
+    n = len(gt_alpha)
+    reference = names[0]
+    ref_alpha = np.concatenate(alphas[reference]) if n else np.zeros(0)
+    ref_dim = np.concatenate(dims[reference]) if n else np.zeros((0, 3))
+
+    results = {}
+    for name in names:
+        alpha = np.concatenate(alphas[name]) if n else np.zeros(0)
+        dim = np.concatenate(dims[name]) if n else np.zeros((0, 3))
+        err = angle_error(alpha, gt_alpha)
+        results[name] = {
+            "objects": n,
+            "alpha_error_deg": float(np.degrees(err.mean())) if n else 0.0,
+            "orientation_similarity": float(((1 + np.cos(err)) / 2).mean()) if n else 0.0,
+            "dim_mae_m": float(np.abs(dim - gt_dim).mean()) if n else 0.0,
+            f"alpha_vs_{reference}_deg": float(np.degrees(angle_error(alpha, ref_alpha).max())) if n else 0.0,
+            f"dim_vs_{reference}_m": float(np.abs(dim - ref_dim).max()) if n else 0.0,
+            "ms_per_object": 1e3 * times[name] / n if n else 0.0,
+            "size_mb": weight_size(regressors[name]),
+        }
+    return results
+
+
+def run(
+    data,
+    reg_weights,
+    model_select="resnet18",
+    precisions=("fp32", "int8"),
+    device="cpu",
+    cpu_threads=None,
+    max_images=None,
+    max_batch=None,
+    json_file="",
+):
+    device = setup_device(device, cpu_threads)
+    regressors = {p: registry.regressor(reg_weights, model_select, device, precision=p) for p in precisions}
+
+    # warmup on one frame worth of crops, so lazy initialization is not timed
+    for regressor in regressors.values():
+        regress_batch(regressor, torch.zeros(4, 3, 224, 224))
+
+    results = evaluate(regressors, iter_kitti_split(data, max_images), max_batch=max_batch)
+
+    reference = precisions[0]
+    LOGGER.info(
+        f"\n{'precision':>10}{'objects':>9}{'alpha err (deg)':>17}{'OS':>7}{'dim MAE (m)':>13}"
+        f"{'max dalpha (deg)':>18}{'max ddim (m)':>14}{'ms/object':>11}{'size (MB)':>11}"
+    )
+    for name, r in results.items():
+        LOGGER.info(
+            f"{name:>10}{r['objects']:>9}{r['alpha_error_deg']:>17.2f}{r['orientation_similarity']:>7.3f}"
+            f"{r['dim_mae_m']:>13.3f}{r[f'alpha_vs_{reference}_deg']:>18.3f}{r[f'dim_vs_{reference}_m']:>14.4f}"
+            f"{r['ms_per_object']:>11.2f}{r['size_mb']:>11.1f}"
+        )
+
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump({"device": str(device), "reg_weights": str(reg_weights), "results": results}, f, indent=2)
+        LOGGER.info(f"Results saved to {json_file}")
+    return results
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Regressor precision evaluation")
+    parser.add_argument("--data", type=str, default=ROOT / "dataset/KITTI/validation", help="KITTI-format split")
+    parser.add_argument("--reg_weights", type=str, default=ROOT / "weights/resnet18.pkl", help="Regressor model weights")
+    parser.add_argument("--model_select", type=str, default="resnet18", help="Regressor model list: resnet, resnet18, vgg11")
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "int8"], choices=REG_PRECISIONS, help="First is the reference")
+    parser.add_argument("--device", default="cpu", help="cuda device, i.e. 0 or cpu")
+    parser.add_argument("--cpu_threads", type=int, default=None, help="Intra-op threads on the CPU")
+    parser.add_argument("--max_images", type=int, default=None, help="Evaluate at most this many images")
+    parser.add_argument("--max_batch", type=int, default=None, help="Regressor batch size limit")
+    parser.add_argument("--json", type=str, default="", help="Save the results to this JSON file")
+    opt = parser.parse_args()
+    print_args(FILE.stem, opt)
+    return opt
+
+
+def main(opt):
+    run(
+        opt.data,
+        opt.reg_weights,
+        opt.model_select,
+        opt.precisions,
+        opt.device,
+        opt.cpu_threads,
+        opt.max_images,
+        opt.max_batch,
+        opt.json,
+    )
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
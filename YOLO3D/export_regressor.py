@@ -0,0 +1,135 @@
+"""
+Export the orientation-dimension regressor to ONNX and TorchScript
+
+BatchNorm layers are folded into the preceding convolutions and the batch
+dimension stays dynamic, so the exported model takes all crops of a frame at
+once. The exported file is written next to the weights and is picked up by
+inference with --reg_backend onnx / torchscript.
+
+Usage:
+    $ python export_regressor.py --reg_weights weights/resnet18.pkl --model_select resnet18 --include onnx torchscript
+    $ python inference.py --reg_weights weights/resnet18.pkl --model_select resnet18 --reg_backend onnx
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLO3D root directory
+if str(ROOT.parent) not in sys.path:
+    sys.path.append(str(ROOT.parent))  # add repository root to PATH
+
+from YOLO3D.inference import REG_BACKENDS, load_regressor
+from YOLO3D.script.Model import RegressorMultiBackend, fuse_regressor
+from YOLO3D.utils.general import LOGGER, check_requirements, print_args
+
+OUTPUT_NAMES = ["orientation", "confidence", "dimension"]
+
+
+def export_torchscript(model, im, file, meta):
+    LOGGER.info(f"\nTorchScript: starting export with torch {torch.__version__}...")
+    ts = torch.jit.trace(model, im, strict=False)
+    extra_files = {"config.txt": json.dumps(meta)}  # model metadata, read by RegressorMultiBackend
+    ts.save(str(file), _extra_files=extra_files)
+    return file
+
+
+def export_onnx(model, im, file, meta, opset=17, simplify=False):
+    check_requirements(("onnx",))
+    import onnx
+
+    LOGGER.info(f"\nONNX: starting export with onnx {onnx.__version__}...")
+    dynamic = {"images": {0: "batch"}, **{name: {0: "batch"} for name in OUTPUT_NAMES}}
+    torch.onnx.export(
+        model,
+        im,
+        str(file),
+        dynamo=False,
+        opset_version=opset,
+        do_constant_folding=True,
+        input_names=["images"],
+        output_names=OUTPUT_NAMES,
+        dynamic_axes=dynamic,
+    )
+
+    # checks and metadata
+    model_onnx = onnx.load(str(file))
+    onnx.checker.check_model(model_onnx)
+    for k, v in meta.items():
+        entry = model_onnx.metadata_props.add()
+        entry.key, entry.value = k, str(v)
+
+    if simplify:
+        check_requirements(("onnx-simplifier",))
+        import onnxsim
+
+        model_onnx, check = onnxsim.simplify(model_onnx)
+        assert check, "assert check failed"
+    onnx.save(model_onnx, str(file))
+    return file
+
+
+@torch.no_grad()
+def check_parity(model, file, batch=4, atol=1e-4):
+    """
+    Max absolute difference of every output of the exported model to the eager
+    one, on a random batch of another size than the export batch
+    """
+    exported = RegressorMultiBackend(file)
+    im = torch.randn(batch, 3, 224, 224)
+    errors = [float((a - b).abs().max()) for a, b in zip(model(im), exported(im))]
+    LOGGER.info(f"{file}: max abs error {', '.join(f'{n} {e:.2e}' for n, e in zip(OUTPUT_NAMES, errors))}")
+    if max(errors) > atol:
+        LOGGER.warning(f"WARNING: {file} differs from the eager regressor by up to {max(errors):.2e}")
+    return errors
+
+
+@torch.no_grad()
+def run(reg_weights, model_select="resnet18", include=("onnx",), opset=17, simplify=False, check=True):
+    # eager model on the CPU in FP32, the exported files are device independent
+    model = load_regressor(reg_weights, model_select, "cpu")
+    reference = load_regressor(reg_weights, model_select, "cpu") if check else None
+    model = fuse_regressor(model)
+    meta = {"bins": model.bins, "model_select": model_select}
+    im = torch.zeros(1, 3, 224, 224)
+
+    files = []
+    for backend in include:
+        file = Path(reg_weights).with_suffix(REG_BACKENDS[backend])
+        if backend == "torchscript":
+            files.append(export_torchscript(model, im, file, meta))
+        elif backend == "onnx":
+            files.append(export_onnx(model, im, file, meta, opset, simplify))
+        else:
+            raise ValueError(f"Unknown export format {backend}, expected onnx or torchscript")
+        if check:
+            check_parity(reference, file)
+
+    LOGGER.info(f"\nExport complete, saved {', '.join(str(f) for f in files)}")
+    return files
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="Regressor export")
+    parser.add_argument("--reg_weights", type=str, default=ROOT / "weights/resnet18.pkl", help="Regressor model weights")
+    parser.add_argument("--model_select", type=str, default="resnet18", help="Regressor model list: resnet, resnet18, vgg11")
+    parser.add_argument("--include", nargs="+", default=["onnx"], help="onnx, torchscript")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--simplify", action="store_true", help="ONNX: simplify model")
+    parser.add_argument("--no_check", action="store_true", help="Skip the parity check against the eager model")
+    opt = parser.parse_args()
+    print_args(FILE.stem, opt)
+    return opt
+
+
+def main(opt):
+    run(opt.reg_weights, opt.model_select, opt.include, opt.opset, opt.simplify, check=not opt.no_check)
+
+
+if __name__ == "__main__":
+    opt = parse_opt()
+    main(opt)
@@ -3,15 +3,18 @@
 Run inference on images, videos, directories, streams, etc.
 """
 
-from YOLO3D.script.Model import ResNet, ResNet18, VGG11
+from YOLO3D.script.Model import ResNet, ResNet18, VGG11, ResNet18Pooled, MobileNetV3, REG_PRECISIONS, RegressorMultiBackend, quantize_regressor
 from YOLO3D.script import Model, ClassAverages
 from YOLO3D.library.Plotting import *
 from YOLO3D.library.Math import *
-from YOLO3D.script.Dataset import generate_bins, DetectedObject
+from YOLO3D.library.Calib import get_calibration
+from YOLO3D.library.Detections import Detections3D
+from YOLO3D.library.Tracker import RegressionTracker, box_iou
+from YOLO3D.script.Dataset import generate_bins, DetectedObject, format_imgs
 import numpy as np
-from torchvision.models import resnet18
+from torchvision.models import resnet18, vgg11, mobilenet_v3_small, mobilenet_v3_large
 import torch.nn as nn
-from YOLO3D.utils.torch_utils import select_device, time_sync
+from YOLO3D.utils.torch_utils import time_sync
 from YOLO3D.utils.general import (
     LOGGER,
     check_img_size,
@@ -20,32 +23,53 @@ from YOLO3D.utils.general import (
     print_args,
     scale_coords,
 )
-from YOLO3D.utils.datasets import LoadImages
+from YOLO3D.utils.datasets import LoadImages, LoadStreams
 import argparse
+import functools
 import os
 import sys
 from pathlib import Path
 import glob
+import queue
 
 import cv2
 import torch
 import subprocess
+import threading
+import time
 from ultralytics import YOLO
 
+IMPORT_TIME = time.time()  # reference point for the import-to-first-inference report
+
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[0]  # YOLOv5 root directory
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))  # add ROOT to PATH
 ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 
+# default 2D detector weights
+DETECTOR_WEIGHTS = FILE.parents[0] / "yolo11n_nuimages.pt"
 
-# model factory to choose model
+# model factory to choose model, backbones are only built for the selected model
 model_factory = {
-    "resnet": resnet18(pretrained=True),
-    "resnet18": resnet18(pretrained=True),
-    # 'vgg11': vgg11(pretrained=True)
+    "resnet": resnet18,
+    "resnet18": resnet18,
+    "vgg11": vgg11,
+    "resnet18_pooled": resnet18,
+    "mobilenet_v3_small": mobilenet_v3_small,
+    "mobilenet_v3_large": mobilenet_v3_large,
+}
+regressor_factory = {
+    "resnet": ResNet,
+    "resnet18": ResNet18,
+    "vgg11": VGG11,
+    "resnet18_pooled": ResNet18Pooled,
+    "mobilenet_v3_small": MobileNetV3,
+    "mobilenet_v3_large": MobileNetV3,
 }
-regressor_factory = {"resnet": ResNet, "resnet18": ResNet18, "vgg11": VGG11}
+
+# regressor weights suffix per backend, see export_regressor.py
+REG_BACKENDS = {"pytorch": ".pkl", "onnx": ".onnx", "torchscript": ".torchscript"}
 
 colors = {
     "pedestrian": (180, 119, 31),  # Blue
@@ -59,130 +83,632 @@ colors = {
 }
 
 
+@functools.lru_cache(maxsize=None)
+def cached_select_device(device=""):
+    """
+    torch.device for a device spec, resolved once. Unlike select_device() this
+    does not set CUDA_VISIBLE_DEVICES: a CPU-only caller would hide the GPU from
+    every model loaded later in the same process.
+    """
+    device = str(device).strip().lower().replace("cuda:", "")
+    if device == "cpu" or (not device and not torch.cuda.is_available()):
+        resolved = torch.device("cpu")
+    else:
+        index = int(device.split(",")[0]) if device else 0
+        assert index < torch.cuda.device_count(), f"CUDA unavailable, invalid device {device} requested"
+        resolved = torch.device("cuda", index)
+    name = torch.cuda.get_device_name(resolved) if resolved.type == "cuda" else "CPU"
+    LOGGER.info(f"YOLO3D: {resolved} ({name}), torch {torch.__version__}")
+    return resolved
+
+
+def setup_device(device="", cpu_threads=None):
+    """
+    Resolve a device spec ('', 0, '0', 'cpu', torch.device) and apply the CPU
+    tuning: a fixed intra-op thread count for torch when running on the CPU.
+    """
+    if isinstance(device, torch.device):
+        device = "cpu" if device.type == "cpu" else str(device.index or 0)
+    device = cached_select_device(str(device))
+    if device.type == "cpu" and cpu_threads:
+        torch.set_num_threads(cpu_threads)
+    return device
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the 2D detector and the 3D regressor, so weights are
+    deserialized and moved to the device once instead of on every call.
+    Models are keyed by weights path, device and precision.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self.lock:
+            if key not in self.models:
+                self.models[key] = loader()
+            return self.models[key]
+
+    def detector(self, weights=DETECTOR_WEIGHTS, device="", half=False):
+        weights = os.path.abspath(str(weights))
+        device = setup_device(device)
+        half &= device.type != "cpu"  # half precision only supported on CUDA
+
+        def load():
+            model = YOLO(weights)
+            # predict() picks these up as defaults on every call
+            model.overrides["device"] = str(device)
+            model.overrides["half"] = half
+            return model
+
+        return self.get(("detector", weights, str(device), half), load)
+
+    def regressor(self, reg_weights, model_select, device="", half=False, precision="fp32"):
+        """
+        Args:
+            precision (str): fp32, int8 (dynamic INT8 Linear layers, CPU) or
+                fp16 (autocast, CUDA), see quantize_regressor. Exported
+                regressors always run as exported.
+        """
+        reg_weights = os.path.abspath(str(reg_weights))
+        device = setup_device(device)
+        half &= device.type != "cpu"  # half precision only supported on CUDA
+
+        def load():
+            if Path(reg_weights).suffix.lower() in (".onnx", ".torchscript"):
+                return RegressorMultiBackend(reg_weights, device)
+
+            regressor = load_regressor(reg_weights, model_select, device)
+            if half and precision == "fp32":
+                regressor.half()
+            if device.type == "cpu":
+                # NHWC convolutions are considerably faster with oneDNN on the CPU
+                regressor = regressor.to(memory_format=torch.channels_last)
+            return quantize_regressor(regressor, precision, device)
+
+        return self.get(("regressor", reg_weights, model_select, str(device), half, precision), load)
+
+    @torch.inference_mode()
+    def warmup(self, reg_weights, model_select, weights=DETECTOR_WEIGHTS, device="", half=False, imgsz=640):
+        """
+        Load both models and run one dummy forward pass through each, so the
+        first real frame does not pay for lazy CUDA/cuDNN initialization.
+        """
+        detector = self.detector(weights, device, half)
+        detector(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+
+        regressor = self.regressor(reg_weights, model_select, device, half)
+        reg_device, reg_dtype = regressor_io(regressor)
+        regressor(torch.zeros([1, 3, 224, 224], device=reg_device, dtype=reg_dtype))
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+
+def load_regressor(reg_weights, model_select, device="cpu"):
+    """
+    Eager regressor from a training checkpoint, in eval mode on device
+    """
+    # ImageNet weights would be overwritten by the checkpoint, skip the download
+    base_model = model_factory[model_select](pretrained=False)
+    regressor = regressor_factory[model_select](model=base_model).to(device)
+
+    # load weight straight onto the target device
+    checkpoint = torch.load(reg_weights, map_location=device, weights_only=True)
+    regressor.load_state_dict(checkpoint["model_state_dict"])
+    return regressor.eval()
+
+
+def regressor_weights(reg_weights, backend="pytorch"):
+    """
+    Weights of the given backend next to the training checkpoint, i.e.
+    weights/resnet18.pkl -> weights/resnet18.onnx for backend onnx
+    """
+    if backend not in REG_BACKENDS:
+        raise ValueError(f"Unknown regressor backend {backend}, expected one of {list(REG_BACKENDS)}")
+    if backend == "pytorch":
+        return reg_weights
+    return str(Path(reg_weights).with_suffix(REG_BACKENDS[backend]))
+
+
+def regressor_io(regressor):
+    """
+    Device and dtype of the regressor input, for eager and exported regressors
+    """
+    if isinstance(regressor, RegressorMultiBackend):
+        return regressor.device, regressor.dtype
+    param = next(regressor.parameters())
+    return param.device, param.dtype
+
+
+registry = ModelRegistry()
+first_inference_time = None
+
+
+def log_first_inference():
+    """
+    Report once per process how long it took from importing this module to the
+    first finished inference.
+    """
+    global first_inference_time
+    if first_inference_time is None:
+        first_inference_time = time.time() - IMPORT_TIME
+        LOGGER.info(f"YOLO3D: {first_inference_time:.2f}s from import to first inference")
+
+
 class Bbox:
-    def __init__(self, box_2d, class_):
+    def __init__(self, box_2d, class_, score=1.0, class_id=-1):
         self.box_2d = box_2d
         self.detected_class = class_
+        self.score = score
+        self.class_id = class_id
 
 
-def detect3d(
+@torch.inference_mode()
+def regress_batch(regressor, crops, max_batch=None):
+    """
+    Run the regressor once over every crop of a frame instead of once per object.
+
+    Args:
+        regressor (nn.Module): ResNet, ResNet18 or VGG11 regressor.
+        crops (Tensor | list[Tensor]): Normalized (N, 3, 224, 224) batch from
+            format_imgs, or a list of (3, 224, 224) crops.
+        max_batch (int): Optional upper bound on the forward batch size.
+
+    Returns:
+        orient (N, bins, 2), conf (N, bins) and dim (N, 3) numpy arrays.
+    """
+    device, dtype = regressor_io(regressor)
+    n = len(crops)
+    bins = regressor.bins
+    if n == 0:
+        return np.zeros((0, bins, 2), np.float32), np.zeros((0, bins), np.float32), np.zeros((0, 3), np.float32)
+
+    if isinstance(crops, torch.Tensor):
+        batch = crops.to(device, dtype)
+    else:
+        # gather crops on the host, then one transfer to the device
+        batch = torch.empty([n, 3, 224, 224], dtype=dtype, pin_memory=device.type == "cuda")
+        for i, crop in enumerate(crops):
+            batch[i] = crop
+        batch = batch.to(device, non_blocking=True)
+    if device.type == "cpu" and not isinstance(regressor, RegressorMultiBackend):
+        batch = batch.contiguous(memory_format=torch.channels_last)
+
+    step = max_batch or n
+    orient, conf, dim = [], [], []
+    for i in range(0, n, step):
+        [o, c, d] = regressor(batch[i : i + step])
+        orient.append(o)
+        conf.append(c)
+        dim.append(d)
+
+    # single device sync per output
+    orient = torch.cat(orient).float().cpu().numpy()
+    conf = torch.cat(conf).float().cpu().numpy()
+    dim = torch.cat(dim).float().cpu().numpy()
+    return orient, conf, dim
+
+
+def decode_regression(orient, conf, dim, classes, averages, angle_bins):
+    """
+    Vectorized decoding of the regressor outputs into local orientation (alpha)
+    and absolute dimensions for N objects.
+    """
+    n = len(classes)
+    if n == 0:
+        return np.zeros(0), np.zeros((0, 3))
+
+    dim = dim + np.array([averages.get_item(class_) for class_ in classes])
+
+    argmax = np.argmax(conf, axis=1)
+    orient = orient[np.arange(n), argmax]
+    alpha = np.arctan2(orient[:, 1], orient[:, 0])
+    alpha += angle_bins[argmax]
+    alpha -= np.pi
+
+    return alpha, dim
+
+
+def estimate3d(
+    img,
+    dets,
+    calib_file,
+    regressor,
+    averages,
+    angle_bins,
+    names=None,
+    device="cpu",
+    reg_max_batch=None,
+    prefilter=None,
+    tracker=None,
+):
+    """
+    Lift the 2D detections of one frame to 3D, without drawing anything.
+
+    Args:
+        img (np.ndarray): BGR frame the detections come from.
+        dets (list[Bbox]): 2D detections of the frame.
+        calib_file: Calibration file, 'nuscenes' or a nuScenes calibrated_sensor record.
+        regressor (nn.Module): Regressor from the registry.
+        averages (ClassAverages): Class dimension averages.
+        angle_bins (np.ndarray): Orientation bins, see generate_bins.
+        names (dict): Detector class names, kept with the detections.
+        prefilter (callable): Optional ROI pre-filter from create_roi_prefilter.
+        tracker (RegressionTracker): Optional tracker of this camera stream, lets
+            objects that barely moved skip the regressor.
+
+    Returns:
+        Detections3D of the recognized classes, with location_ego filled when
+        calib_file carries the camera extrinsics.
+    """
+    return estimate3d_batch(
+        [img],
+        [dets],
+        [calib_file],
+        regressor,
+        averages,
+        angle_bins,
+        names=names,
+        device=device,
+        reg_max_batch=reg_max_batch,
+        prefilter=prefilter,
+        trackers=[tracker],
+    )[0]
+
+
+def estimate3d_batch(
+    imgs,
+    dets_list,
+    calib_files,
+    regressor,
+    averages,
+    angle_bins,
+    names=None,
+    device="cpu",
+    reg_max_batch=None,
+    prefilter=None,
+    trackers=None,
+):
+    """
+    estimate3d for several images at once, i.e. the six cameras of a nuScenes
+    sample: the crops of all images go through one regressor pass and the
+    locations of all objects are solved together.
+
+    Args:
+        imgs (list[np.ndarray]): BGR images.
+        dets_list (list[list[Bbox]]): 2D detections per image.
+        calib_files (list): Calibration per image.
+        trackers (list[RegressionTracker]): Optional tracker (or None) per image.
+            A tracker must not appear twice, its frames have to come in order.
+
+    Returns:
+        A list with one Detections3D per image.
+    """
+    trackers = trackers or [None] * len(imgs)
+
+    frames = []
+    crops = []
+    for img, dets, calib_file, tracker in zip(imgs, dets_list, calib_files, trackers):
+        # parsed once per calibration source, see get_calibration
+        calib = get_calibration(calib_file)
+
+        dets = [det for det in dets if averages.recognized_class(det.detected_class)]
+
+        # drop objects that cannot be in the ROI before spending crops and regressor on them
+        if prefilter is not None and len(dets):
+            keep = prefilter(
+                [[*det.box_2d[0], *det.box_2d[1]] for det in dets],
+                [averages.get_item(det.detected_class)[0] for det in dets],
+                calib,
+                img.shape[1],
+            )
+            if not keep.all():
+                LOGGER.info(f"ROI prefilter: skipped {int((~keep).sum())} of {len(dets)} objects")
+                dets = [det for det, k in zip(dets, keep) if k]
+
+        # no crop here, a failure is a bug and is raised instead of dropping the object
+        objects = [(det, DetectedObject(img, det.detected_class, det.box_2d, calib, crop=False)) for det in dets]
+
+        # tracked objects whose box barely moved reuse their last regression
+        track = None
+        if tracker is not None:
+            track, skip = tracker.assign(
+                [[*det.box_2d[0], *det.box_2d[1]] for det, _ in objects], [det.class_id for det, _ in objects]
+            )
+            regressed = ~skip
+        else:
+            regressed = np.ones(len(objects), dtype=bool)
+
+        # crop all objects on the device
+        crops.append(format_imgs(img, [det.box_2d for (det, _), r in zip(objects, regressed) if r], device=device))
+        frames.append((calib, objects, tracker, track, regressed))
+
+    # predict orient, conf, and dim of all images at once
+    [orient, conf, dim] = regress_batch(regressor, torch.cat(crops), max_batch=reg_max_batch)
+    classes = [det.detected_class for _, objects, _, _, regressed in frames for (det, _), r in zip(objects, regressed) if r]
+    alphas, dims = decode_regression(orient, conf, dim, classes, averages, angle_bins)
+
+    # back to the images, merged with the tracker caches
+    splits = np.cumsum([regressed.sum() for *_, regressed in frames])[:-1]
+    results = []
+    for (calib, objects, tracker, track, regressed), alpha, dim in zip(
+        frames, np.split(alphas, splits), np.split(dims, splits)
+    ):
+        track_ids = None
+        if tracker is not None:
+            alpha, dim, track_ids = tracker.update(track, regressed, alpha, dim)
+        results.append((alpha, dim, track_ids))
+
+    # the math! locations of all objects in one batched solve
+    objects = [obj for _, objects, *_ in frames for obj in objects]
+    alphas = np.concatenate([alpha for alpha, _, _ in results]) if results else np.zeros(0)
+    dims = np.concatenate([dim for _, dim, _ in results]).reshape(-1, 3) if results else np.zeros((0, 3))
+    theta_rays = np.array([obj.theta_ray for _, obj in objects])
+    proj_matrices = np.array([calib.P for calib, objects, *_ in frames for _ in objects]).reshape(-1, 3, 4)
+    locations, _ = calc_locations(dims, proj_matrices, [det.box_2d for det, _ in objects], alphas, theta_rays)
+
+    detections_list = []
+    splits = np.cumsum([len(objects) for _, objects, *_ in frames])[:-1]
+    for (calib, objects, *_), (alpha, dim, track_ids), theta_ray, location in zip(
+        frames, results, np.split(theta_rays, splits), np.split(locations, splits)
+    ):
+        detections = Detections3D.from_arrays(
+            class_id=[det.class_id for det, _ in objects],
+            score=[det.score for det, _ in objects],
+            box_2d=[[*det.box_2d[0], *det.box_2d[1]] for det, _ in objects],
+            dim=dim,
+            alpha=alpha,
+            theta_ray=theta_ray,
+            location=location,
+            track_id=track_ids,
+            names=names,
+            proj_matrix=calib.P,
+        )
+        if calib.cam_to_ego is not None:
+            detections.to_ego(calib.cam_to_ego)
+        detections_list.append(detections)
+    return detections_list
+
+
+def render3d(img, detections, roi_filter=None):
+    """
+    Draw 3D detections onto img in place. Objects outside roi_filter are drawn in gray.
+
+    Args:
+        img (np.ndarray): BGR frame to draw on.
+        detections (Detections3D): Detections of that frame, i.e. from estimate3d.
+        roi_filter (callable): Optional filter from create_roi_filter.
+
+    Returns:
+        img
+    """
+    box_colors = []
+    for obj, class_ in zip(detections.data, detections.classes):
+        if roi_filter == None or roi_filter(obj["theta_ray"], obj["location"]):
+            box_colors.append(colors[class_])
+        else:
+            box_colors.append((200, 200, 200))
+
+    # all boxes in one pass, see plot_3d_boxes
+    plot_3d_boxes(
+        img, detections.proj_matrix, detections.yaw, detections.dim, detections.location, box_colors, thickness=1
+    )
+    return img
+
+
+class PrefetchFailure:
+    """
+    Exception raised in a prefetch thread, passed to the consumer
+    """
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def prefetch(iterable, size=4):
+    """
+    Iterate over iterable in a background thread that keeps at most size items
+    ready, so decoding overlaps with the consumer. Exceptions of the iterable
+    are raised in the consumer. Closing the generator stops the thread.
+    """
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        # time out regularly so an abandoned consumer does not block the thread forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(PrefetchFailure(e))
+            return
+        put(end)
+
+    thread = threading.Thread(target=worker, name="yolo3d-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is end:
+                return
+            if isinstance(item, PrefetchFailure):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_frames(source, prefetch_size=4):
+    """
+    Decoded BGR frames of a source, read ahead in a background thread.
+
+    Args:
+        source (str): Image, video, directory or glob, read with LoadImages, or
+            a webcam index, stream URL or .txt list of streams, read with LoadStreams.
+        prefetch_size (int): Frames decoded ahead of the consumer.
+
+    Yields:
+        (frame_id, img) where frame_id is the image file name, "<video>:<frame>"
+        for videos and "<stream>:<frame>" for streams.
+    """
+    source = str(source)
+    is_stream = source.isnumeric() or source.endswith(".txt") or source.lower().startswith(
+        ("rtsp://", "rtmp://", "http://", "https://")
+    )
+
+    def frames():
+        if is_stream:
+            dataset = LoadStreams(source, preprocess=False)
+            for i, (sources, _, img0s, _, _) in enumerate(dataset):
+                for name, img0 in zip(sources, img0s):
+                    # the reader threads keep the latest frame, draw on a copy
+                    yield f"{name}:{i}", img0.copy()
+        else:
+            # only the raw frames are used, skip the letterbox of the loader
+            dataset = LoadImages(source, preprocess=False)
+            for path, _, img0, _, _ in dataset:
+                name = os.path.basename(path)
+                yield (f"{name}:{dataset.frame}" if dataset.mode == "video" else name), img0
+
+    return prefetch(frames(), prefetch_size)
+
+
+def iter_detect3d(
+    source,
     reg_weights,
     model_select,
-    source,
     calib_file,
-    show_result,
-    save_result,
-    output_path,
+    render=False,
     roi_filter=None,
+    device="",
+    half=False,
+    cpu_threads=None,
+    reg_max_batch=None,
+    reg_precision="fp32",
+    roi_prefilter=None,
+    tracker=None,
+    detector=None,
+    weights=DETECTOR_WEIGHTS,
+    det_imgsz=640,
+    prefetch_size=4,
 ):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    imgs_path = []
-    if os.path.isfile(source):
-        imgs_path = [source]
-    else:
-        # imgs_path = sorted(glob.glob(str(source) + '/*'))
-        for ext in ("*.png", "*.jpg", "*.jpeg", "*.gif", "*.bmp", "*.tiff"):
-            imgs_path.extend(glob.glob(os.path.join(source, ext)))
-
-    calib = str(calib_file)
-
-    # load model
-    base_model = model_factory[model_select]
-    regressor = regressor_factory[model_select](model=base_model).cuda()
+    """
+    Streaming 3D detection over images, videos or streams. Frames are yielded
+    as soon as they are done and nothing is kept across frames, so memory stays
+    constant over arbitrarily long sources.
 
-    # load weight
-    checkpoint = torch.load(reg_weights, weights_only=True)
-    regressor.load_state_dict(checkpoint["model_state_dict"])
-    regressor.eval()
+    Args:
+        source (str): Input, see iter_frames.
+        calib_file: Calibration shared by all frames, see get_calibration.
+        render (bool): Also return the frame with the 3D boxes drawn.
+        detector (callable): Optional 2D detector, img -> list of Bbox, i.e. a
+            KeyframeDetector. Defaults to detect2DFromCVImgs on every frame.
+        prefetch_size (int): Frames decoded ahead in a background thread.
+
+    Yields:
+        (frame_id, Detections3D, rendered image or None) per frame.
+    """
+    # load model (cached across calls)
+    device = setup_device(device, cpu_threads)
+    regressor = registry.regressor(reg_weights, model_select, device, half, reg_precision)
+    names = registry.detector(weights, device, half).names
 
     averages = ClassAverages.ClassAverages()
     angle_bins = generate_bins(2)
 
-    # loop images
-    for i, img_path in enumerate(imgs_path):
-        # read image
-        img = cv2.imread(img_path)
-        img_name = os.path.basename(img_path)
-
-        # Run detection 2d
-        dets = detect2d(
-            weights=os.path.join(current_dir, "yolo11n_nuimages.pt"),
-            source=img_path,
-            imgsz=[640, 640],
-            device=0,
+    for frame_id, img in iter_frames(source, prefetch_size):
+        if detector is not None:
+            dets = detector(img)
+        else:
+            dets = detect2DFromCVImgs(weights, [img], device=device, half=half, imgsz=det_imgsz)[0]
+
+        detections = estimate3d(
+            img,
+            dets,
+            calib_file,
+            regressor,
+            averages,
+            angle_bins,
+            names=names,
+            device=device,
+            reg_max_batch=reg_max_batch,
+            prefilter=roi_prefilter,
+            tracker=tracker,
         )
+        log_first_inference()
 
-        # for det in dets:
-        #     cv2.rectangle(img, det.box_2d[0], det.box_2d[1], (255, 0, 255), 1)
-        # cv2.imwrite(f'{output_path}/{i:03d}_2d.png', img)
+        # the decoded frame is not used afterwards, draw on it directly
+        yield frame_id, detections, render3d(img, detections, roi_filter=roi_filter) if render else None
+
+
+def detect3d(
+    reg_weights,
+    model_select,
+    source,
+    calib_file,
+    show_result,
+    save_result,
+    output_path,
+    roi_filter=None,
+    device="",
+    half=False,
+    cpu_threads=None,
+    reg_max_batch=None,
+    reg_precision="fp32",
+    roi_prefilter=None,
+    tracker=None,
+    weights=DETECTOR_WEIGHTS,
+):
+    # loop frames, decoded ahead in a background thread
+    detections_list = []
+    for frame_id, detections, img in iter_detect3d(
+        source,
+        reg_weights,
+        model_select,
+        str(calib_file),
+        render=save_result or show_result,
+        roi_filter=roi_filter,
+        device=device,
+        half=half,
+        cpu_threads=cpu_threads,
+        reg_max_batch=reg_max_batch,
+        reg_precision=reg_precision,
+        roi_prefilter=roi_prefilter,
+        tracker=tracker,
+        weights=weights,
+    ):
+        detections_list.append(detections)
 
-        for det in dets:
-            if not averages.recognized_class(det.detected_class):
-                continue
-            try:
-                detectedObject = DetectedObject(
-                    img, det.detected_class, det.box_2d, calib
-                )
-            except:
-                continue
-
-            theta_ray = detectedObject.theta_ray
-            input_img = detectedObject.img
-            proj_matrix = detectedObject.proj_matrix
-            box_2d = det.box_2d
-            detected_class = det.detected_class
-
-            input_tensor = torch.zeros([1, 3, 224, 224]).cuda()
-            input_tensor[0, :, :, :] = input_img
-
-            # predict orient, conf, and dim
-            [orient, conf, dim] = regressor(input_tensor)
-            orient = orient.cpu().data.numpy()[0, :, :]
-            conf = conf.cpu().data.numpy()[0, :]
-            dim = dim.cpu().data.numpy()[0, :]
-
-            dim += averages.get_item(detected_class)
-
-            argmax = np.argmax(conf)
-            orient = orient[argmax, :]
-            cos = orient[0]
-            sin = orient[1]
-            alpha = np.arctan2(sin, cos)
-            alpha += angle_bins[argmax]
-            alpha -= np.pi
-
-            location, X = calc_location(
-                dim, proj_matrix, box_2d, alpha, theta_ray)
-            orient = alpha + theta_ray
-
-            # plot 3d detection
-            if save_result or show_result:
-                plot3d(
-                    img,
-                    proj_matrix,
-                    det,
-                    dim,
-                    alpha,
-                    theta_ray,
-                    roi_filter=roi_filter,
-                    img_2d=True,
-                )
-        imgs_output.append(img.copy())
         if show_result:
             cv2.imshow("3d detection", img)
             cv2.waitKey(0)
 
         if save_result and output_path is not None:
-            try:
-                os.mkdir(output_path)
-            except:
-                pass
-            output_name = os.path.join(output_path, img_name)
-            cv2.imwrite(f"{output_name}", img)
+            os.makedirs(output_path, exist_ok=True)
+            # video and stream frames are saved as <name>_<frame>.jpg
+            output_name = frame_id if ":" not in frame_id else frame_id.replace(":", "_") + ".jpg"
+            cv2.imwrite(os.path.join(output_path, output_name), img)
+    return detections_list
 
 
 @torch.no_grad()
-def detect2d(weights, source, imgsz, device, conf=0.5):
+def detect2d(weights, source, imgsz, device, conf=0.5, half=False):
 
     # array for boundingbox detection
     bbox_list = []
@@ -191,8 +717,8 @@ def detect2d(weights, source, imgsz, device, conf=0.5):
     source = str(source)
 
     # Load model
-    device = select_device(device)
-    model = YOLO(weights)
+    device = setup_device(device)
+    model = registry.detector(weights, device, half)
     names = model.names
     stride = 32
     pt = True
@@ -225,10 +751,90 @@ def detect2d(weights, source, imgsz, device, conf=0.5):
                     int(xyxy_[0, 3]),
                 )
                 bbox = [top_left, bottom_right]
-                bbox_list.append(Bbox(bbox, names[int(box.cls[0])]))
+                c = int(box.cls[0])
+                bbox_list.append(Bbox(bbox, names[c], float(box.conf[0]), c))
     return bbox_list
 
 
+def detections3DFromCVImg(
+    reg_weights,
+    model_select,
+    imgs,
+    calib_file,
+    device="",
+    half=False,
+    cpu_threads=None,
+    reg_max_batch=None,
+    reg_precision="fp32",
+    roi_prefilter=None,
+    tracker=None,
+    weights=DETECTOR_WEIGHTS,
+    det_batch_size=8,
+    det_imgsz=640,
+):
+    """
+    Structured 3D detection of BGR images, no rendering.
+
+    Args:
+        imgs (np.ndarray | list[np.ndarray]): Image or images to detect on.
+        calib_file: Calibration shared by all images, or a list with one per image.
+        roi_prefilter (callable): Optional ROI pre-filter from create_roi_prefilter,
+            applied before cropping and regression.
+        tracker (RegressionTracker): Optional tracker, for consecutive frames of one camera.
+
+    Returns:
+        A list with one Detections3D per input image, in input order.
+    """
+    # load model (cached across calls)
+    device = setup_device(device, cpu_threads)
+    regressor = registry.regressor(reg_weights, model_select, device, half, reg_precision)
+    names = registry.detector(weights, device, half).names
+
+    averages = ClassAverages.ClassAverages()
+    angle_bins = generate_bins(2)
+
+    if not isinstance(imgs, list):
+        imgs = [imgs]
+    calibs = calib_file if isinstance(calib_file, list) else [calib_file] * len(imgs)
+
+    # Run detection 2d on all images in batches
+    dets_list = detect2DFromCVImgs(weights, imgs, device=device, half=half, batch_size=det_batch_size, imgsz=det_imgsz)
+
+    # one regressor pass over all images, frame by frame when a tracker needs the order
+    if tracker is None:
+        detections_list = estimate3d_batch(
+            imgs,
+            dets_list,
+            calibs,
+            regressor,
+            averages,
+            angle_bins,
+            names=names,
+            device=device,
+            reg_max_batch=reg_max_batch,
+            prefilter=roi_prefilter,
+        )
+    else:
+        detections_list = [
+            estimate3d(
+                img,
+                dets,
+                calib,
+                regressor,
+                averages,
+                angle_bins,
+                names=names,
+                device=device,
+                reg_max_batch=reg_max_batch,
+                prefilter=roi_prefilter,
+                tracker=tracker,
+            )
+            for img, dets, calib in zip(imgs, dets_list, calibs)
+        ]
+    log_first_inference()
+    return detections_list
+
+
 def detect3DFromCVImg(
     reg_weights,
     model_select,
@@ -238,86 +844,50 @@ def detect3DFromCVImg(
     save_result,
     output_path,
     roi_filter=None,
+    device="",
+    half=False,
+    cpu_threads=None,
+    reg_max_batch=None,
+    reg_precision="fp32",
+    roi_prefilter=None,
+    tracker=None,
+    weights=DETECTOR_WEIGHTS,
+    det_batch_size=8,
+    det_imgsz=640,
+    return_detections=False,
 ):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # load model
-    base_model = model_factory[model_select]
-    regressor = regressor_factory[model_select](model=base_model).cuda()
+    """
+    3D detection of BGR images, rendered onto copies of the images.
 
-    # load weight
-    checkpoint = torch.load(reg_weights, weights_only=True)
-    regressor.load_state_dict(checkpoint["model_state_dict"])
-    regressor.eval()
+    Returns:
+        The rendered images, or (images, list of Detections3D) with return_detections.
+    """
+    if not isinstance(imgs, list):
+        imgs = [imgs]
 
-    averages = ClassAverages.ClassAverages()
-    angle_bins = generate_bins(2)
+    detections_list = detections3DFromCVImg(
+        reg_weights,
+        model_select,
+        imgs,
+        calib_file,
+        device=device,
+        half=half,
+        cpu_threads=cpu_threads,
+        reg_max_batch=reg_max_batch,
+        reg_precision=reg_precision,
+        roi_prefilter=roi_prefilter,
+        tracker=tracker,
+        weights=weights,
+        det_batch_size=det_batch_size,
+        det_imgsz=det_imgsz,
+    )
 
-    imgs_output = []
-    if not isinstance(imgs,list):
-        imgs = [imgs]
     # loop images
-    for i, img in enumerate(imgs):
-        img = img.copy()
+    imgs_output = []
+    for i, (img, detections) in enumerate(zip(imgs, detections_list)):
+        img = render3d(img.copy(), detections, roi_filter=roi_filter)
         img_name = f"{i}.jpg"
 
-        # Run detection 2d
-        dets = detect2DFromCVImg(os.path.join(current_dir, "yolo11n_nuimages.pt"), img)
-
-        # for det in dets:
-        #     cv2.rectangle(img, det.box_2d[0], det.box_2d[1], (255, 0, 255), 1)
-        # cv2.imwrite(f'{output_path}/{i:03d}_2d.png', img)
-
-        for det in dets:
-            if not averages.recognized_class(det.detected_class):
-                continue
-            try:
-                detectedObject = DetectedObject(
-                    img, det.detected_class, det.box_2d, calib_file
-                )
-            except Exception as e:
-                print(f"An error occurred: {e}")
-                continue
-
-            theta_ray = detectedObject.theta_ray
-            input_img = detectedObject.img
-            proj_matrix = detectedObject.proj_matrix
-            box_2d = det.box_2d
-            detected_class = det.detected_class
-
-            input_tensor = torch.zeros([1, 3, 224, 224]).cuda()
-            input_tensor[0, :, :, :] = input_img
-
-            # predict orient, conf, and dim
-            [orient, conf, dim] = regressor(input_tensor)
-            orient = orient.cpu().data.numpy()[0, :, :]
-            conf = conf.cpu().data.numpy()[0, :]
-            dim = dim.cpu().data.numpy()[0, :]
-
-            dim += averages.get_item(detected_class)
-
-            argmax = np.argmax(conf)
-            orient = orient[argmax, :]
-            cos = orient[0]
-            sin = orient[1]
-            alpha = np.arctan2(sin, cos)
-            alpha += angle_bins[argmax]
-            alpha -= np.pi
-
-            location, X = calc_location(
-                dim, proj_matrix, box_2d, alpha, theta_ray)
-            orient = alpha + theta_ray
-
-            plot3d(
-                img,
-                proj_matrix,
-                det,
-                dim,
-                alpha,
-                theta_ray,
-                roi_filter=roi_filter,
-                img_2d=True,
-            )
         if show_result:
             cv2.imshow("3d detection", img)
             cv2.waitKey(0)
@@ -331,40 +901,153 @@ def detect3DFromCVImg(
             cv2.imwrite(f"{output_name}", img)
 
         imgs_output.append(img.copy())
+
+    if return_detections:
+        return imgs_output, detections_list
     return imgs_output
 
 
-def detect2DFromCVImg(weights, im, conf=0.5):
+def bev_nms(boxes, scores, classes, cameras, iou_thres=0.2):
+    """
+    Greedy NMS on bird's-eye-view boxes that only suppresses same-class
+    detections seen by another camera, so neighbouring objects of one camera
+    are never merged. IoUs are computed for all pairs at once.
 
-    # array for boundingbox detection
-    bbox_list = []
+    Args:
+        boxes (np.ndarray): (N, 4) BEV boxes, see bev_boxes.
+        scores, classes, cameras (np.ndarray): (N,) score, class id and camera per box.
 
-    # Load model
-    model = YOLO(weights)
+    Returns:
+        Sorted indices of the kept boxes.
+    """
+    iou = box_iou(boxes, boxes)
+    iou[(classes[:, None] != classes[None]) | (cameras[:, None] == cameras[None])] = 0
+
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in np.argsort(-scores, kind="stable"):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_thres
+    return np.sort(np.array(keep, dtype=int))
+
+
+def detect3DMultiCam(
+    reg_weights,
+    model_select,
+    imgs,
+    calibs,
+    nms_iou=0.2,
+    device="",
+    half=False,
+    cpu_threads=None,
+    reg_max_batch=None,
+    reg_precision="fp32",
+    roi_prefilter=None,
+    weights=DETECTOR_WEIGHTS,
+    det_imgsz=640,
+):
+    """
+    Joint 3D detection over the cameras of one sample, i.e. the six nuScenes
+    cameras. All images go through the 2D detector and the regressor in one
+    pass, locations are moved to the ego frame with each camera's extrinsics,
+    and objects seen by two cameras are merged with bev_nms.
+
+    Args:
+        imgs (list[np.ndarray]): One BGR image per camera.
+        calibs (list[dict]): nuScenes calibrated_sensor record per camera.
+        nms_iou (float): BEV IoU above which detections of two cameras are merged.
+
+    Returns:
+        The merged Detections3D (location_ego filled, camera tells which camera
+        kept the object) and a list with the kept Detections3D per camera.
+    """
+    detections_list = detections3DFromCVImg(
+        reg_weights,
+        model_select,
+        imgs,
+        list(calibs),
+        device=device,
+        half=half,
+        cpu_threads=cpu_threads,
+        reg_max_batch=reg_max_batch,
+        reg_precision=reg_precision,
+        roi_prefilter=roi_prefilter,
+        weights=weights,
+        det_batch_size=len(imgs),
+        det_imgsz=det_imgsz,
+    )
+
+    boxes = []
+    for camera, (detections, calib_file) in enumerate(zip(detections_list, calibs)):
+        calib = get_calibration(calib_file)
+        if calib.cam_to_ego is None:
+            raise ValueError(f"camera {camera} has no extrinsics, pass calibrated_sensor records")
+        detections.data["camera"] = camera
+        boxes.append(bev_boxes(detections.dim, detections.location, detections.yaw, calib.cam_to_ego))
+
+    merged = Detections3D.concat(detections_list)
+    keep = bev_nms(np.concatenate(boxes), merged.score, merged.class_id, merged.camera, nms_iou)
+    if len(keep) < len(merged):
+        LOGGER.info(f"BEV NMS: merged {len(merged) - len(keep)} of {len(merged)} objects seen by several cameras")
+
+    kept = np.zeros(len(merged), dtype=bool)
+    kept[keep] = True
+    splits = np.cumsum([len(d) for d in detections_list])[:-1]
+    per_camera = [detections[mask] for detections, mask in zip(detections_list, np.split(kept, splits))]
+    return merged[keep], per_camera
+
+
+def detect2DFromCVImg(weights, im, conf=0.5, device="", half=False):
+    return detect2DFromCVImgs(weights, [im], conf=conf, device=device, half=half)[0]
+
+
+def detect2DFromCVImgs(weights, ims, conf=0.5, device="", half=False, batch_size=8, imgsz=640):
+    """
+    Batched 2D detection over a list of BGR images (e.g. the six nuScenes
+    cameras, or a window of frames).
+
+    Args:
+        weights (str): Detector weights.
+        ims (list[np.ndarray]): Images to detect on.
+        conf (float): Confidence threshold.
+        batch_size (int): Number of images sent through the detector per forward pass.
+        imgsz (int | list): Letterbox size.
+
+    Returns:
+        A list with one list of Bbox per input image, in input order.
+    """
+    # Load model (cached across calls)
+    model = registry.detector(weights, device, half)
     names = model.names
 
-    # Inference
-    pred = model(im, conf=conf)
-    for r in pred:
-        boxes = r.boxes
-        for box in boxes:
-            xyxy_ = torch.reshape(box.xyxy[0], (1, 4)).cpu().numpy()
-            top_left, bottom_right = (int(xyxy_[0, 0]), int(xyxy_[0, 1])), (
-                int(xyxy_[0, 2]),
-                int(xyxy_[0, 3]),
-            )
-            bbox = [top_left, bottom_right]
-            bbox_list.append(Bbox(bbox, names[int(box.cls[0])]))
-    return bbox_list
+    bbox_lists = []
+    for i in range(0, len(ims), batch_size):
+        # Inference, one forward pass per chunk
+        pred = model(list(ims[i : i + batch_size]), conf=conf, imgsz=imgsz)
+        for r in pred:
+            # one device sync per image instead of one per box
+            xyxy = r.boxes.xyxy.cpu().numpy().astype(int)
+            cls = r.boxes.cls.cpu().numpy().astype(int)
+            scores = r.boxes.conf.cpu().numpy()
+            bbox_list = []
+            for (x1, y1, x2, y2), c, score in zip(xyxy, cls, scores):
+                bbox = [(int(x1), int(y1)), (int(x2), int(y2))]
+                bbox_list.append(Bbox(bbox, names[c], float(score), int(c)))
+            bbox_lists.append(bbox_list)
+    return bbox_lists
 
 
 def plot3d(
-    img, proj_matrix, det, dimensions, alpha, theta_ray, img_2d=None, roi_filter=None
+    img, proj_matrix, det, dimensions, alpha, theta_ray, img_2d=None, roi_filter=None, location=None
 ):
     box_2d = det.box_2d
     # the math! returns X, the corners used for constraint
-    location, X = calc_location(
-        dimensions, proj_matrix, box_2d, alpha, theta_ray)
+    # skipped when the caller already solved the location (calc_locations)
+    if location is None:
+        location, X = calc_location(
+            dimensions, proj_matrix, box_2d, alpha, theta_ray)
     orient = alpha + theta_ray
 
     if img_2d is not None:
@@ -441,6 +1124,20 @@ def parse_opt():
         default="resnet",
         help="Regressor model list: resnet, vgg, eff",
     )
+    parser.add_argument(
+        "--reg_backend",
+        type=str,
+        default="pytorch",
+        choices=list(REG_BACKENDS),
+        help="Regressor backend, exported with export_regressor.py next to reg_weights",
+    )
+    parser.add_argument(
+        "--reg_precision",
+        type=str,
+        default="fp32",
+        choices=list(REG_PRECISIONS),
+        help="Regressor precision: fp32, int8 (dynamic, CPU) or fp16 (autocast, CUDA)",
+    )
     parser.add_argument(
         "--calib_file",
         type=str,
@@ -464,13 +1161,15 @@ def parse_opt():
 
 def main(opt):
     detect3d(
-        reg_weights=opt.reg_weights,
+        reg_weights=regressor_weights(opt.reg_weights, opt.reg_backend),
         model_select=opt.model_select,
         source=opt.source,
         calib_file=opt.calib_file,
         show_result=opt.show_result,
         save_result=opt.save_result,
         output_path=opt.output_path,
+        device=opt.device,
+        reg_precision=opt.reg_precision,
     )
 
 
@@ -504,14 +1203,65 @@ def create_roi_filter(roi_r, roi_w, roi_d):
     return roi_filter
 
 
-def yolo3d_nuScenes(img_path, output_path="", calib="nuscenes", save_result=False, roi_r=-1, roi_w=-1, roi_d=-1):
-    """YOLO3D inference function for nuScenes dataset.
+def create_roi_prefilter(roi_r, roi_w, roi_d, min_box=0, depth_slack=0.5, cam_height=None):
+    """Vectorized counterpart of create_roi_filter that runs on the 2D boxes,
+    before cropping and regression, and drops objects that cannot be in the ROI.
+
+    The depth of every object is estimated twice, from the ground contact of
+    the box bottom and from the class average height, and the closer estimate
+    is shrunk by depth_slack so that objects near the ROI border are kept.
 
     Args:
-        img_path (str): Path to an image or an image folder.
-        roi_r (float): The radius of a disk-shaped region of interest.
-        roi_w (float): The width of the region of interest in front of the vehicle.
-        roi_d (float): The length of the region of interest in front of the vehicle.
+        roi_r (float): Radius of the disk-shaped ROI, see create_roi_filter.
+        roi_w (float): Width of the ROI in front of the vehicle.
+        roi_d (float): Length of the ROI in front of the vehicle.
+        min_box (int): Drop boxes with a side shorter than this (pixels).
+        depth_slack (float): Relative depth error tolerated by the estimate.
+        cam_height (float): Camera height above the ground (m). Defaults to the
+            calibrated extrinsics if known, else 1.5.
+
+    Returns:
+        roi_prefilter(boxes, heights, calib, width) -> keep mask, for boxes
+        (N, 4) xmin, ymin, xmax, ymax, class average heights (N,), a Calibration
+        and the image width.
+    """
+    # same semantics as create_roi_filter: a disabled region accepts everything
+    cull = roi_r >= 0 and roi_w >= 0 and roi_d >= 0
+
+    def roi_prefilter(boxes, heights, calib, width):
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        keep = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) + 1 >= min_box
+        if not cull:
+            return keep
+
+        P = calib.P
+        fy, cy = P[1, 1], P[1, 2]
+        height = cam_height
+        if height is None:
+            height = calib.cam_to_ego[2, 3] if calib.cam_to_ego is not None else 1.5
+
+        # ground-plane depth from the box bottom, infinite above the horizon
+        below = np.maximum(boxes[:, 3] - cy, 0)
+        with np.errstate(divide="ignore"):
+            depth_ground = np.where(below > 0, fy * height / below, np.inf)
+            depth_height = fy * np.asarray(heights, dtype=float) / np.maximum(boxes[:, 3] - boxes[:, 1] + 1, 1)
+        depth = np.minimum(depth_ground, depth_height) / (1 + depth_slack)
+
+        # lateral offset along the ray through the box center, as in calc_theta_ray
+        dx = (boxes[:, 0] + boxes[:, 2]) / 2 - width / 2
+        theta_ray = np.arctan(2 * dx * np.tan(calib.fovx(width) / 2) / width)
+        lateral = depth * np.tan(theta_ray)
+
+        in_disk = np.hypot(lateral, depth) < roi_r
+        in_lane = (np.abs(lateral) < roi_w / 2.0) & (depth < roi_d)
+        return keep & (in_disk | in_lane)
+
+    return roi_prefilter
+
+
+def nuscenes_reg_weights():
+    """
+    Path of the resnet18 regressor weights used for nuScenes, downloaded on first use
     """
     current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -523,8 +1273,38 @@ def yolo3d_nuScenes(img_path, output_path="", calib="nuscenes", save_result=Fals
         subprocess.run(["python", script_path, "--weights",
                        "resnet18"], cwd=script_dir)
 
+    return os.path.join(current_dir, "weights", "resnet18.pkl")
+
+
+def yolo3d_nuScenes(img_path, output_path="", calib="nuscenes", save_result=False, roi_r=-1, roi_w=-1, roi_d=-1,
+                    device="", half=False, cpu_threads=None, return_detections=False, roi_cull=False, min_box=0,
+                    tracker=None):
+    """YOLO3D inference function for nuScenes dataset.
+
+    Models are loaded once per process through the shared ``registry`` and
+    reused on subsequent calls.
+
+    Args:
+        img_path (str): Path to an image or an image folder.
+        roi_r (float): The radius of a disk-shaped region of interest.
+        roi_w (float): The width of the region of interest in front of the vehicle.
+        roi_d (float): The length of the region of interest in front of the vehicle.
+        device (int | str): Device for the detector and the regressor, i.e. 0 or cpu.
+            Defaults to the first CUDA device if available, else the CPU.
+        half (bool): Run both models in FP16 (CUDA only).
+        cpu_threads (int): Intra-op thread count when running on the CPU.
+        return_detections (bool): Also return the Detections3D of every image.
+        roi_cull (bool): Skip objects that cannot be in the ROI before regression
+            instead of drawing them in gray, see create_roi_prefilter.
+        min_box (int): With roi_cull, also skip boxes with a side shorter than this (pixels).
+        tracker (RegressionTracker): Optional tracker reused across the consecutive
+            frames of one camera, see RegressionTracker.
+
+    Returns:
+        The rendered images, or (images, detections) with return_detections.
+    """
     return detect3DFromCVImg(
-        reg_weights=os.path.join(current_dir, "weights", "resnet18.pkl"),
+        reg_weights=nuscenes_reg_weights(),
         model_select="resnet18",
         imgs=img_path,
         calib_file=calib,
@@ -532,6 +1312,12 @@ def yolo3d_nuScenes(img_path, output_path="", calib="nuscenes", save_result=Fals
         save_result=save_result,
         output_path=output_path,
         roi_filter=create_roi_filter(roi_r, roi_w, roi_d),
+        device=device,
+        half=half,
+        cpu_threads=cpu_threads,
+        roi_prefilter=create_roi_prefilter(roi_r, roi_w, roi_d, min_box) if roi_cull else None,
+        tracker=tracker,
+        return_detections=return_detections,
     )
 
     # # Apply cam to ego translation for nuScenes
@@ -543,6 +1329,39 @@ def yolo3d_nuScenes(img_path, output_path="", calib="nuscenes", save_result=Fals
     # return bboxes, bboxes_roi
 
 
+def yolo3d_nuScenes_multicam(imgs, calibs, output_path="", save_result=False, roi_r=-1, roi_w=-1, roi_d=-1,
+                             nms_iou=0.2, device="", half=False, cpu_threads=None):
+    """YOLO3D inference over all cameras of a nuScenes sample, see detect3DMultiCam.
+
+    Args:
+        imgs (list[np.ndarray]): One BGR image per camera, i.e. CAM_FRONT, CAM_FRONT_LEFT, ...
+        calibs (list[dict]): The calibrated_sensor record of every camera.
+        save_result (bool): Write the rendered images to output_path as <camera>.jpg.
+        roi_r, roi_w, roi_d (float): Region of interest, see yolo3d_nuScenes.
+        nms_iou (float): BEV IoU above which detections of two cameras are merged.
+
+    Returns:
+        The rendered images and the merged Detections3D in the ego frame.
+    """
+    merged, per_camera = detect3DMultiCam(
+        nuscenes_reg_weights(),
+        "resnet18",
+        imgs,
+        calibs,
+        nms_iou=nms_iou,
+        device=device,
+        half=half,
+        cpu_threads=cpu_threads,
+    )
+
+    roi_filter = create_roi_filter(roi_r, roi_w, roi_d)
+    imgs_output = [render3d(img.copy(), detections, roi_filter=roi_filter) for img, detections in zip(imgs, per_camera)]
+    if save_result and output_path:
+        os.makedirs(output_path, exist_ok=True)
+        for camera, img in enumerate(imgs_output):
+            cv2.imwrite(os.path.join(output_path, f"{camera}.jpg"), img)
+    return imgs_output, merged
+
 if __name__ == "__main__":
     # opt = parse_opt()
     # main(opt)
@@ -0,0 +1,234 @@
+"""
+Keyframe 2D detection for dense video
+
+The detector runs only on keyframes, every K frames or when the scene changes
+too much. In between, the boxes of the previous frame are propagated with
+sparse Lucas-Kanade optical flow and fed to the usual 3D regression and
+geometry.
+
+Usage:
+    from YOLO3D.keyframes import KeyframeDetector, detect3DKeyframes
+
+    detector = KeyframeDetector(every=5)
+    for detections in detect3DKeyframes("weights/resnet18.pkl", "resnet18", frames, "nuscenes", detector):
+        ...
+"""
+
+import cv2
+import numpy as np
+
+from YOLO3D.inference import (
+    DETECTOR_WEIGHTS,
+    Bbox,
+    detect2DFromCVImgs,
+    estimate3d,
+    log_first_inference,
+    registry,
+    setup_device,
+)
+from YOLO3D.library.Calib import calibration_key
+from YOLO3D.script import ClassAverages
+from YOLO3D.script.Dataset import generate_bins
+
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+
+
+class KeyframeDetector:
+    """
+    Callable 2D detector, img -> list of Bbox, that runs the YOLO detector on
+    keyframes only and propagates boxes with optical flow in between.
+
+    Args:
+        weights (str): Detector weights.
+        every (int): Run the detector at least every this many frames.
+        scene_change (float): Also run it when the mean absolute difference to the
+            last keyframe, in gray levels on a 64 x 36 thumbnail, exceeds this.
+        max_lost (float): Also run it when this share of the boxes could not be propagated.
+        points (int): Corners tracked per box.
+        fb_error (float): Forward-backward error (px) above which a point is rejected.
+    """
+
+    def __init__(
+        self,
+        weights=DETECTOR_WEIGHTS,
+        every=5,
+        scene_change=20.0,
+        max_lost=0.5,
+        points=20,
+        fb_error=1.0,
+        conf=0.5,
+        device="",
+        half=False,
+        imgsz=640,
+    ):
+        self.weights = weights
+        self.every = every
+        self.scene_change = scene_change
+        self.max_lost = max_lost
+        self.points = points
+        self.fb_error = fb_error
+        self.conf = conf
+        self.device = device
+        self.half = half
+        self.imgsz = imgsz
+        self.reset()
+
+    def reset(self):
+        self.restart()
+        self.frames = 0
+        self.keyframes = 0
+
+    def restart(self):
+        """
+        Forget the previous frame, so the next one is a keyframe, i.e. on a camera switch
+        """
+        self.gray = None
+        self.key_thumb = None
+        self.dets = []
+        self.since_key = 0
+
+    def __call__(self, img):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.float32)
+        self.frames += 1
+
+        dets = None
+        if self.gray is not None and self.since_key < self.every - 1:
+            if np.abs(thumb - self.key_thumb).mean() <= self.scene_change:
+                dets, lost = self.propagate(self.gray, gray, self.dets)
+                if lost > self.max_lost * len(self.dets):
+                    dets = None
+
+        if dets is None:
+            dets = detect2DFromCVImgs(
+                self.weights, [img], conf=self.conf, device=self.device, half=self.half, imgsz=self.imgsz
+            )[0]
+            self.key_thumb = thumb
+            self.since_key = 0
+            self.keyframes += 1
+        else:
+            self.since_key += 1
+
+        self.gray = gray
+        self.dets = dets
+        return dets
+
+    def propagate(self, prev, curr, dets):
+        """
+        Move every box by the median flow of the corners inside it and scale it
+        by the median change of their spread. All points go through one
+        pyramidal LK call, forward and backward.
+
+        Returns:
+            propagated boxes and the number of boxes that could not be tracked
+        """
+        h, w = prev.shape
+        pts, owner = [], []
+        for i, det in enumerate(dets):
+            (x1, y1), (x2, y2) = det.box_2d
+            x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, w - 1), min(y2, h - 1)
+            if x2 - x1 < 4 or y2 - y1 < 4:
+                continue
+            corners = cv2.goodFeaturesToTrack(prev[y1 : y2 + 1, x1 : x2 + 1], self.points, 0.01, 3)
+            if corners is None:
+                continue
+            pts.append(corners.reshape(-1, 2) + [x1, y1])
+            owner.append(np.full(len(corners), i))
+
+        if not pts:
+            return [], len(dets)
+        pts = np.concatenate(pts).astype(np.float32)
+        owner = np.concatenate(owner)
+
+        nxt, st, _ = cv2.calcOpticalFlowPyrLK(prev, curr, pts, None, **LK_PARAMS)
+        back, st_back, _ = cv2.calcOpticalFlowPyrLK(curr, prev, nxt, None, **LK_PARAMS)
+        good = (st[:, 0] == 1) & (st_back[:, 0] == 1) & (np.linalg.norm(back - pts, axis=1) < self.fb_error)
+
+        out = []
+        for i, det in enumerate(dets):
+            sel = good & (owner == i)
+            if sel.sum() < 3:
+                continue
+            p0, p1 = pts[sel], nxt[sel]
+            shift = np.median(p1 - p0, axis=0)
+            spread0, spread1 = p0 - np.median(p0, axis=0), p1 - np.median(p1, axis=0)
+            scale = np.median(np.linalg.norm(spread1, axis=1)) / max(np.median(np.linalg.norm(spread0, axis=1)), 1e-6)
+
+            (x1, y1), (x2, y2) = det.box_2d
+            cx, cy = (x1 + x2) / 2 + shift[0], (y1 + y2) / 2 + shift[1]
+            hw, hh = (x2 - x1) / 2 * scale, (y2 - y1) / 2 * scale
+            box = [(int(cx - hw), int(cy - hh)), (int(cx + hw), int(cy + hh))]
+            out.append(Bbox(box, det.detected_class, det.score, det.class_id))
+        return out, len(dets) - len(out)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "keyframes": self.keyframes,
+            "keyframe_rate": self.keyframes / self.frames if self.frames else 0.0,
+        }
+
+
+def detect3DKeyframes(
+    reg_weights,
+    model_select,
+    frames,
+    calib_file,
+    detector=None,
+    device="",
+    half=False,
+    cpu_threads=None,
+    reg_max_batch=None,
+    reg_precision="fp32",
+    roi_prefilter=None,
+    tracker=None,
+    calibs=None,
+):
+    """
+    Structured 3D detection over a stream of frames with keyframe 2D detection.
+
+    Args:
+        frames (Iterable[np.ndarray]): Consecutive BGR frames of one camera.
+        detector (KeyframeDetector): Keyframe detector, a default one if None.
+        calibs (Iterable): Optional calibration per frame, else calib_file. A
+            change of calibration means another camera, so the detector
+            restarts with a keyframe and the tracker drops its tracks.
+
+    Yields:
+        One Detections3D per frame.
+    """
+    device = setup_device(device, cpu_threads)
+    detector = detector or KeyframeDetector(device=device, half=half)
+    regressor = registry.regressor(reg_weights, model_select, device, half, reg_precision)
+    names = registry.detector(detector.weights, device, half).names
+
+    averages = ClassAverages.ClassAverages()
+    angle_bins = generate_bins(2)
+
+    calib_iter = iter(calibs) if calibs is not None else None
+    key = None
+    for i, img in enumerate(frames):
+        calib = calib_file
+        if calib_iter is not None:
+            calib = next(calib_iter, None)
+            if calib is None:
+                raise ValueError(f"calibs has fewer entries than frames, none for frame {i}")
+            previous, key = key, calibration_key(calib)
+            if previous is not None and key != previous:
+                detector.restart()
+                if tracker is not None:
+                    tracker.reset()
+        yield estimate3d(
+            img,
+            detector(img),
+            calib,
+            regressor,
+            averages,
+            angle_bins,
+            names=names,
+            device=device,
+            reg_max_batch=reg_max_batch,
+            prefilter=roi_prefilter,
+            tracker=tracker,
+        )
+        log_first_inference()
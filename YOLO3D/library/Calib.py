@@ -5,19 +5,142 @@ Script for handling calibration file
 import numpy as np
 import json
 import os
+import threading
+from collections import OrderedDict
+
+
+class Calibration:
+    """
+    Immutable camera calibration, built once per calibration source by
+    get_calibration. P is a read-only 3 x 4 matrix, fx its focal length in
+    pixels and cam_to_ego the 4 x 4 extrinsics (None if unknown).
+    """
+
+    def __init__(self, P, cam_to_ego=None):
+        self.P = np.array(P, dtype=float).reshape(3, 4)
+        self.P.setflags(write=False)
+        self.fx = float(self.P[0, 0])
+        self.cam_to_ego = cam_to_ego
+        if cam_to_ego is not None:
+            self.cam_to_ego.setflags(write=False)
+        self._fovx = {}
+
+    def fovx(self, width):
+        """
+        Horizontal angle of view (rad) for an image of the given width
+        """
+        if width not in self._fovx:
+            self._fovx[width] = 2 * np.arctan(width / (2 * self.fx))
+        return self._fovx[width]
+
+
+# calibration cache, see get_calibration: key -> (version, value), least recently
+# used entries are dropped beyond CALIBRATION_CACHE_SIZE
+CALIBRATION_CACHE_SIZE = 256
+calibration_cache = OrderedDict()
+calibration_lock = threading.Lock()
+
+
+class MissingProjectionError(ValueError):
+    """
+    Calibration file without a projection matrix (P_rect_02)
+    """
+
+
+def calibration_key(calib_file):
+    """
+    Cache key of a calibration source: the path for files, the
+    calibrated_sensor token (or its values) for nuScenes records and the
+    values themselves for matrices
+    """
+    if isinstance(calib_file, Calibration):
+        return ('calibration', id(calib_file))
+    if isinstance(calib_file, dict):
+        if 'token' in calib_file:
+            return ('sensor', calib_file['token'])
+        return ('sensor', json.dumps(calib_file, sort_keys=True, default=lambda x: np.asarray(x).tolist()))
+    if isinstance(calib_file, np.ndarray):
+        return ('matrix', calib_file.shape, calib_file.tobytes())
+    calib_file = str(calib_file)
+    if calib_file.lower() == "nuscenes":
+        return ('nuscenes',)
+    return ('file', os.path.abspath(calib_file))
+
+
+def calibration_version(calib_file):
+    """
+    mtime of calibration files, a cached entry of an older version is replaced
+    """
+    if isinstance(calib_file, (dict, np.ndarray)) or str(calib_file).lower() == "nuscenes":
+        return None
+    return os.stat(str(calib_file)).st_mtime_ns
+
+
+def cache_get(key, version=None):
+    with calibration_lock:
+        entry = calibration_cache.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        calibration_cache.move_to_end(key)
+        return entry[1]
+
+
+def cache_put(key, value, version=None):
+    with calibration_lock:
+        calibration_cache[key] = (version, value)
+        calibration_cache.move_to_end(key)
+        while len(calibration_cache) > CALIBRATION_CACHE_SIZE:
+            calibration_cache.popitem(last=False)
+
+
+def get_calibration(calib_file):
+    """
+    Cached Calibration for a calibration file path, 'nuscenes', a nuScenes
+    calibrated_sensor record or a 3 x 4 projection matrix.
+
+    Raises MissingProjectionError (a ValueError) for a KITTI calibration file
+    without P_rect_02.
+    """
+    if isinstance(calib_file, Calibration):
+        return calib_file
+
+    key, version = calibration_key(calib_file), calibration_version(calib_file)
+    calib = cache_get(key, version)
+    if calib is None:
+        if isinstance(calib_file, np.ndarray):
+            calib = Calibration(calib_file)
+        else:
+            P = parse_P(calib_file)
+            if P is None:
+                raise MissingProjectionError(f"Calibration file {calib_file} has no P_rect_02 projection matrix")
+            calib = Calibration(P, get_cam_to_ego(calib_file))
+        cache_put(key, calib, version)
+    return calib
 
 
 def get_P(calib_file):
+    """
+    Cached, read-only 3 x 4 projection matrix, see get_calibration. None for
+    a KITTI calibration file without P_rect_02, as parse_P
+    """
+    try:
+        return get_calibration(calib_file).P
+    except MissingProjectionError:
+        return None
+
+
+def parse_P(calib_file):
     """
     Get matrix P_rect_02 (camera 2 RGB)
-    and transform to 3 x 4 matrix
+    and transform to 3 x 4 matrix, None if a KITTI file has no P_rect_02
     """
     # Use nuScenes API
-    if 'camera_intrinsic' in calib_file:
+    if isinstance(calib_file, dict) and 'camera_intrinsic' in calib_file:
         cam_P = np.zeros((3,4),dtype=float)
         cam_P[:3,:3] = calib_file['camera_intrinsic']
         return cam_P
 
+    calib_file = str(calib_file)
     if calib_file.lower() == "nuscenes":
         return np.array(
             [
@@ -36,55 +159,85 @@ def get_P(calib_file):
         matrix = data.get("P", [])
         return np.array(matrix)
 
-    for line in open(calib_file):
-        if "P_rect_02" in line:
-            cam_P = line.strip().split(" ")
-            cam_P = np.asarray([float(cam_P) for cam_P in cam_P[1:]])
-            matrix = np.zeros((3, 4))
-            matrix = cam_P.reshape((3, 4))
-            return matrix
+    rows = read_calib_file(calib_file)
+    if "P_rect_02" not in rows:
+        return None
+    return np.reshape(rows["P_rect_02"], (3, 4))
+
+
+def read_calib_file(cab_f):
+    """
+    All 'key: values' rows of a KITTI calibration file as arrays, parsed once
+    per file path and mtime
+    """
+    key, version = ('rows', os.path.abspath(cab_f)), os.stat(cab_f).st_mtime_ns
+    rows = cache_get(key, version)
+    if rows is None:
+        rows = {}
+        for line in open(cab_f):
+            name, _, values = line.strip().partition(" ")
+            try:
+                rows[name.rstrip(":")] = np.asarray([float(number) for number in values.split()])
+                rows[name.rstrip(":")].setflags(write=False)
+            except ValueError:
+                continue  # i.e. calib_time
+        cache_put(key, rows, version)
+    return rows
+
+
+def get_cam_to_ego(calib_file):
+    """
+    4 x 4 camera to ego transform from a nuScenes calibrated_sensor record,
+    None for calibrations without extrinsics
+    """
+    if not isinstance(calib_file, dict) or 'rotation' not in calib_file or 'translation' not in calib_file:
+        return None
+
+    # quaternion [w, x, y, z] to rotation matrix
+    w, x, y, z = np.asarray(calib_file['rotation'], dtype=float) / np.linalg.norm(calib_file['rotation'])
+    R = np.array(
+        [
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+        ]
+    )
+
+    cam_to_ego = np.eye(4)
+    cam_to_ego[:3, :3] = R
+    cam_to_ego[:3, 3] = calib_file['translation']
+    return cam_to_ego
 
 
 # TODO: understand this
 
 
 def get_calibration_cam_to_image(cab_f):
-    for line in open(cab_f):
-        if "P2:" in line:
-            cam_to_img = line.strip().split(" ")
-            cam_to_img = np.asarray([float(number) for number in cam_to_img[1:]])
-            cam_to_img = np.reshape(cam_to_img, (3, 4))
-            return cam_to_img
+    rows = read_calib_file(cab_f)
+    if "P2" in rows:
+        return np.reshape(rows["P2"], (3, 4))
 
     file_not_found(cab_f)
 
 
 def get_R0(cab_f):
-    for line in open(cab_f):
-        if "R0_rect:" in line:
-            R0 = line.strip().split(" ")
-            R0 = np.asarray([float(number) for number in R0[1:]])
-            R0 = np.reshape(R0, (3, 3))
+    rows = read_calib_file(cab_f)
+    if "R0_rect" in rows:
+        R0_rect = np.zeros([4, 4])
+        R0_rect[3, 3] = 1
+        R0_rect[:3, :3] = np.reshape(rows["R0_rect"], (3, 3))
 
-            R0_rect = np.zeros([4, 4])
-            R0_rect[3, 3] = 1
-            R0_rect[:3, :3] = R0
-
-            return R0_rect
+        return R0_rect
 
 
 def get_tr_to_velo(cab_f):
-    for line in open(cab_f):
-        if "Tr_velo_to_cam:" in line:
-            Tr = line.strip().split(" ")
-            Tr = np.asarray([float(number) for number in Tr[1:]])
-            Tr = np.reshape(Tr, (3, 4))
-
-            Tr_to_velo = np.zeros([4, 4])
-            Tr_to_velo[3, 3] = 1
-            Tr_to_velo[:3, :4] = Tr
+    rows = read_calib_file(cab_f)
+    if "Tr_velo_to_cam" in rows:
+        Tr_to_velo = np.zeros([4, 4])
+        Tr_to_velo[3, 3] = 1
+        Tr_to_velo[:3, :4] = np.reshape(rows["Tr_velo_to_cam"], (3, 4))
 
-            return Tr_to_velo
+        return Tr_to_velo
 
 
 def file_not_found(filename):
@@ -0,0 +1,146 @@
+"""
+Array-backed container for the 3D detections of one frame
+"""
+
+import json
+
+import numpy as np
+
+# one record per object, geometry kept in float64 so stored detections render exactly
+DETECTION_DTYPE = np.dtype(
+    [
+        ("class_id", np.int32),  # detector class index, see Detections3D.names
+        ("score", np.float32),  # 2D detector confidence
+        ("box_2d", np.int32, (4,)),  # xmin, ymin, xmax, ymax
+        ("dim", np.float64, (3,)),  # height, width, length
+        ("alpha", np.float64),  # local orientation
+        ("theta_ray", np.float64),  # angle of the ray through the box center
+        ("yaw", np.float64),  # global orientation in the camera frame, alpha + theta_ray
+        ("location", np.float64, (3,)),  # camera frame [right, down, front]
+        ("location_ego", np.float64, (3,)),  # ego frame, NaN if no extrinsics are known
+        ("track_id", np.int32),  # RegressionTracker track, -1 without tracker
+        ("camera", np.int16),  # camera index in multi-camera results
+    ]
+)
+
+
+class Detections3D:
+    """
+    3D detections of one frame stored in a structured NumPy array, plus the
+    class names and the 3 x 4 projection matrix needed to render them
+    """
+
+    def __init__(self, data=None, names=None, proj_matrix=None):
+        self.data = np.zeros(0, dtype=DETECTION_DTYPE) if data is None else data
+        self.names = names if names is not None else {}
+        self.proj_matrix = proj_matrix
+
+    @classmethod
+    def from_arrays(
+        cls, class_id, score, box_2d, dim, alpha, theta_ray, location, track_id=None, names=None, proj_matrix=None
+    ):
+        data = np.zeros(len(class_id), dtype=DETECTION_DTYPE)
+        data["class_id"] = class_id
+        data["score"] = score
+        data["box_2d"] = np.reshape(box_2d, (-1, 4))
+        data["dim"] = np.reshape(dim, (-1, 3))
+        data["alpha"] = alpha
+        data["theta_ray"] = theta_ray
+        data["yaw"] = data["alpha"] + data["theta_ray"]
+        data["location"] = np.reshape(location, (-1, 3))
+        data["location_ego"] = np.nan
+        data["track_id"] = -1 if track_id is None else track_id
+        return cls(data, names, proj_matrix)
+
+    @classmethod
+    def concat(cls, detections_list, names=None):
+        """
+        Merge several Detections3D, i.e. of different cameras. The merged
+        result has no single projection matrix.
+        """
+        data = [d.data for d in detections_list]
+        names = names if names is not None else next((d.names for d in detections_list if d.names), {})
+        return cls(np.concatenate(data) if data else None, names)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        # slices and masks keep the container, a single index gives the record
+        if isinstance(index, (int, np.integer)):
+            return self.data[index]
+        return Detections3D(self.data[index], self.names, self.proj_matrix)
+
+    def __repr__(self):
+        return f"Detections3D({len(self)} objects)"
+
+    @property
+    def class_id(self):
+        return self.data["class_id"]
+
+    @property
+    def classes(self):
+        return [self.names[int(i)] for i in self.data["class_id"]]
+
+    @property
+    def score(self):
+        return self.data["score"]
+
+    @property
+    def box_2d(self):
+        return self.data["box_2d"]
+
+    @property
+    def dim(self):
+        return self.data["dim"]
+
+    @property
+    def alpha(self):
+        return self.data["alpha"]
+
+    @property
+    def theta_ray(self):
+        return self.data["theta_ray"]
+
+    @property
+    def yaw(self):
+        return self.data["yaw"]
+
+    @property
+    def location(self):
+        return self.data["location"]
+
+    @property
+    def location_ego(self):
+        return self.data["location_ego"]
+
+    @property
+    def track_id(self):
+        return self.data["track_id"]
+
+    @property
+    def camera(self):
+        return self.data["camera"]
+
+    def to_ego(self, cam_to_ego):
+        """
+        Fill location_ego from a 4 x 4 camera to ego transform
+        """
+        cam_to_ego = np.asarray(cam_to_ego, dtype=float)
+        self.data["location_ego"] = self.location @ cam_to_ego[:3, :3].T + cam_to_ego[:3, 3]
+        return self
+
+    def save(self, path):
+        np.savez(
+            path,
+            data=self.data,
+            names=json.dumps({int(k): v for k, v in self.names.items()}),
+            proj_matrix=np.zeros((0, 4)) if self.proj_matrix is None else self.proj_matrix,
+        )
+
+    @classmethod
+    def load(cls, path):
+        f = np.load(path)
+        names = {int(k): v for k, v in json.loads(str(f["names"])).items()}
+        proj_matrix = f["proj_matrix"] if f["proj_matrix"].size else None
+        return cls(f["data"], names, proj_matrix)
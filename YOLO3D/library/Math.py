@@ -1,3 +1,5 @@
+import itertools
+
 import numpy as np
 
 # using this math: https://en.wikipedia.org/wiki/Rotation_matrix
@@ -49,144 +51,137 @@ def create_corners(dimension, location=None, R=None):
 
     return final_corners
 
+# corner signs in create_corners order, x outermost
+CORNER_SIGNS = np.array(list(itertools.product([1, -1], repeat=3)), dtype=float)
+
+# vectorized create_corners with rotation and shift for N boxes, returns (N, 8, 3)
+def create_corners_batch(dimensions, locations, ry):
+    dimensions = np.asarray(dimensions, dtype=float).reshape(-1, 3)
+    half = dimensions[:, [2, 0, 1]] / 2  # dx, dy, dz
+
+    # rotation about y for every box, as in rotation_matrix
+    ry = np.asarray(ry, dtype=float).reshape(-1)
+    c, s = np.cos(ry), np.sin(ry)
+    zero, one = np.zeros_like(ry), np.ones_like(ry)
+    R = np.stack([c, zero, s, zero, one, zero, -s, zero, c], axis=-1).reshape(-1, 3, 3)
+
+    corners = CORNER_SIGNS[None] * half[:, None]
+    corners = np.einsum('nij,nkj->nki', R, corners)
+    return corners + np.asarray(locations, dtype=float).reshape(-1, 1, 3)
+
+# axis-aligned bird's-eye-view rectangles (N, 4) xmin, ymin, xmax, ymax in the ego
+# frame, enclosing the footprint of N camera frame boxes
+def bev_boxes(dimensions, locations, ry, cam_to_ego):
+    corners = create_corners_batch(dimensions, locations, ry) @ cam_to_ego[:3, :3].T + cam_to_ego[:3, 3]
+    xy = corners[..., :2]
+    return np.concatenate([xy.min(1), xy.max(1)], axis=1)
+
 # this is based on the paper. Math!
 # calib is a 3x4 matrix, box_2d is [(xmin, ymin), (xmax, ymax)]
 # Math help: http://ywpkwon.github.io/pdf/bbox3d-study.pdf
 def calc_location(dimension, proj_matrix, box_2d, alpha, theta_ray):
-    #global orientation
-    orient = alpha + theta_ray
-    R = rotation_matrix(orient)
-
-    # format 2d corners
-    xmin = box_2d[0][0]
-    ymin = box_2d[0][1]
-    xmax = box_2d[1][0]
-    ymax = box_2d[1][1]
+    locations, X = calc_locations([dimension], proj_matrix, [box_2d], [alpha], [theta_ray])
+    return locations[0].tolist(), X[0].tolist()
+
+# all 64 (left, top, right, bottom) constraint combinations, in the original loop order
+CONSTRAINT_COMBINATIONS = np.array(list(itertools.product(range(2), range(4), range(2), range(4))))
+
+def calc_locations(dimensions, proj_matrix, boxes_2d, alphas, theta_rays):
+    """
+    Vectorized calc_location for all N objects of a frame. Every candidate
+    constraint configuration of every object is solved in one batched
+    least-squares step.
+
+    Args:
+        dimensions: (N, 3) height, width, length
+        proj_matrix: (3, 4) shared or (N, 3, 4) per object
+        boxes_2d: N boxes [(xmin, ymin), (xmax, ymax)]
+        alphas: (N,) local orientation
+        theta_rays: (N,) ray angle
+
+    Returns:
+        locations (N, 3) and X (N, 4, 3), the corners of the best constraint
+    """
+    dimensions = np.asarray(dimensions, dtype=float).reshape(-1, 3)
+    alphas = np.asarray(alphas, dtype=float).reshape(-1)
+    theta_rays = np.asarray(theta_rays, dtype=float).reshape(-1)
+    n = len(dimensions)
+    if n == 0:
+        return np.zeros((0, 3)), np.zeros((0, 4, 3))
+
+    P = np.broadcast_to(np.asarray(proj_matrix, dtype=float), (n, 3, 4))
+
+    # global orientation, rotation about y: [[c, 0, s], [0, 1, 0], [-s, 0, c]]
+    orient = alphas + theta_rays
+    c, s = np.cos(orient), np.sin(orient)
+    R = np.zeros((n, 3, 3))
+    R[:, 0, 0], R[:, 0, 2], R[:, 1, 1], R[:, 2, 0], R[:, 2, 2] = c, s, 1, -s, c
 
     # left top right bottom
-    box_corners = [xmin, ymin, xmax, ymax]
-
-    # get the point constraints
-    constraints = []
-
-    left_constraints = []
-    right_constraints = []
-    top_constraints = []
-    bottom_constraints = []
+    box_corners = np.asarray(boxes_2d, dtype=float).reshape(n, 4)
 
     # using a different coord system
-    dx = dimension[2] / 2
-    dy = dimension[0] / 2
-    dz = dimension[1] / 2
+    dx = dimensions[:, 2] / 2
+    dy = dimensions[:, 0] / 2
+    dz = dimensions[:, 1] / 2
 
     # below is very much based on trial and error
 
     # based on the relative angle, a different configuration occurs
     # negative is back of car, positive is front
-    left_mult = 1
-    right_mult = -1
-
+    left_mult = np.ones(n)
+    right_mult = -np.ones(n)
     # about straight on but opposite way
-    if alpha < np.deg2rad(92) and alpha > np.deg2rad(88):
-        left_mult = 1
-        right_mult = 1
+    opposite = (alphas < np.deg2rad(92)) & (alphas > np.deg2rad(88))
     # about straight on and same way
-    elif alpha < np.deg2rad(-88) and alpha > np.deg2rad(-92):
-        left_mult = -1
-        right_mult = -1
+    same = ~opposite & (alphas < np.deg2rad(-88)) & (alphas > np.deg2rad(-92))
     # this works but doesnt make much sense
-    elif alpha < np.deg2rad(90) and alpha > -np.deg2rad(90):
-        left_mult = -1
-        right_mult = 1
+    other = ~opposite & ~same & (alphas < np.deg2rad(90)) & (alphas > -np.deg2rad(90))
+    right_mult[opposite] = 1
+    left_mult[same], right_mult[same] = -1, -1
+    left_mult[other], right_mult[other] = -1, 1
 
     # if the car is facing the oppositeway, switch left and right
-    switch_mult = -1
-    if alpha > 0:
-        switch_mult = 1
-
-    # left and right could either be the front of the car ot the back of the car
-    # careful to use left and right based on image, no of actual car's left and right
-    for i in (-1,1):
-        left_constraints.append([left_mult * dx, i*dy, -switch_mult * dz])
-    for i in (-1,1):
-        right_constraints.append([right_mult * dx, i*dy, switch_mult * dz])
-
-    # top and bottom are easy, just the top and bottom of car
-    for i in (-1,1):
-        for j in (-1,1):
-            top_constraints.append([i*dx, -dy, j*dz])
-    for i in (-1,1):
-        for j in (-1,1):
-            bottom_constraints.append([i*dx, dy, j*dz])
-
-    # now, 64 combinations
-    for left in left_constraints:
-        for top in top_constraints:
-            for right in right_constraints:
-                for bottom in bottom_constraints:
-                    constraints.append([left, top, right, bottom])
+    switch_mult = np.where(alphas > 0, 1.0, -1.0)
+
+    # (N, k, 3) candidate corners for each side
+    sign = np.array([-1.0, 1.0])
+    left = np.stack(np.broadcast_arrays(
+        (left_mult * dx)[:, None], sign * dy[:, None], (-switch_mult * dz)[:, None]), axis=-1)
+    right = np.stack(np.broadcast_arrays(
+        (right_mult * dx)[:, None], sign * dy[:, None], (switch_mult * dz)[:, None]), axis=-1)
+    i, j = np.repeat(sign, 2), np.tile(sign, 2)
+    top = np.stack(np.broadcast_arrays(i * dx[:, None], -dy[:, None], j * dz[:, None]), axis=-1)
+    bottom = np.stack(np.broadcast_arrays(i * dx[:, None], dy[:, None], j * dz[:, None]), axis=-1)
+
+    # (N, 64, 4, 3), 64 combinations of [left, top, right, bottom]
+    k = CONSTRAINT_COMBINATIONS
+    X = np.stack([left[:, k[:, 0]], top[:, k[:, 1]], right[:, k[:, 2]], bottom[:, k[:, 3]]], axis=2)
 
     # filter out the ones with repeats
-    constraints = filter(lambda x: len(x) == len(set(tuple(i) for i in x)), constraints)
-
-    # create pre M (the term with I and the R*X)
-    pre_M = np.zeros([4,4])
-    # 1's down diagonal
-    for i in range(0,4):
-        pre_M[i][i] = 1
-
-    best_loc = None
-    best_error = [1e09]
-    best_X = None
-
-    # loop through each possible constraint, hold on to the best guess
-    # constraint will be 64 sets of 4 corners
-    count = 0
-    for constraint in constraints:
-        # each corner
-        Xa = constraint[0]
-        Xb = constraint[1]
-        Xc = constraint[2]
-        Xd = constraint[3]
-
-        X_array = [Xa, Xb, Xc, Xd]
-
-        # M: all 1's down diagonal, and upper 3x1 is Rotation_matrix * [x, y, z]
-        Ma = np.copy(pre_M)
-        Mb = np.copy(pre_M)
-        Mc = np.copy(pre_M)
-        Md = np.copy(pre_M)
-
-        M_array = [Ma, Mb, Mc, Md]
-
-        # create A, b
-        A = np.zeros([4,3], dtype=float)
-        b = np.zeros([4,1])
-
-        indicies = [0,1,0,1]
-        for row, index in enumerate(indicies):
-            X = X_array[row]
-            M = M_array[row]
-
-            # create M for corner Xx
-            RX = np.dot(R, X)
-            M[:3,3] = RX.reshape(3)
-
-            M = np.dot(proj_matrix, M)
-
-            A[row, :] = M[index,:3] - box_corners[row] * M[2,:3]
-            b[row] = box_corners[row] * M[2,3] - M[index,3]
-
-        # solve here with least squares, since over fit will get some error
-        loc, error, rank, s = np.linalg.lstsq(A, b, rcond=None)
-
-        # found a better estimation
-        if error < best_error:
-            count += 1 # for debugging
-            best_loc = loc
-            best_error = error
-            best_X = X_array
-
-    # return best_loc, [left_constraints, right_constraints] # for debugging
-    best_loc = [best_loc[0][0], best_loc[1][0], best_loc[2][0]]
-    return best_loc, best_X
+    valid = np.ones(X.shape[:2], dtype=bool)
+    for a, b in itertools.combinations(range(4), 2):
+        valid &= ~np.all(X[:, :, a] == X[:, :, b], axis=-1)
+
+    # rows use x (index 0) for left/right and y (index 1) for top/bottom
+    index = np.array([0, 1, 0, 1])
+    P_index = P[:, index]  # (N, 4, 4)
+
+    # A does not depend on the constraint: A[row] = P[index, :3] - corner * P[2, :3]
+    A = P_index[:, :, :3] - box_corners[:, :, None] * P[:, None, 2, :3]
+
+    # b[row] = corner * (P[2, :3] . RX + P[2, 3]) - (P[index, :3] . RX + P[index, 3])
+    RX = np.einsum('nij,nckj->ncki', R, X)
+    proj_index = np.einsum('nrj,ncrj->ncr', P_index[:, :, :3], RX) + P_index[:, None, :, 3]
+    proj_depth = np.einsum('nj,ncrj->ncr', P[:, 2, :3], RX) + P[:, None, None, 2, 3]
+    b = box_corners[:, None, :] * proj_depth - proj_index  # (N, 64, 4)
+
+    # solve all 64 systems of an object at once, least squares via the pseudo-inverse
+    loc = np.einsum('nij,ncj->nci', np.linalg.pinv(A), b)  # (N, 64, 3)
+    error = np.sum((np.einsum('nrj,ncj->ncr', A, loc) - b) ** 2, axis=-1)
+    error[~valid] = np.inf
+
+    # first minimum, same tie-breaking as the original sequential search
+    best = np.argmin(error, axis=1)
+    rows = np.arange(n)
+    return loc[rows, best], X[rows, best]
@@ -40,6 +40,7 @@ def create_2d_box(box_2d):
 
 # takes in a 3d point and projects it into 2d
 def project_3d_pt(pt, cam_to_img, calib_file=None):
+    # calibration files are parsed once, see Calib.read_calib_file
     if calib_file is not None:
         cam_to_img = get_calibration_cam_to_image(calib_file)
         R0_rect = get_R0(calib_file)
@@ -82,39 +83,50 @@ def plot_3d_box(img, cam_to_img, ry, dimension, center, color = cv_colors.GREEN.
 
     # plot_3d_pts(img, [center], center, calib_file=calib_file, cam_to_img=cam_to_img)
 
-    R = rotation_matrix(ry)
+    plot_3d_boxes(img, cam_to_img, [ry], [dimension], [center], [color], thickness)
 
-    corners = create_corners(dimension, location=center, R=R)
 
-    # to see the corners on image as red circles
-    # plot_3d_pts(img, corners, center,cam_to_img=cam_to_img, relative=False)
+# takes in N x ... x 3 points and projects them into 2d with one matrix multiply
+def project_3d_pts(pts, cam_to_img):
+    pts = np.asarray(pts, dtype=float)
+    points = np.concatenate([pts, np.ones(pts.shape[:-1] + (1,))], axis=-1) @ np.asarray(cam_to_img).T
 
-    box_3d = []
-    for corner in corners:
-        point = project_3d_pt(corner, cam_to_img)
-        box_3d.append(point)
-    
-    #LINE
-    cv2.line(img, (box_3d[0][0], box_3d[0][1]), (box_3d[2][0],box_3d[2][1]), color, thickness)
-    cv2.line(img, (box_3d[4][0], box_3d[4][1]), (box_3d[6][0],box_3d[6][1]), color, thickness)
-    cv2.line(img, (box_3d[0][0], box_3d[0][1]), (box_3d[4][0],box_3d[4][1]), color, thickness)
-    cv2.line(img, (box_3d[2][0], box_3d[2][1]), (box_3d[6][0],box_3d[6][1]), color, thickness)
+    points = points[..., :2] / points[..., 2:]
+    return points.astype(np.int16)
 
-    cv2.line(img, (box_3d[1][0], box_3d[1][1]), (box_3d[3][0],box_3d[3][1]), color, thickness)
-    cv2.line(img, (box_3d[1][0], box_3d[1][1]), (box_3d[5][0],box_3d[5][1]), color, thickness)
-    cv2.line(img, (box_3d[7][0], box_3d[7][1]), (box_3d[3][0],box_3d[3][1]), color, thickness)
-    cv2.line(img, (box_3d[7][0], box_3d[7][1]), (box_3d[5][0],box_3d[5][1]), color, thickness)
-    for i in range(0,7,2):
-        cv2.line(img, (box_3d[i][0], box_3d[i][1]), (box_3d[i+1][0],box_3d[i+1][1]), color, thickness)
-    # frame to drawing polygon
-    frame = np.zeros_like(img, np.uint8)
 
-    # front side
-    cv2.fillPoly(frame, np.array([[[box_3d[0]], [box_3d[1]], [box_3d[3]], [box_3d[2]]]], dtype=np.int32), cv_colors.BLUE.value)
+# corner index pairs of the 12 box edges, and the front face drawn translucent
+BOX_EDGES = np.array([[0, 2], [4, 6], [0, 4], [2, 6], [1, 3], [1, 5], [7, 3], [7, 5], [0, 1], [2, 3], [4, 5], [6, 7]])
+BOX_FRONT = np.array([0, 1, 3, 2])
+
+# draws all 3d boxes of a frame, each front face is blended only over the region
+# the faces cover instead of over the whole frame
+def plot_3d_boxes(img, cam_to_img, ry, dimensions, centers, colors, thickness = 2):
+    if len(dimensions) == 0:
+        return
+
+    corners = create_corners_batch(dimensions, centers, ry)
+    box_3d = project_3d_pts(corners, cam_to_img).astype(np.int32)
+
+    # one overlay covering the union of all front faces, reused for every box
+    faces = box_3d[:, BOX_FRONT]
+    x0, y0 = np.maximum(faces.reshape(-1, 2).min(0), 0)
+    x1, y1 = np.minimum(faces.reshape(-1, 2).max(0) + 1, [img.shape[1], img.shape[0]])
+    roi = img[y0:y1, x0:x1] if x0 < x1 and y0 < y1 else None
+    frame = np.zeros_like(roi, np.uint8) if roi is not None else None
 
     alpha = 0.5
-    mask = frame.astype(bool)
-    img[mask] = cv2.addWeighted(img, alpha, frame, 1 - alpha, 0)[mask]
+    for box, face, color in zip(box_3d, faces, colors):
+        #LINE
+        cv2.polylines(img, box[BOX_EDGES], False, color, thickness)
+        if roi is None:
+            continue
+
+        # front side, blended box by box so overlapping faces stack as before
+        frame[:] = 0
+        cv2.fillPoly(frame, [face - [x0, y0]], cv_colors.BLUE.value)
+        mask = frame.astype(bool)
+        roi[mask] = cv2.addWeighted(roi, alpha, frame, 1 - alpha, 0)[mask]
 
 def plot_2d_box(img, box_2d):
     # create a square from the corners
@@ -0,0 +1,170 @@
+"""
+IoU tracker over the 2D boxes of consecutive frames, caching regressor outputs per track
+"""
+
+import numpy as np
+
+
+def box_iou(boxes1, boxes2):
+    """
+    IoU of every pair of xmin, ymin, xmax, ymax boxes, (N, 4) x (M, 4) -> (N, M)
+    """
+    boxes1 = np.asarray(boxes1, dtype=float).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=float).reshape(-1, 4)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    return inter / np.maximum(area1[:, None] + area2[None] - inter, 1e-9)
+
+
+class RegressionTracker:
+    """
+    Greedy IoU tracker that lets estimate3d reuse the regressor outputs of a
+    track. Matched tracks get dimensions smoothed over frames, and tracks whose
+    box barely moved reuse their cached orientation and dimensions without
+    running the regressor, for at most max_stale consecutive frames. Locations
+    are still solved every frame.
+
+    One tracker follows one camera stream, frames must be passed in order.
+
+    Args:
+        match_iou (float): Minimum IoU to continue a track.
+        skip_iou (float): Minimum IoU to skip the regressor for a matched track.
+        max_stale (int): Frames in a row a track may reuse its regression, 0 never skips.
+        max_age (int): Frames a track is kept without a match.
+        dim_momentum (float): Weight of a new regression in the smoothed dimensions.
+    """
+
+    def __init__(self, match_iou=0.3, skip_iou=0.9, max_stale=4, max_age=1, dim_momentum=0.3):
+        self.match_iou = match_iou
+        self.skip_iou = skip_iou
+        self.max_stale = max_stale
+        self.max_age = max_age
+        self.dim_momentum = dim_momentum
+        self.reset()
+
+    def reset(self):
+        self.ids = np.zeros(0, dtype=int)
+        self.boxes = np.zeros((0, 4))
+        self.classes = np.zeros(0, dtype=int)
+        self.alphas = np.zeros(0)
+        self.dims = np.zeros((0, 3))
+        self.stale = np.zeros(0, dtype=int)  # frames since the last regression
+        self.misses = np.zeros(0, dtype=int)  # frames since the last match
+        self.next_id = 0
+
+        # counters for stats()
+        self.objects = 0
+        self.matched = 0
+        self.skipped = 0
+
+    def match(self, boxes, classes):
+        """
+        Greedy matching by descending IoU between same-class boxes and tracks
+
+        Returns:
+            track index per box (-1 if unmatched) and the matched IoU
+        """
+        track = np.full(len(boxes), -1)
+        iou = np.zeros(len(boxes))
+        if len(boxes) == 0 or len(self.ids) == 0:
+            return track, iou
+
+        ious = box_iou(boxes, self.boxes)
+        ious[np.asarray(classes)[:, None] != self.classes[None]] = 0
+        used = np.zeros(len(self.ids), dtype=bool)
+        for b, t in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+            if ious[b, t] < self.match_iou:
+                break
+            if track[b] < 0 and not used[t]:
+                track[b], iou[b], used[t] = t, ious[b, t], True
+        return track, iou
+
+    def assign(self, boxes, classes):
+        """
+        Match the boxes of a new frame to the tracks, start tracks for the
+        unmatched boxes and drop tracks missed for more than max_age frames.
+
+        Args:
+            boxes (np.ndarray): (N, 4) xmin, ymin, xmax, ymax boxes.
+            classes (np.ndarray): (N,) class ids.
+
+        Returns:
+            track index per box, for update, and a mask of the boxes whose
+            regression can be reused.
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        classes = np.asarray(classes, dtype=int).reshape(-1)
+        n = len(boxes)
+        track, iou = self.match(boxes, classes)
+        matched = track >= 0
+        skip = matched & (iou >= self.skip_iou)
+        skip[matched] &= self.stale[track[matched]] < self.max_stale
+
+        # unmatched tracks age, matched ones follow their box
+        missed = np.ones(len(self.ids), dtype=bool)
+        missed[track[matched]] = False
+        self.misses[missed] += 1
+        self.misses[track[matched]] = 0
+        self.boxes[track[matched]] = boxes[matched]
+        self.stale[track[skip]] += 1
+
+        # new tracks at the end, their regression is filled in by update
+        new = np.flatnonzero(~matched)
+        track[new] = len(self.ids) + np.arange(len(new))
+        self.ids = np.concatenate([self.ids, self.next_id + np.arange(len(new))])
+        self.next_id += len(new)
+        self.boxes = np.concatenate([self.boxes, boxes[new]])
+        self.classes = np.concatenate([self.classes, classes[new]])
+        self.alphas = np.concatenate([self.alphas, np.zeros(len(new))])
+        self.dims = np.concatenate([self.dims, np.full((len(new), 3), np.nan)])
+        self.stale = np.concatenate([self.stale, np.zeros(len(new), dtype=int)])
+        self.misses = np.concatenate([self.misses, np.zeros(len(new), dtype=int)])
+
+        self.objects += n
+        self.matched += int(matched.sum())
+        self.skipped += int(skip.sum())
+        return track, skip
+
+    def update(self, track, regressed, alphas, dims):
+        """
+        Store the regression of the regressed boxes and drop stale tracks.
+
+        Args:
+            track (np.ndarray): Track index per box, from assign.
+            regressed (np.ndarray): (N,) mask of the boxes that went through the regressor.
+            alphas (np.ndarray): (R,) orientations of the regressed boxes.
+            dims (np.ndarray): (R, 3) dimensions of the regressed boxes.
+
+        Returns:
+            orientation, smoothed dimensions and track id of every box.
+        """
+        t = track[regressed]
+        new = np.isnan(self.dims[t, 0])
+        dims = np.asarray(dims, dtype=float).reshape(-1, 3)
+        self.dims[t] = np.where(new[:, None], dims, (1 - self.dim_momentum) * self.dims[t] + self.dim_momentum * dims)
+        self.alphas[t] = alphas
+        self.stale[t] = 0
+
+        alphas, dims, ids = self.alphas[track], self.dims[track], self.ids[track]
+
+        # forget tracks missed for too long
+        alive = self.misses <= self.max_age
+        if not alive.all():
+            for name in ("ids", "boxes", "classes", "alphas", "dims", "stale", "misses"):
+                setattr(self, name, getattr(self, name)[alive])
+        return alphas, dims, ids
+
+    def stats(self):
+        """
+        Objects seen, share matched to a track and share that skipped the regressor
+        """
+        return {
+            "objects": self.objects,
+            "tracks": len(self.ids),
+            "match_rate": self.matched / self.objects if self.objects else 0.0,
+            "hit_rate": self.skipped / self.objects if self.objects else 0.0,
+        }
@@ -9,7 +9,7 @@ from pathlib import Path
 import sys
 import argparse
 
-from inference import detect3d
+from inference import detect3d, registry
 
 FILE = Path(__file__).resolve()
 ROOT = FILE.parents[0]  # YOLOv5 root directory
@@ -85,5 +85,10 @@ if __name__ == '__main__':
     except:
         print('Directory already exist!')
     opt = parse_opt()
-    app.run(debug=True, host='0.0.0.0', port=5020)
+    debug = True
+    # load and warm up the models once, every request reuses them. With debug the reloader
+    # re-runs this script in a child process that serves the requests, warm up only there
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        registry.warmup(reg_weights='weights/epoch_10.pkl', model_select='resnet')
+    app.run(debug=debug, host='0.0.0.0', port=5020)
     shutil.rmtree('static')
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Pipelined YOLO3D inference
+
+2D detection, 3D estimation (crop, regressor, geometry) and rendering run in
+their own threads connected by bounded queues, so 2D detection of frame N+1
+overlaps with the regressor and geometry of frame N and rendering of frame N-1.
+Every stage is a single thread, so results come out in input order.
+
+Usage:
+    from YOLO3D.pipeline import Pipeline3D
+
+    pipeline = Pipeline3D("weights/resnet18.pkl", "resnet18", "nuscenes")
+    for img, detections in pipeline.run(frames):
+        ...
+    pipeline.report()
+"""
+
+import queue
+import threading
+import time
+
+from YOLO3D.inference import (
+    DETECTOR_WEIGHTS,
+    detect2DFromCVImgs,
+    estimate3d,
+    log_first_inference,
+    registry,
+    render3d,
+    setup_device,
+)
+from YOLO3D.script import ClassAverages
+from YOLO3D.script.Dataset import generate_bins
+from YOLO3D.utils.general import LOGGER
+
+STOP = object()  # end of stream marker, passed down the stages
+
+
+class StageError:
+    """
+    Exception raised by a stage, passed down to the consumer and raised there
+    """
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class Stage(threading.Thread):
+    """
+    One pipeline stage: takes frames from inbox, applies fn and puts them into
+    outbox. Records busy time and the inbox depth seen at every get.
+    """
+
+    def __init__(self, name, fn, inbox, outbox):
+        super().__init__(name=f"yolo3d-{name}", daemon=True)
+        self.stage = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.busy = 0.0
+        self.items = 0
+        self.depth_sum = 0
+        self.depth_max = 0
+
+    def run(self):
+        while True:
+            depth = self.inbox.qsize()
+            item = self.inbox.get()
+            if item is STOP:
+                self.outbox.put(STOP)
+                return
+            if not isinstance(item, StageError):
+                self.depth_sum += depth
+                self.depth_max = max(self.depth_max, depth)
+                t0 = time.perf_counter()
+                try:
+                    self.fn(item)
+                except Exception as e:
+                    item = StageError(e)
+                self.busy += time.perf_counter() - t0
+                self.items += 1
+            self.outbox.put(item)
+
+
+class Pipeline3D:
+    """
+    Producer/consumer YOLO3D pipeline over bounded queues.
+
+    Args:
+        reg_weights (str): Regressor weights.
+        model_select (str): Regressor model: resnet, resnet18 or vgg11.
+        calib_file: Calibration shared by all frames, see get_calibration.
+        roi_filter (callable): Optional filter from create_roi_filter, used for rendering.
+        roi_prefilter (callable): Optional pre-filter from create_roi_prefilter, used before regression.
+        tracker (RegressionTracker): Optional tracker, reuses regressions across frames.
+        reg_precision (str): Regressor precision, fp32, int8 (CPU) or fp16 (CUDA).
+        detector (callable): Optional 2D detector, img -> list of Bbox, i.e. a
+            KeyframeDetector. Defaults to detect2DFromCVImgs on every frame.
+        render (bool): Add the rendering stage, else only detections are returned.
+        queue_size (int): Capacity of every queue between two stages.
+    """
+
+    def __init__(
+        self,
+        reg_weights,
+        model_select,
+        calib_file,
+        roi_filter=None,
+        render=True,
+        device="",
+        half=False,
+        cpu_threads=None,
+        reg_max_batch=None,
+        reg_precision="fp32",
+        roi_prefilter=None,
+        tracker=None,
+        detector=None,
+        weights=DETECTOR_WEIGHTS,
+        det_imgsz=640,
+        queue_size=2,
+    ):
+        # load models (cached across calls)
+        self.device = setup_device(device, cpu_threads)
+        self.half = half
+        self.weights = weights
+        self.regressor = registry.regressor(reg_weights, model_select, self.device, half, reg_precision)
+        self.names = registry.detector(weights, self.device, half).names
+
+        self.calib_file = calib_file
+        self.roi_filter = roi_filter
+        self.render = render
+        self.reg_max_batch = reg_max_batch
+        self.roi_prefilter = roi_prefilter
+        self.tracker = tracker
+        self.detector = detector
+        self.det_imgsz = det_imgsz
+        self.queue_size = queue_size
+
+        self.averages = ClassAverages.ClassAverages()
+        self.angle_bins = generate_bins(2)
+
+        self.stages = []
+        self.wall = 0.0
+
+    def detect_2d(self, frame):
+        if self.detector is not None:
+            frame["dets"] = self.detector(frame["img"])
+            return
+        frame["dets"] = detect2DFromCVImgs(
+            self.weights, [frame["img"]], device=self.device, half=self.half, imgsz=self.det_imgsz
+        )[0]
+
+    def estimate_3d(self, frame):
+        frame["detections"] = estimate3d(
+            frame["img"],
+            frame["dets"],
+            frame["calib"],
+            self.regressor,
+            self.averages,
+            self.angle_bins,
+            names=self.names,
+            device=self.device,
+            reg_max_batch=self.reg_max_batch,
+            prefilter=self.roi_prefilter,
+            tracker=self.tracker,
+        )
+        log_first_inference()
+
+    def render_3d(self, frame):
+        frame["output"] = render3d(frame["img"].copy(), frame["detections"], roi_filter=self.roi_filter)
+
+    def run(self, frames, calibs=None):
+        """
+        Run the pipeline over an iterable of BGR frames.
+
+        Args:
+            frames (Iterable[np.ndarray]): Frames, consumed by a feeder thread.
+            calibs (Iterable): Optional calibration per frame, else calib_file.
+
+        Yields:
+            (rendered image or None, Detections3D) per frame, in input order.
+        """
+        steps = [("detect2d", self.detect_2d), ("estimate3d", self.estimate_3d)]
+        if self.render:
+            steps.append(("render", self.render_3d))
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(steps) + 1)]
+        self.stages = [Stage(name, fn, queues[i], queues[i + 1]) for i, (name, fn) in enumerate(steps)]
+        stop = threading.Event()
+
+        def feed():
+            # errors of the frame source or calibs go down the stages like stage errors,
+            # the end marker is always sent so the consumer never blocks
+            try:
+                calib_iter = iter(calibs) if calibs is not None else None
+                for i, img in enumerate(frames):
+                    if stop.is_set():
+                        break
+                    calib = self.calib_file
+                    if calib_iter is not None:
+                        calib = next(calib_iter, STOP)
+                        if calib is STOP:
+                            raise ValueError(f"calibs has fewer entries than frames, none for frame {i}")
+                    queues[0].put({"index": i, "img": img, "calib": calib})
+            except Exception as e:
+                queues[0].put(StageError(e))
+            finally:
+                queues[0].put(STOP)
+
+        t0 = time.perf_counter()
+        feeder = threading.Thread(target=feed, name="yolo3d-feed", daemon=True)
+        feeder.start()
+        for stage in self.stages:
+            stage.start()
+
+        item = None
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is STOP:
+                    break
+                if isinstance(item, StageError):
+                    raise item.exception
+                yield item.get("output"), item["detections"]
+        finally:
+            # stop early consumers cleanly: stop feeding and drain until the end marker
+            stop.set()
+            while item is not STOP:
+                item = queues[-1].get()
+            self.wall = time.perf_counter() - t0
+
+    def stats(self):
+        """
+        Per stage processed frames, busy time, utilization (busy / wall time of
+        the last run) and mean and max depth of its input queue
+        """
+        return {
+            stage.stage: {
+                "frames": stage.items,
+                "busy_s": stage.busy,
+                "utilization": stage.busy / self.wall if self.wall else 0.0,
+                "queue_mean": stage.depth_sum / stage.items if stage.items else 0.0,
+                "queue_max": stage.depth_max,
+            }
+            for stage in self.stages
+        }
+
+    def report(self):
+        stats = self.stats()
+        frames = max([s["frames"] for s in stats.values()], default=0)
+        LOGGER.info(f"Pipeline3D: {frames} frames in {self.wall:.2f}s ({frames / max(self.wall, 1e-9):.2f} FPS)")
+        LOGGER.info(f"{'stage':>12}{'frames':>8}{'busy (s)':>10}{'util':>7}{'queue mean':>12}{'queue max':>11}")
+        for name, s in stats.items():
+            LOGGER.info(
+                f"{name:>12}{s['frames']:>8}{s['busy_s']:>10.2f}{s['utilization']:>7.0%}"
+                f"{s['queue_mean']:>12.2f}{s['queue_max']:>11}"
+            )
+        return stats
+
+
+def detect3DPipelined(reg_weights, model_select, imgs, calib_file, roi_filter=None, render=True, **kwargs):
+    """
+    Pipelined counterpart of detect3DFromCVImg(..., return_detections=True).
+
+    Returns:
+        (rendered images, list of Detections3D), in input order. Images are
+        None when render is False.
+    """
+    pipeline = Pipeline3D(reg_weights, model_select, calib_file, roi_filter=roi_filter, render=render, **kwargs)
+    imgs_output, detections_list = [], []
+    for img, detections in pipeline.run(imgs):
+        imgs_output.append(img)
+        detections_list.append(detections)
+    pipeline.report()
+    return imgs_output, detections_list
@@ -7,13 +7,15 @@ from pathlib import Path
 
 import numpy as np
 import cv2
+import torch
 
 from torchvision import transforms
+from torchvision.ops import roi_align
 
 from torch.utils import data
 
 # library
-from YOLO3D.library.Calib import get_P
+from YOLO3D.library.Calib import get_P, get_calibration
 
 from .ClassAverages import ClassAverages
 
@@ -23,6 +25,10 @@ if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))  # add ROOT to PATH
 ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 
+# normalization of the regressor input
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
 def generate_bins(bins):
     angle_bins = np.zeros(bins)
     interval = 2 * np.pi / bins
@@ -202,19 +208,60 @@ class Dataset(data.Dataset):
         return label
 
 
+def format_imgs(img, boxes_2d, device='cpu', size=224):
+    """
+    Batched counterpart of DetectedObject.format_img. The frame is uploaded once,
+    every box is cropped and resized with roi_align (bilinear) and normalized on
+    the device. DetectedObject.format_img stays as the per-object reference.
+
+    Args:
+        img: BGR frame (H, W, 3) uint8
+        boxes_2d: list of [(xmin, ymin), (xmax, ymax)]
+        device: device to crop on, usually the regressor's device
+
+    Returns:
+        (N, 3, size, size) float32 tensor on device, ready for the regressor
+    """
+    n = len(boxes_2d)
+    if n == 0:
+        return torch.zeros((0, 3, size, size), device=device)
+
+    height, width = img.shape[:2]
+
+    # (1, 3, H, W) in [0, 1], same channel order as ToTensor (BGR stays BGR)
+    frame = torch.from_numpy(np.ascontiguousarray(img)).to(device)
+    frame = frame.permute(2, 0, 1)[None].float().div_(255)
+
+    # [batch index, x1, y1, x2, y2], inclusive pixel boxes to continuous coords
+    boxes = np.zeros((n, 5), dtype=np.float32)
+    boxes[:, 1:] = np.reshape(boxes_2d, (n, 4))
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, width - 1)
+    boxes[:, [2, 4]] = boxes[:, [2, 4]].clip(0, height - 1)
+    boxes[:, 3:] += 1
+    boxes = torch.from_numpy(boxes).to(device)
+
+    # aligned=True with one sample per bin matches cv2.resize pixel centers
+    batch = roi_align(frame, boxes, output_size=size, spatial_scale=1.0, sampling_ratio=1, aligned=True)
+
+    mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+    return batch.sub_(mean).div_(std)
+
+
 class DetectedObject:
     """
     Processing image for NN input
     """
-    def __init__(self, img, detection_class, box_2d, proj_matrix, label=None):
+    def __init__(self, img, detection_class, box_2d, proj_matrix, label=None, crop=True):
 
-        # check if proj_matrix is path
-        # if isinstance(proj_matrix, str):
-        proj_matrix = get_P(proj_matrix)
+        # proj_matrix may be a path, a nuScenes record, a matrix or a Calibration,
+        # all resolved through the calibration cache
+        calib = get_calibration(proj_matrix)
 
-        self.proj_matrix = proj_matrix
-        self.theta_ray = self.calc_theta_ray(img, box_2d, proj_matrix)
-        self.img = self.format_img(img, box_2d)
+        self.proj_matrix = calib.P
+        self.theta_ray = self.calc_theta_ray(img, box_2d, calib)
+        # crop=False when the crops are made in a batch with format_imgs
+        self.img = self.format_img(img, box_2d) if crop else None
         self.label = label
         self.detection_class = detection_class
 
@@ -224,7 +271,7 @@ class DetectedObject:
         """
         width = img.shape[1]
         # Angle of View: fovx (rad) => 3.14
-        fovx = 2 * np.arctan(width / (2 * proj_matrix[0][0]))
+        fovx = get_calibration(proj_matrix).fovx(width)
         center = (box_2d[1][0] + box_2d[0][0]) / 2
         dx = center - (width/2)
 
@@ -240,8 +287,8 @@ class DetectedObject:
     def format_img(self, img, box_2d):
         # transforms
         normalize = transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225])
+            mean=IMAGENET_MEAN,
+            std=IMAGENET_STD)
 
         process = transforms.Compose([
             transforms.ToTensor(),
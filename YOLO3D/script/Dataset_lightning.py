@@ -17,7 +17,7 @@ from torch.utils.data import random_split
 import pytorch_lightning as pl
 
 # library
-from library.Calib import get_P
+from library.Calib import get_P, get_calibration
 
 from .ClassAverages import ClassAverages
 
@@ -245,12 +245,11 @@ class DetectedObject:
     """
     def __init__(self, img, detection_class, box_2d, proj_matrix, label=None):
 
-        # check if proj_matrix is path
-        if isinstance(proj_matrix, str):
-            proj_matrix = get_P(proj_matrix)
+        # proj_matrix may be a path or a matrix, resolved through the calibration cache
+        calib = get_calibration(proj_matrix)
 
-        self.proj_matrix = proj_matrix
-        self.theta_ray = self.calc_theta_ray(img, box_2d, proj_matrix)
+        self.proj_matrix = calib.P
+        self.theta_ray = self.calc_theta_ray(img, box_2d, calib)
         self.img = self.format_img(img, box_2d)
         self.label = label
         self.detection_class = detection_class
@@ -261,7 +260,7 @@ class DetectedObject:
         """
         width = img.shape[1]
         # Angle of View: fovx (rad) => 3.14
-        fovx = 2 * np.arctan(width / (2 * proj_matrix[0][0]))
+        fovx = get_calibration(proj_matrix).fovx(width)
         center = (box_2d[1][0] + box_2d[0][0]) / 2
         dx = center - (width/2)
 
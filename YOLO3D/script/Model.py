@@ -2,10 +2,17 @@
 Script for regressor model generator
 """
 
+import json
+from pathlib import Path
+
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from YOLO3D.utils.general import LOGGER, check_requirements
+from YOLO3D.utils.torch_utils import fuse_conv_and_bn
+
 
 def OrientationLoss(orient_batch, orientGT_batch, confGT_batch):
     """
@@ -66,7 +73,7 @@ class ResNet(nn.Module):
 
     def forward(self, x):
         x = self.model(x)
-        x = x.view(-1, 512)
+        x = x.reshape(-1, 512)
 
         orientation = self.orientation(x)
         orientation = orientation.view(-1, self.bins, 2)
@@ -117,7 +124,7 @@ class ResNet18(nn.Module):
 
     def forward(self, x):
         x = self.model(x)
-        x = x.view(-1, 512 * 7 * 7)
+        x = x.reshape(-1, 512 * 7 * 7)  # reshape, the features may be channels_last
 
         orientation = self.orientation(x)
         orientation = orientation.view(-1, self.bins, 2)
@@ -172,7 +179,7 @@ class VGG11(nn.Module):
 
     def forward(self, x):
         x = self.model(x)
-        x = x.view(-1, 512 * 7 * 7)
+        x = x.reshape(-1, 512 * 7 * 7)  # reshape, the features may be channels_last
 
         orientation = self.orientation(x)
         orientation = orientation.view(-1, self.bins, 2)
@@ -184,5 +191,188 @@ class VGG11(nn.Module):
 
         return orientation, confidence, dimension
 
+def pooled_features(features, channels, reduce=256):
+    """
+    Backbone features reduced by a 1x1 conv and globally average pooled,
+    (N, 3, 224, 224) -> (N, reduce)
+    """
+    return nn.Sequential(
+        features,
+        nn.Conv2d(channels, reduce, kernel_size=1, bias=False),
+        nn.BatchNorm2d(reduce),
+        nn.ReLU(True),
+        nn.AdaptiveAvgPool2d(1),
+        nn.Flatten(),
+    )
+
+
+class PooledRegressor(nn.Module):
+    """
+    Lightweight regressor: the heads read a pooled reduce-dim feature shared by
+    all three instead of the flattened 7 x 7 x 512 map, which cuts the head
+    weights from ~38M to ~0.3M parameters and the per object GEMMs with them.
+    """
+
+    def __init__(self, features, channels, bins=2, w=0.4, reduce=256):
+        super(PooledRegressor, self).__init__()
+        self.bins = bins
+        self.w = w
+        self.model = pooled_features(features, channels, reduce)
+
+        # orientation head, for orientation estimation
+        self.orientation = nn.Sequential(
+            nn.Linear(reduce, 256),
+            nn.ReLU(True),
+            nn.Dropout(),
+            nn.Linear(256, bins*2) # 4 bins
+        )
+
+        # confident head, for orientation estimation
+        self.confidence = nn.Sequential(
+            nn.Linear(reduce, 256),
+            nn.ReLU(True),
+            nn.Dropout(),
+            nn.Linear(256, bins)
+        )
+
+        # dimension head
+        self.dimension = nn.Sequential(
+            nn.Linear(reduce, 256),
+            nn.ReLU(True),
+            nn.Dropout(),
+            nn.Linear(256, 3) # x, y, z
+        )
+
+    def forward(self, x):
+        x = self.model(x)
+
+        orientation = self.orientation(x)
+        orientation = orientation.view(-1, self.bins, 2)
+        orientation = F.normalize(orientation, dim=2)
+
+        confidence = self.confidence(x)
+
+        dimension = self.dimension(x)
+
+        return orientation, confidence, dimension
+
+class ResNet18Pooled(PooledRegressor):
+    def __init__(self, model=None, bins=2, w=0.4):
+        super(ResNet18Pooled, self).__init__(nn.Sequential(*(list(model.children())[:-2])), 512, bins, w)
+
+class MobileNetV3(PooledRegressor):
+    def __init__(self, model=None, bins=2, w=0.4):
+        # torchvision mobilenet_v3_small (576 channels) or mobilenet_v3_large (960 channels)
+        super(MobileNetV3, self).__init__(model.features, model.features[-1][0].out_channels, bins, w)
+
+
+def fuse_regressor(model):
+    """
+    Fold every BatchNorm2d into the Conv2d registered right before it, as in
+    the torchvision ResNet blocks, for inference and export. In place.
+    """
+    for module in list(model.modules()):
+        children = list(module.named_children())
+        for (name_conv, conv), (name_bn, bn) in zip(children, children[1:]):
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                setattr(module, name_conv, fuse_conv_and_bn(conv, bn))
+                setattr(module, name_bn, nn.Identity())
+    return model
+
+
+# regressor precisions selectable at load time, the checkpoint always stays FP32
+REG_PRECISIONS = ('fp32', 'int8', 'fp16')
+
+
+class AutocastRegressor(nn.Module):
+    """
+    Runs a regressor under FP16 autocast on CUDA and returns FP32 outputs, so
+    the weights and the checkpoint stay FP32
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.bins = model.bins
+
+    def forward(self, x):
+        with torch.autocast('cuda', dtype=torch.float16):
+            out = self.model(x)
+        return [o.float() for o in out]
+
+
+def quantize_regressor(model, precision='fp32', device=torch.device('cpu')):
+    """
+    Regressor in the requested inference precision:
+        fp32:   unchanged
+        int8:   dynamic INT8 quantization of the Linear layers (the 25088-wide
+                head inputs hold most of the weights), CPU only
+        fp16:   FP16 autocast, CUDA only
+    Unsupported combinations fall back to fp32 with a warning.
+    """
+    if precision not in REG_PRECISIONS:
+        raise ValueError(f'Unknown regressor precision {precision}, expected one of {REG_PRECISIONS}')
+    if precision == 'int8':
+        if device.type != 'cpu':
+            LOGGER.warning(f'WARNING: INT8 regressor is only supported on the CPU, using fp32 on {device}')
+            return model
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    if precision == 'fp16':
+        if device.type != 'cuda':
+            LOGGER.warning(f'WARNING: FP16 autocast regressor is only supported on CUDA, using fp32 on {device}')
+            return model
+        return AutocastRegressor(model)
+    return model
+
+
+class RegressorMultiBackend(nn.Module):
+    """
+    Exported regressor with the interface of the eager one: forward returns
+    orientation, confidence and dimension, and bins, device and dtype are
+    attributes.
+
+    Usage:
+        TorchScript:    weights = *.torchscript
+        ONNX Runtime:   weights = *.onnx
+    """
+
+    def __init__(self, weights, device=torch.device("cpu")):
+        super().__init__()
+        w = str(weights)
+        suffix = Path(w).suffix.lower()
+        self.jit, self.onnx = suffix == ".torchscript", suffix == ".onnx"
+        self.device = device
+        self.dtype = torch.float32
+
+        if self.jit:  # TorchScript
+            LOGGER.info(f'Loading {w} for TorchScript inference...')
+            extra_files = {'config.txt': ''}  # model metadata
+            self.model = torch.jit.load(w, map_location=device, _extra_files=extra_files)
+            meta = json.loads(extra_files['config.txt'] or '{}')
+        elif self.onnx:  # ONNX Runtime
+            LOGGER.info(f'Loading {w} for ONNX Runtime inference...')
+            cuda = device.type == 'cuda'
+            check_requirements(('onnx', 'onnxruntime-gpu' if cuda else 'onnxruntime'))
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()  # follow --cpu_threads
+            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if cuda else ['CPUExecutionProvider']
+            self.session = onnxruntime.InferenceSession(w, options, providers=providers)
+            meta = self.session.get_modelmeta().custom_metadata_map
+            self.output_names = [o.name for o in self.session.get_outputs()]
+        else:
+            raise ValueError(f'Unsupported regressor format {w}, expected *.onnx or *.torchscript')
+        self.bins = int(meta.get('bins', 2))
+        self.model_select = meta.get('model_select')
+
+    def forward(self, x):
+        if self.jit:
+            return self.model(x.to(self.device, self.dtype))
+        # ONNX Runtime on NCHW float32 numpy
+        x = np.ascontiguousarray(x.float().cpu().numpy())
+        y = self.session.run(self.output_names, {self.session.get_inputs()[0].name: x})
+        return [torch.from_numpy(v) for v in y]
+
+
 if __name__ == '__main__':
     print('test')
@@ -9,8 +9,10 @@ from torchvision import models
 
 import pytorch_lightning as pl
 
+from .Model import pooled_features
+
 class Model(pl.LightningModule):
-    def __init__(self, model_select='resnet18', bins=2, w=0.4, lr=0.0001, alpha=0.6):
+    def __init__(self, model_select='resnet18', bins=2, w=0.4, lr=0.0001, alpha=0.6, pretrained=True):
         super(Model, self).__init__()
         self.save_hyperparameters()
         self.bins = bins
@@ -23,9 +25,8 @@ class Model(pl.LightningModule):
         self.dim_loss_func = nn.MSELoss()
         self.orient_loss_func = OrientationLoss
 
-        # base model
-        self.model = model_factory(model_select)[0]
-        self.in_features = model_factory(model_select)[1]
+        # base model, pretrained=False when a checkpoint will be loaded on top
+        self.model, self.in_features = model_factory(model_select, pretrained)
 
         # orientation head, for orientation estimation
         self.orientation = nn.Sequential(
@@ -139,28 +140,39 @@ def OrientationLoss(orient_batch, orientGT_batch, confGT_batch):
 
     return -1 * torch.cos(theta_diff - estimated_theta_diff).mean()
 
-def model_factory(model_select):
-
+def model_factory(model_select, pretrained=True):
+    """
+    Build only the selected backbone, returns [model, in_features]
+    """
     # resnet light
-    resnet = models.resnet18(pretrained=True)
-    resnet.fc = nn.Linear(512, 512)
+    if model_select == 'resnet':
+        resnet = models.resnet18(pretrained=pretrained)
+        resnet.fc = nn.Linear(512, 512)
+        return [resnet, 512]
 
     # resnet18
-    resnet18 = models.resnet18(pretrained=True)
-    resnet18 = nn.Sequential(*(list(resnet18.children())[:-2]))
+    if model_select == 'resnet18':
+        resnet18 = models.resnet18(pretrained=pretrained)
+        resnet18 = nn.Sequential(*(list(resnet18.children())[:-2]))
+        return [resnet18, 512 * 7 * 7]
 
     # vgg11
-    vgg11 = models.vgg11(pretrained=True)
-    vgg11 = vgg11.features
-
-    # store [model, in_features]
-    model = {
-        'resnet': [resnet, 512],
-        'resnet18': [resnet18, 512 * 7 * 7],
-        'vgg11': [vgg11, 512 * 7 * 7]
-    }
-
-    return model[model_select]
+    if model_select == 'vgg11':
+        vgg11 = models.vgg11(pretrained=pretrained)
+        vgg11 = vgg11.features
+        return [vgg11, 512 * 7 * 7]
+
+    # lightweight variants, heads on a pooled 256-dim feature
+    if model_select == 'resnet18_pooled':
+        resnet18 = models.resnet18(pretrained=pretrained)
+        resnet18 = nn.Sequential(*(list(resnet18.children())[:-2]))
+        return [pooled_features(resnet18, 512), 256]
+
+    if model_select in ('mobilenet_v3_small', 'mobilenet_v3_large'):
+        mobilenet = getattr(models, model_select)(pretrained=pretrained).features
+        return [pooled_features(mobilenet, mobilenet[-1][0].out_channels), 256]
+
+    raise KeyError(model_select)
 
 if __name__ == '__main__':
     print('test')
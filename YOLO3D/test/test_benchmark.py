@@ -0,0 +1,18 @@
+import numpy as np
+
+from YOLO3D.benchmark import latency, synthetic_objects
+from YOLO3D.library.Calib import get_calibration
+
+
+def test_latency_percentiles_and_throughput():
+    stats = latency(np.arange(1, 101) / 1e3, items=10)
+    assert stats["runs"] == 100
+    assert np.isclose(stats["p50_ms"], 50.5)
+    assert stats["p50_ms"] <= stats["p90_ms"] <= stats["p99_ms"] <= 100
+    assert np.isclose(stats["throughput"], 10 / 0.0505)
+
+
+def test_synthetic_objects_in_front_of_camera():
+    boxes, dims, alphas, theta_rays, locations = synthetic_objects(20, get_calibration("nuscenes"))
+    assert len(boxes) == len(dims) == len(alphas) == len(theta_rays) == 20
+    assert locations.shape == (20, 3)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from YOLO3D.inference import bev_nms
+from YOLO3D.library.Math import bev_boxes
+
+
+def test_bev_boxes_front_camera():
+    # nuScenes-style front camera: camera z is ego x, camera x is ego -y
+    cam_to_ego = np.eye(4)
+    cam_to_ego[:3, :3] = [[0, 0, 1], [-1, 0, 0], [0, -1, 0]]
+    cam_to_ego[:3, 3] = [1.5, 0, 1.5]
+
+    boxes = bev_boxes([[1.5, 2.0, 4.0]], [[2.0, 1.0, 10.0]], [0.0], cam_to_ego)
+    assert np.allclose(boxes, [[11.5 - 1.0, -2.0 - 2.0, 11.5 + 1.0, -2.0 + 2.0]])
+
+
+def test_bev_nms_merges_across_cameras_only():
+    boxes = np.array([[0, 0, 4, 2], [0.2, 0, 4.2, 2], [0.1, 0, 4.1, 2], [10, 0, 14, 2]], dtype=float)
+    scores = np.array([0.6, 0.9, 0.8, 0.7])
+    classes = np.array([0, 0, 0, 0])
+    cameras = np.array([0, 1, 1, 0])
+
+    # box 1 suppresses box 0 (other camera); box 2 is seen by the same camera as box 1 and stays
+    assert bev_nms(boxes, scores, classes, cameras, 0.5).tolist() == [1, 2, 3]
+    assert bev_nms(boxes, scores, np.array([0, 1, 1, 0]), cameras, 0.5).tolist() == [0, 1, 2, 3]
@@ -0,0 +1,83 @@
+import itertools
+
+import numpy as np
+
+from YOLO3D.library.Math import calc_location, calc_locations, create_corners, create_corners_batch, rotation_matrix
+
+PROJ_MATRIX = np.array([[721.5, 0.0, 609.6, 44.9], [0.0, 721.5, 172.9, 0.2], [0.0, 0.0, 1.0, 0.003]])
+
+
+def reference_calc_location(dimension, proj_matrix, box_2d, alpha, theta_ray):
+    """
+    The original per-object constraint search, kept as the reference for the batched solve
+    """
+    R = rotation_matrix(alpha + theta_ray)
+    box_corners = [box_2d[0][0], box_2d[0][1], box_2d[1][0], box_2d[1][1]]
+    dx, dy, dz = dimension[2] / 2, dimension[0] / 2, dimension[1] / 2
+
+    left_mult, right_mult = 1, -1
+    if np.deg2rad(88) < alpha < np.deg2rad(92):
+        left_mult, right_mult = 1, 1
+    elif np.deg2rad(-92) < alpha < np.deg2rad(-88):
+        left_mult, right_mult = -1, -1
+    elif -np.deg2rad(90) < alpha < np.deg2rad(90):
+        left_mult, right_mult = -1, 1
+    switch_mult = 1 if alpha > 0 else -1
+
+    left = [[left_mult * dx, i * dy, -switch_mult * dz] for i in (-1, 1)]
+    right = [[right_mult * dx, i * dy, switch_mult * dz] for i in (-1, 1)]
+    top = [[i * dx, -dy, j * dz] for i in (-1, 1) for j in (-1, 1)]
+    bottom = [[i * dx, dy, j * dz] for i in (-1, 1) for j in (-1, 1)]
+    constraints = [c for c in itertools.product(left, top, right, bottom) if len(set(tuple(x) for x in c)) == 4]
+
+    best_loc, best_error, best_X = None, [1e09], None
+    for X_array in constraints:
+        A, b = np.zeros([4, 3]), np.zeros([4, 1])
+        for row, index in enumerate([0, 1, 0, 1]):
+            M = np.eye(4)
+            M[:3, 3] = np.dot(R, X_array[row])
+            M = np.dot(proj_matrix, M)
+            A[row, :] = M[index, :3] - box_corners[row] * M[2, :3]
+            b[row] = box_corners[row] * M[2, 3] - M[index, 3]
+        loc, error, _, _ = np.linalg.lstsq(A, b, rcond=None)
+        if error < best_error:
+            best_loc, best_error, best_X = loc, error, X_array
+    return best_loc[:, 0], np.array(best_X)
+
+
+def random_objects(n, seed=0):
+    rng = np.random.default_rng(seed)
+    xmin, ymin = rng.uniform(0, 1100, n), rng.uniform(100, 300, n)
+    boxes = [[(x, y), (x + w, y + h)] for x, y, w, h in zip(xmin, ymin, rng.uniform(20, 300, n), rng.uniform(20, 150, n))]
+    alphas = rng.uniform(-np.pi, np.pi, n)
+    alphas[:4] = np.deg2rad([90.5, -90.5, 45, -135])  # every orientation branch
+    dims = rng.uniform([1.0, 0.5, 0.5], [4.0, 3.0, 12.0], (n, 3))
+    theta_rays = rng.uniform(-0.6, 0.6, n)
+    return dims, boxes, alphas, theta_rays
+
+
+def test_calc_locations_matches_reference():
+    dims, boxes, alphas, theta_rays = random_objects(200)
+    locations, X = calc_locations(dims, PROJ_MATRIX, boxes, alphas, theta_rays)
+    for i in range(len(dims)):
+        ref_loc, ref_X = reference_calc_location(dims[i], PROJ_MATRIX, boxes[i], alphas[i], theta_rays[i])
+        assert np.allclose(locations[i], ref_loc, rtol=1e-9, atol=1e-9)
+        assert np.array_equal(X[i], ref_X)
+
+    # single object wrapper
+    location, _ = calc_location(dims[0], PROJ_MATRIX, boxes[0], alphas[0], theta_rays[0])
+    assert np.allclose(location, locations[0])
+
+
+def test_calc_locations_empty():
+    locations, X = calc_locations([], PROJ_MATRIX, [], [], [])
+    assert locations.shape == (0, 3) and X.shape == (0, 4, 3)
+
+
+def test_create_corners_batch_matches_create_corners():
+    dims, _, alphas, _ = random_objects(10)
+    locations = np.random.default_rng(1).uniform(-20, 20, (10, 3))
+    corners = create_corners_batch(dims, locations, alphas)
+    for i in range(10):
+        assert np.allclose(corners[i], create_corners(dims[i], locations[i], rotation_matrix(alphas[i])))
+    assert create_corners_batch(np.zeros((0, 3)), np.zeros((0, 3)), []).shape == (0, 8, 3)
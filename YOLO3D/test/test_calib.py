@@ -0,0 +1,70 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from YOLO3D.library import Calib
+from YOLO3D.library.Calib import get_calibration, get_calibration_cam_to_image, get_P
+
+CAM_TO_CAM = """calib_time: 09-Jan-2012 13:57:47
+P_rect_02: 7.215377e+02 0.000000e+00 6.095593e+02 4.485728e+01 0.000000e+00 7.215377e+02 1.728540e+02 2.163791e-01 0.000000e+00 0.000000e+00 1.000000e+00 2.745884e-03
+"""
+
+
+def test_calibration_file_cached_until_modified(tmp_path):
+    calib_file = tmp_path / "calib_cam_to_cam.txt"
+    calib_file.write_text(CAM_TO_CAM)
+
+    calib = get_calibration(str(calib_file))
+    assert get_calibration(str(calib_file)) is calib
+    assert calib.fx == pytest.approx(721.5377)
+    assert calib.fovx(1242) == pytest.approx(2 * np.arctan(1242 / (2 * 721.5377)))
+    with pytest.raises(ValueError):
+        calib.P[0, 0] = 1.0  # read-only
+
+    calib_file.write_text(CAM_TO_CAM.replace("7.215377e+02", "7.000000e+02"))
+    os.utime(calib_file, ns=(0, os.stat(calib_file).st_mtime_ns + 10**9))
+    assert get_P(str(calib_file))[0, 0] == pytest.approx(700.0)
+
+
+def test_calibration_sources():
+    sensor = {"token": "cam_front", "camera_intrinsic": [[1266.4, 0, 816.3], [0, 1266.4, 491.5], [0, 0, 1]],
+              "rotation": [1, 0, 0, 0], "translation": [1.7, 0.0, 1.5]}
+    calib = get_calibration(sensor)
+    assert get_calibration(dict(sensor)) is calib
+    assert np.array_equal(calib.cam_to_ego[:3, 3], [1.7, 0.0, 1.5])
+
+    assert get_calibration("nuscenes").cam_to_ego is None
+    assert np.array_equal(get_P(np.array(calib.P)), calib.P)
+
+
+def test_kitti_object_calibration(tmp_path):
+    calib_file = tmp_path / "000000.txt"
+    calib_file.write_text("P2: " + " ".join(str(float(i)) for i in range(12)) + "\n")
+    assert np.array_equal(get_calibration_cam_to_image(str(calib_file)), np.arange(12.0).reshape(3, 4))
+
+
+def test_calibration_cache_bounded_and_replaced(tmp_path, monkeypatch):
+    monkeypatch.setattr(Calib, "calibration_cache", OrderedDict())
+    monkeypatch.setattr(Calib, "CALIBRATION_CACHE_SIZE", 4)
+    calib_file = tmp_path / "calib_cam_to_cam.txt"
+    calib_file.write_text(CAM_TO_CAM)
+    for mtime in range(3):
+        os.utime(calib_file, ns=(0, (mtime + 1) * 10**9))
+        get_calibration(str(calib_file))
+    # one calibration and one rows entry for the file, whatever its mtime
+    assert len(Calib.calibration_cache) == 2
+
+    for i in range(10):
+        get_calibration(np.eye(3, 4) * (i + 1))
+    assert len(Calib.calibration_cache) == 4
+
+
+def test_calibration_without_projection(tmp_path):
+    calib_file = tmp_path / "calib_velo_to_cam.txt"
+    calib_file.write_text("R: " + " ".join(["1.0"] * 9) + "\n")
+    assert Calib.parse_P(str(calib_file)) is None
+    assert get_P(str(calib_file)) is None
+    with pytest.raises(ValueError, match="calib_velo_to_cam.txt has no P_rect_02"):
+        get_calibration(str(calib_file))
@@ -0,0 +1,50 @@
+import numpy as np
+
+from YOLO3D.library.Calib import get_cam_to_ego
+from YOLO3D.library.Detections import Detections3D
+
+
+def make_detections():
+    return Detections3D.from_arrays(
+        class_id=[0, 2],
+        score=[0.9, 0.6],
+        box_2d=[[10, 20, 110, 220], [300, 40, 380, 90]],
+        dim=[[1.5, 1.9, 4.5], [1.7, 0.6, 0.8]],
+        alpha=[0.1, -1.2],
+        theta_ray=[0.3, 0.05],
+        location=[[-2.0, 1.0, 15.0], [3.0, 1.2, 30.0]],
+        names={0: "car", 2: "pedestrian"},
+        proj_matrix=np.eye(3, 4),
+    )
+
+
+def test_detections_fields_and_masks():
+    detections = make_detections()
+
+    assert len(detections) == 2
+    assert detections.classes == ["car", "pedestrian"]
+    assert np.allclose(detections.yaw, [0.4, -1.15])
+    assert np.isnan(detections.location_ego).all()
+    assert detections[detections.score > 0.8].classes == ["car"]
+
+
+def test_detections_save_load(tmp_path):
+    detections = make_detections()
+    detections.save(tmp_path / "detections.npz")
+    loaded = Detections3D.load(tmp_path / "detections.npz")
+
+    assert loaded.data.tobytes() == detections.data.tobytes()  # location_ego is NaN
+    assert loaded.names == detections.names
+    assert np.array_equal(loaded.proj_matrix, detections.proj_matrix)
+
+
+def test_detections_to_ego():
+    # nuScenes CAM_FRONT: camera front is ego x, camera right is ego -y, camera down is ego -z
+    calibrated_sensor = {
+        "rotation": [0.5, -0.5, 0.5, -0.5],
+        "translation": [1.7, 0.0, 1.5],
+    }
+    detections = make_detections().to_ego(get_cam_to_ego(calibrated_sensor))
+
+    assert np.allclose(detections.location_ego[0], [16.7, 2.0, 0.5])
+    assert get_cam_to_ego("nuscenes") is None
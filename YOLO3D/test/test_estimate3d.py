@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+import YOLO3D.inference as inference
+from YOLO3D.inference import Bbox, estimate3d_batch
+from YOLO3D.script import ClassAverages
+
+
+def test_estimate3d_batch_raises_object_errors(monkeypatch):
+    def broken(*args, **kwargs):
+        raise ZeroDivisionError("broken object")
+
+    monkeypatch.setattr(inference, "DetectedObject", broken)
+    img = np.zeros((900, 1600, 3), np.uint8)
+    dets = [Bbox([(100, 400), (300, 500)], "car", 0.9, 0)]
+    # a crashed object must not turn into a frame without detections
+    with pytest.raises(ZeroDivisionError, match="broken object"):
+        estimate3d_batch([img], [dets], [np.eye(3, 4)], None, ClassAverages.ClassAverages(), None)
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import pytest
+
+import YOLO3D.keyframes as keyframes
+from YOLO3D.inference import Bbox
+from YOLO3D.keyframes import KeyframeDetector, detect3DKeyframes
+
+BOX = [(100, 80), (180, 140)]
+
+
+def texture(seed, shape=(240, 320)):
+    noise = np.random.default_rng(seed).integers(0, 255, shape, dtype=np.uint8)
+    return cv2.cvtColor(cv2.GaussianBlur(noise, (5, 5), 1.5), cv2.COLOR_GRAY2BGR)
+
+
+def shift(img, dx, dy):
+    return cv2.warpAffine(img, np.float32([[1, 0, dx], [0, 1, dy]]), (img.shape[1], img.shape[0]), borderMode=cv2.BORDER_REFLECT)
+
+
+@pytest.fixture
+def detections(monkeypatch):
+    """
+    Fake 2D detector returning BOX, recording the frames it ran on
+    """
+    calls = []
+
+    def detect(weights, imgs, **kwargs):
+        calls.append(imgs[0])
+        return [[Bbox(list(BOX), "car", 0.9, 2)] for _ in imgs]
+
+    monkeypatch.setattr(keyframes, "detect2DFromCVImgs", detect)
+    return calls
+
+
+def test_keyframe_cadence(detections):
+    detector = KeyframeDetector(every=3)
+    frame = texture(0)
+    for _ in range(7):
+        assert detector(frame)[0].box_2d == BOX
+    assert len(detections) == 3  # frames 0, 3 and 6
+    assert detector.stats() == {"frames": 7, "keyframes": 3, "keyframe_rate": 3 / 7}
+
+
+def test_boxes_follow_translation(detections):
+    detector = KeyframeDetector(every=10)
+    frame = texture(0)
+    detector(frame)
+    dets = detector(shift(frame, 6, -4))
+    assert len(detections) == 1
+    (x1, y1), (x2, y2) = dets[0].box_2d
+    assert abs(x1 - (BOX[0][0] + 6)) <= 1 and abs(y1 - (BOX[0][1] - 4)) <= 1
+    assert abs(x2 - (BOX[1][0] + 6)) <= 1 and abs(y2 - (BOX[1][1] - 4)) <= 1
+    assert dets[0].detected_class == "car" and dets[0].class_id == 2
+
+
+def test_scene_cut_runs_detector(detections):
+    detector = KeyframeDetector(every=10)
+    detector(texture(0))
+    detector(shift(texture(0), 2, 0))
+    detector(np.full_like(texture(0), 255))  # hard cut
+    assert len(detections) == 2
+    assert detections[-1].mean() == 255
+
+
+class FakeRegistry:
+    def regressor(self, *args):
+        return None
+
+    def detector(self, *args):
+        class Model:
+            names = {2: "car"}
+
+        return Model()
+
+
+def test_restart_on_calib_change(detections, monkeypatch):
+    monkeypatch.setattr(keyframes, "registry", FakeRegistry())
+    monkeypatch.setattr(keyframes, "estimate3d", lambda img, dets, calib, *args, **kwargs: (calib, dets))
+
+    frame = texture(0)
+    calibs = [np.eye(3, 4)] * 3 + [2 * np.eye(3, 4)] * 2
+    detector = KeyframeDetector(every=10)
+    out = list(detect3DKeyframes("reg.pkl", "resnet18", [frame] * 5, "nuscenes", detector, device="cpu", calibs=calibs))
+    assert [calib[0, 0] for calib, _ in out] == [1, 1, 1, 2, 2]
+    assert len(detections) == 2  # first frame and the camera switch
+    assert detector.stats()["frames"] == 5
+
+    with pytest.raises(ValueError, match="fewer entries than frames"):
+        list(detect3DKeyframes("reg.pkl", "resnet18", [frame] * 3, "nuscenes", KeyframeDetector(), device="cpu", calibs=calibs[:2]))
@@ -0,0 +1,55 @@
+import random
+import time
+
+import pytest
+
+from YOLO3D.pipeline import Pipeline3D
+
+
+class FakePipeline(Pipeline3D):
+    """
+    Pipeline3D with the model stages replaced, so only the threading is tested
+    """
+
+    def __init__(self, render=True, queue_size=2):
+        self.calib_file = "default"
+        self.render = render
+        self.queue_size = queue_size
+        self.stages = []
+        self.wall = 0.0
+
+    def detect_2d(self, frame):
+        time.sleep(random.random() * 1e-3)
+        frame["dets"] = frame["img"]
+
+    def estimate_3d(self, frame):
+        time.sleep(random.random() * 1e-3)
+        frame["detections"] = (frame["dets"], frame["calib"])
+
+    def render_3d(self, frame):
+        frame["output"] = frame["img"] * 10
+
+
+def test_pipeline_keeps_order():
+    out = list(FakePipeline().run(range(50), calibs=(f"calib{i}" for i in range(50))))
+    assert out == [(i * 10, (i, f"calib{i}")) for i in range(50)]
+    assert list(FakePipeline(render=False).run(range(5))) == [(None, (i, "default")) for i in range(5)]
+
+
+def test_pipeline_raises_source_error():
+    def frames():
+        yield 0
+        yield 1
+        raise IOError("broken frame")
+
+    it = FakePipeline().run(frames())
+    assert [next(it)[0], next(it)[0]] == [0, 10]
+    with pytest.raises(IOError, match="broken frame"):
+        next(it)
+
+
+def test_pipeline_raises_on_short_calibs():
+    it = FakePipeline().run(range(5), calibs=["a", "b"])
+    assert [next(it)[1][1], next(it)[1][1]] == ["a", "b"]
+    with pytest.raises(ValueError, match="fewer entries than frames"):
+        next(it)
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+import pytest
+
+from YOLO3D.library.Math import create_corners, rotation_matrix
+from YOLO3D.library.Plotting import cv_colors, plot_3d_boxes, project_3d_pt, project_3d_pts
+
+PROJ_MATRIX = np.array([[721.5, 0.0, 609.6, 44.9], [0.0, 721.5, 172.9, 0.2], [0.0, 0.0, 1.0, 0.003]])
+
+
+def reference_plot_3d_box(img, cam_to_img, ry, dimension, center, color=cv_colors.GREEN.value, thickness=2):
+    """
+    The original per-box renderer, kept as the reference for the single-pass one
+    """
+    corners = create_corners(dimension, location=center, R=rotation_matrix(ry))
+    box_3d = [project_3d_pt(corner, cam_to_img) for corner in corners]
+
+    for a, b in [(0, 2), (4, 6), (0, 4), (2, 6), (1, 3), (1, 5), (7, 3), (7, 5), (0, 1), (2, 3), (4, 5), (6, 7)]:
+        cv2.line(img, (box_3d[a][0], box_3d[a][1]), (box_3d[b][0], box_3d[b][1]), color, thickness)
+
+    frame = np.zeros_like(img, np.uint8)
+    cv2.fillPoly(frame, np.array([[[box_3d[0]], [box_3d[1]], [box_3d[3]], [box_3d[2]]]], dtype=np.int32), cv_colors.BLUE.value)
+    alpha = 0.5
+    mask = frame.astype(bool)
+    img[mask] = cv2.addWeighted(img, alpha, frame, 1 - alpha, 0)[mask]
+
+
+def background():
+    return np.random.default_rng(0).integers(0, 255, (375, 1242, 3), dtype=np.uint8)
+
+
+def render_both(ry, dimensions, centers, colors):
+    expected, actual = background(), background()
+    for args in zip(ry, dimensions, centers, colors):
+        reference_plot_3d_box(expected, PROJ_MATRIX, *args)
+    plot_3d_boxes(actual, PROJ_MATRIX, ry, dimensions, centers, colors)
+    return expected, actual
+
+
+def test_project_3d_pts_matches_project_3d_pt():
+    pts = np.random.default_rng(1).uniform([-10, -2, 5], [10, 2, 50], (20, 3))
+    assert np.array_equal(project_3d_pts(pts, PROJ_MATRIX), [project_3d_pt(p, PROJ_MATRIX) for p in pts])
+
+
+def test_plot_3d_boxes_matches_per_box_renderer():
+    # three cars side by side, far enough apart not to overlap on the image
+    ry = [0.3, -1.2, 2.5]
+    dimensions = [[1.5, 1.6, 3.9], [1.6, 1.7, 4.2], [3.0, 2.5, 8.0]]
+    centers = [[-8.0, 1.6, 20.0], [0.0, 1.6, 25.0], [10.0, 1.5, 30.0]]
+    colors = [cv_colors.GREEN.value, cv_colors.RED.value, cv_colors.PURPLE.value]
+    expected, actual = render_both(ry, dimensions, centers, colors)
+    assert not np.array_equal(actual, background())
+    assert np.array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("center", [[0.0, 1.6, 1.0], [2.0, 1.5, 0.5]])
+def test_plot_3d_boxes_partly_behind_camera(center):
+    expected, actual = render_both([0.2], [[1.5, 1.6, 3.9]], [center], [cv_colors.GREEN.value])
+    assert np.array_equal(actual, expected)
+
+
+def test_plot_3d_boxes_no_boxes():
+    img = background()
+    plot_3d_boxes(img, PROJ_MATRIX, [], np.zeros((0, 3)), np.zeros((0, 3)), [])
+    assert np.array_equal(img, background())
+
+
+def test_plot_3d_boxes_overlapping():
+    ry = [0.3, 0.2]
+    dimensions = [[1.5, 1.6, 3.9], [1.6, 1.7, 4.2]]
+    centers = [[-1.0, 1.6, 20.0], [0.0, 1.6, 22.0]]
+    expected, actual = render_both(ry, dimensions, centers, [cv_colors.GREEN.value, cv_colors.RED.value])
+    assert np.array_equal(actual, expected)
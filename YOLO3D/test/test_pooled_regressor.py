@@ -0,0 +1,29 @@
+import pytest
+import torch
+
+from YOLO3D.inference import model_factory, regressor_factory
+from YOLO3D.script.Model import fuse_regressor
+
+
+def build(model_select):
+    # torchvision builders accept weights=None across versions
+    return regressor_factory[model_select](model=model_factory[model_select](weights=None)).eval()
+
+
+@pytest.mark.parametrize("model_select", ["resnet18_pooled", "mobilenet_v3_small", "mobilenet_v3_large"])
+@torch.no_grad()
+def test_pooled_regressor_outputs(model_select):
+    model = build(model_select)
+    orient, conf, dim = model(torch.randn(3, 3, 224, 224))
+    assert orient.shape == (3, 2, 2) and conf.shape == (3, 2) and dim.shape == (3, 3)
+    assert torch.allclose(orient.norm(dim=2), torch.ones(3, 2))
+
+    # BatchNorm folding, used by export_regressor.py, keeps the outputs
+    im = torch.randn(2, 3, 224, 224)
+    for a, b in zip(model(im), fuse_regressor(model)(im)):
+        assert torch.allclose(a, b, atol=1e-4)
+
+
+def test_pooled_heads_are_small():
+    params = lambda m: sum(p.numel() for p in m.parameters())
+    assert params(build("resnet18_pooled")) < params(build("resnet18")) / 3
@@ -0,0 +1,41 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from YOLO3D.inference import iter_frames, prefetch
+
+
+def test_prefetch_keeps_order():
+    assert list(prefetch(range(100), size=3)) == list(range(100))
+
+
+def test_prefetch_raises_in_consumer():
+    def frames():
+        yield 0
+        raise IOError("broken frame")
+
+    it = prefetch(frames())
+    assert next(it) == 0
+    with pytest.raises(IOError, match="broken frame"):
+        next(it)
+
+
+def test_prefetch_close_stops_reader():
+    it = prefetch(iter(range(10**9)), size=2)
+    next(it)
+    it.close()
+    for thread in threading.enumerate():
+        if thread.name == "yolo3d-prefetch":
+            thread.join(timeout=2)
+            assert not thread.is_alive()
+
+
+def test_iter_frames_returns_raw_frames(tmp_path):
+    imgs = [np.full((90, 160, 3), i * 40, dtype=np.uint8) for i in range(3)]
+    for i, img in enumerate(imgs):
+        cv2.imwrite(str(tmp_path / f"{i}.png"), img)
+    frames = list(iter_frames(tmp_path))
+    assert [frame_id for frame_id, _ in frames] == ["0.png", "1.png", "2.png"]
+    assert all(np.array_equal(frame, img) for (_, frame), img in zip(frames, imgs))
@@ -0,0 +1,52 @@
+import copy
+
+import pytest
+import torch
+from torchvision.models import resnet18
+
+from YOLO3D.export_regressor import export_onnx, export_torchscript
+from YOLO3D.script.Model import RegressorMultiBackend, ResNet18, fuse_regressor
+
+
+@pytest.fixture(scope="module")
+def regressor():
+    torch.manual_seed(0)
+    model = ResNet18(model=resnet18()).eval()
+    # non-trivial BatchNorm statistics, so folding is actually exercised
+    for m in model.modules():
+        if isinstance(m, torch.nn.BatchNorm2d):
+            m.running_mean.uniform_(-0.5, 0.5)
+            m.running_var.uniform_(0.5, 2.0)
+            m.weight.data.uniform_(0.5, 1.5)
+            m.bias.data.uniform_(-0.5, 0.5)
+    return model
+
+
+@torch.no_grad()
+def test_fuse_regressor_removes_batchnorm(regressor):
+    fused = fuse_regressor(copy.deepcopy(regressor))
+    assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules())
+    im = torch.randn(2, 3, 224, 224)
+    for a, b in zip(regressor(im), fused(im)):
+        assert torch.allclose(a, b, atol=1e-4)
+
+
+@pytest.mark.parametrize("backend", ["onnx", "torchscript"])
+@torch.no_grad()
+def test_exported_regressor_matches_eager(regressor, backend, tmp_path):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    fused = fuse_regressor(copy.deepcopy(regressor))
+    meta = {"bins": fused.bins, "model_select": "resnet18"}
+    file = tmp_path / f"resnet18.{backend}"
+    export = export_onnx if backend == "onnx" else export_torchscript
+    export(fused, torch.zeros(1, 3, 224, 224), file, meta)
+
+    exported = RegressorMultiBackend(file)
+    assert exported.bins == 2 and exported.model_select == "resnet18"
+    # dynamic batch: other sizes than the export batch
+    for batch in (1, 5):
+        im = torch.randn(batch, 3, 224, 224)
+        for a, b in zip(regressor(im), exported(im)):
+            assert a.shape == b.shape
+            assert torch.allclose(a, b, atol=1e-4)
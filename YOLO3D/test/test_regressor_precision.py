@@ -0,0 +1,37 @@
+import numpy as np
+import torch
+from torchvision.models import resnet18
+
+from YOLO3D.eval_regressor import read_kitti_labels
+from YOLO3D.script.Model import ResNet18, quantize_regressor
+
+
+@torch.no_grad()
+def test_int8_regressor_close_to_fp32():
+    torch.manual_seed(0)
+    model = ResNet18(model=resnet18()).eval()
+    im = torch.randn(2, 3, 224, 224)
+    reference = model(im)
+
+    quantized = quantize_regressor(model, "int8")
+    assert isinstance(quantized.dimension[0], torch.ao.nn.quantized.dynamic.Linear)
+    for a, b in zip(reference, quantized(im)):
+        assert a.shape == b.shape
+        assert (a - b).abs().max() < 0.1 * a.abs().max() + 1e-3
+
+    # fp16 autocast needs CUDA, the CPU keeps the fp32 model
+    assert quantize_regressor(model, "fp16") is model
+
+
+def test_read_kitti_labels(tmp_path):
+    label = tmp_path / "000000.txt"
+    label.write_text(
+        "Car 0.00 0 -1.58 587.01 173.33 614.12 200.12 1.65 1.67 3.64 -0.65 1.71 46.70 -1.59\n"
+        "DontCare -1 -1 -10 503.89 169.71 590.61 190.13 -1 -1 -1 -1000 -1000 -1000 -10\n"
+        "Cyclist 0.00 0 1.00 100.00 100.00 150.00 105.00 1.70 0.60 1.80 1.00 1.70 20.00 1.00\n"
+    )
+    objects = read_kitti_labels(label)
+    assert len(objects) == 1  # DontCare and the 5 px high cyclist are skipped
+    assert objects[0]["class"] == "car"
+    assert objects[0]["box_2d"] == [(587, 173), (614, 200)]
+    assert np.allclose(objects[0]["dim"], [1.65, 1.67, 3.64])
@@ -0,0 +1,39 @@
+import numpy as np
+
+from YOLO3D.inference import create_roi_filter, create_roi_prefilter
+from YOLO3D.library.Calib import get_calibration
+from YOLO3D.library.Math import create_corners_batch
+
+
+def project_boxes(calib, dims, locations, ry):
+    corners = create_corners_batch(dims, locations, ry)
+    uv = np.concatenate([corners, np.ones(corners.shape[:2] + (1,))], axis=-1) @ calib.P.T
+    uv = uv[..., :2] / uv[..., 2:]
+    return np.concatenate([uv.min(1), uv.max(1)], axis=1)
+
+
+def test_roi_prefilter_keeps_objects_in_roi():
+    calib = get_calibration("nuscenes")
+    rng = np.random.default_rng(0)
+    n = 2000
+
+    # cars standing on the ground, camera 1.5 m above it
+    dims = np.tile([1.6, 1.9, 4.5], (n, 1))
+    locations = np.stack([rng.uniform(-40, 40, n), np.full(n, 1.5 - 0.8), rng.uniform(2, 80, n)], axis=1)
+    boxes = project_boxes(calib, dims, locations, rng.uniform(-np.pi, np.pi, n))
+    visible = (boxes[:, :2] > 0).all(1) & (boxes[:, 2] < 1600) & (boxes[:, 3] < 900)
+
+    keep = create_roi_prefilter(20.0, 8.0, 40.0)(boxes[visible], dims[visible, 0], calib, 1600)
+    roi_filter = create_roi_filter(20.0, 8.0, 40.0)
+    in_roi = np.array([roi_filter(0, location) for location in locations[visible]])
+
+    assert (keep | ~in_roi).all()  # nothing in the ROI is dropped
+    assert (~keep[~in_roi]).mean() > 0.5  # most of the rest is
+
+
+def test_roi_prefilter_disabled_roi_and_min_box():
+    calib = get_calibration("nuscenes")
+    boxes = np.array([[100, 100, 104, 300], [800, 300, 900, 400]])
+
+    assert create_roi_prefilter(-1, -1, -1)(boxes, [1.6, 1.6], calib, 1600).all()
+    assert create_roi_prefilter(-1, -1, -1, min_box=10)(boxes, [1.6, 1.6], calib, 1600).tolist() == [False, True]
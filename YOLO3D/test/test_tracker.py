@@ -0,0 +1,41 @@
+import numpy as np
+
+from YOLO3D.library.Tracker import RegressionTracker, box_iou
+
+
+def test_box_iou():
+    iou = box_iou([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+    assert np.allclose(iou, [[1.0, 1 / 3, 0.0]])
+
+
+def test_tracker_skips_regression_until_stale():
+    tracker = RegressionTracker(skip_iou=0.9, max_stale=2, dim_momentum=0.5)
+    boxes, classes = [[0, 0, 100, 100], [200, 0, 260, 50]], [0, 1]
+
+    track, skip = tracker.assign(boxes, classes)
+    assert not skip.any()
+    alphas, dims, ids = tracker.update(track, ~skip, [0.1, 0.2], [[1, 2, 4], [1, 1, 1]])
+    assert ids.tolist() == [0, 1]
+
+    # same boxes: reuse the cached regression twice, then regress again
+    skips = []
+    for _ in range(3):
+        track, skip = tracker.assign(boxes, classes)
+        skips.append(skip.tolist())
+        alphas, dims, ids = tracker.update(track, ~skip, [0.3] * int((~skip).sum()), [[3, 4, 6]] * int((~skip).sum()))
+    assert skips == [[True, True], [True, True], [False, False]]
+    assert np.allclose(dims[0], [2, 3, 5])  # smoothed with momentum 0.5
+    assert ids.tolist() == [0, 1]
+    assert tracker.stats()["hit_rate"] == 0.5
+
+
+def test_tracker_new_and_lost_tracks():
+    tracker = RegressionTracker(max_age=0)
+    track, skip = tracker.assign([[0, 0, 100, 100]], [0])
+    tracker.update(track, ~skip, [0.0], [[1, 1, 1]])
+
+    # moved box of another class starts a new track, the old one is dropped
+    track, skip = tracker.assign([[10, 0, 110, 100]], [2])
+    _, _, ids = tracker.update(track, ~skip, [0.0], [[1, 1, 1]])
+    assert ids.tolist() == [1]
+    assert tracker.ids.tolist() == [1]
@@ -15,12 +15,12 @@ writer = SummaryWriter()
 from comet_ml import Experiment
 
 from script.Dataset import Dataset
-from script.Model import ResNet18, VGG11, OrientationLoss
+from script.Model import ResNet18, VGG11, ResNet18Pooled, MobileNetV3, OrientationLoss
 
 import torch
 import torch.nn as nn
 import torchvision
-from torchvision.models import resnet18, vgg11
+from torchvision.models import resnet18, vgg11, mobilenet_v3_small, mobilenet_v3_large
 from torch.utils import data
 
 FILE = Path(__file__).resolve()
@@ -29,14 +29,20 @@ if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))  # add ROOT to PATH
 ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 
-# model factory to choose model
+# model factory to choose model, backbones are only built for the selected model
 model_factory = {
-    'resnet18': resnet18(pretrained=True),
-    'vgg11': vgg11(pretrained=True)
+    'resnet18': resnet18,
+    'vgg11': vgg11,
+    'resnet18_pooled': resnet18,
+    'mobilenet_v3_small': mobilenet_v3_small,
+    'mobilenet_v3_large': mobilenet_v3_large
 }
 regressor_factory = {
     'resnet18': ResNet18,
-    'vgg11': VGG11
+    'vgg11': VGG11,
+    'resnet18_pooled': ResNet18Pooled,
+    'mobilenet_v3_small': MobileNetV3,
+    'mobilenet_v3_large': MobileNetV3
 }
 
 
@@ -83,8 +89,19 @@ def train(
         shuffle=hyper_params['shuffle'],
         num_workers=hyper_params['num_workers'])
 
-    # model
-    base_model = model_factory[select_model]
+    # find previous weights
+    latest_model = None
+    first_epoch = 1
+    if not os.path.isdir(model_path):
+        os.mkdir(model_path)
+    else:
+        try:
+            latest_model = [x for x in sorted(os.listdir(model_path)) if x.endswith('.pkl')][-1]
+        except:
+            pass
+
+    # model, ImageNet weights are only needed when not resuming from a checkpoint
+    base_model = model_factory[select_model](pretrained=latest_model is None)
     model = regressor_factory[select_model](model=base_model).cuda()
     
     # optimizer
@@ -96,16 +113,6 @@ def train(
     orient_loss_func = OrientationLoss
 
     # load previous weights
-    latest_model = None
-    first_epoch = 1
-    if not os.path.isdir(model_path):
-        os.mkdir(model_path)
-    else:
-        try:
-            latest_model = [x for x in sorted(os.listdir(model_path)) if x.endswith('.pkl')][-1]
-        except:
-            pass
-
     if latest_model is not None:
         checkpoint = torch.load(model_path + latest_model)
         model.load_state_dict(checkpoint['model_state_dict'])
@@ -183,7 +190,7 @@ def parse_opt():
     parser.add_argument('--save_epoch', type=int, default=10, help='Save model every # epochs')
     parser.add_argument('--train_path', type=str, default=ROOT / 'dataset/KITTI/training', help='Training path KITTI')
     parser.add_argument('--model_path', type=str, default=ROOT / 'weights', help='Weights path, for load and save model')
-    parser.add_argument('--select_model', type=str, default='resnet18', help='Model selection: {resnet18, vgg11}')
+    parser.add_argument('--select_model', type=str, default='resnet18', help='Model selection: {resnet18, vgg11, resnet18_pooled, mobilenet_v3_small, mobilenet_v3_large}')
     parser.add_argument('--api_key', type=str, default='', help='API key for comet.ml')
 
     opt = parser.parse_args()
@@ -157,7 +157,8 @@ class _RepeatSampler:
 
 class LoadImages:
     # YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`
-    def __init__(self, path, img_size=640, stride=32, auto=True):
+    def __init__(self, path, img_size=640, stride=32, auto=True, preprocess=True):
+        # preprocess=False skips letterbox and HWC to CHW, only the raw img0 is returned (img is None)
         p = str(Path(path).resolve())  # os-agnostic absolute path
         if '*' in p:
             files = sorted(glob.glob(p, recursive=True))  # glob
@@ -179,6 +180,7 @@ class LoadImages:
         self.video_flag = [False] * ni + [True] * nv
         self.mode = 'image'
         self.auto = auto
+        self.preprocess = preprocess
         if any(videos):
             self.new_video(videos[0])  # new video
         else:
@@ -219,6 +221,9 @@ class LoadImages:
             assert img0 is not None, f'Image Not Found {path}'
             s = f'image {self.count}/{self.nf} {path}: '
 
+        if not self.preprocess:
+            return path, None, img0, self.cap, s
+
         # Padded resize
         img = letterbox(img0, self.img_size, stride=self.stride, auto=self.auto)[0]
 
@@ -281,10 +286,12 @@ class LoadWebcam:  # for inference
 
 class LoadStreams:
     # YOLOv5 streamloader, i.e. `python detect.py --source 'rtsp://example.com/media.mp4'  # RTSP, RTMP, HTTP streams`
-    def __init__(self, sources='streams.txt', img_size=640, stride=32, auto=True):
+    def __init__(self, sources='streams.txt', img_size=640, stride=32, auto=True, preprocess=True):
+        # preprocess=False skips letterbox and BHWC to BCHW, only the raw img0 is returned (img is None)
         self.mode = 'stream'
         self.img_size = img_size
         self.stride = stride
+        self.preprocess = preprocess
 
         if os.path.isfile(sources):
             with open(sources) as f:
@@ -318,10 +325,12 @@ class LoadStreams:
         LOGGER.info('')  # newline
 
         # check for common shapes
-        s = np.stack([letterbox(x, self.img_size, stride=self.stride, auto=self.auto)[0].shape for x in self.imgs])
-        self.rect = np.unique(s, axis=0).shape[0] == 1  # rect inference if all shapes equal
-        if not self.rect:
-            LOGGER.warning('WARNING: Stream shapes differ. For optimal performance supply similarly-shaped streams.')
+        self.rect = True
+        if preprocess:
+            s = np.stack([letterbox(x, self.img_size, stride=self.stride, auto=self.auto)[0].shape for x in self.imgs])
+            self.rect = np.unique(s, axis=0).shape[0] == 1  # rect inference if all shapes equal
+            if not self.rect:
+                LOGGER.warning('WARNING: Stream shapes differ. For optimal performance supply similarly-shaped streams.')
 
     def update(self, i, cap, stream):
         # Read stream `i` frames in daemon thread
@@ -352,6 +361,8 @@ class LoadStreams:
 
         # Letterbox
         img0 = self.imgs.copy()
+        if not self.preprocess:
+            return self.sources, None, img0, None, ''
         img = [letterbox(x, self.img_size, stride=self.stride, auto=self.rect and self.auto)[0] for x in img0]
 
         # Stack
@@ -2,6 +2,8 @@ import base64
 import os
 import re
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from math import atan2
 
@@ -19,7 +21,8 @@ import sys
 
 # Add parent directory to path to import from project modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import EstimateCurvatureFromTrajectory, IntegrateCurvatureForPoints, OverlayTrajectory, WriteImageSequenceToVideo
+from utils import EstimateCurvatureFromTrajectory, IntegrateCurvatureForPoints, LazyCameraImages, OverlayTrajectory, PrepareImagesForVLM, WriteImageSequenceToVideo
+from vlm_cache import VLMCache
 
 # Look for API key in environment variables first, then fallback to default
 api_key = os.environ.get("QIANWEN_API_KEY", "")
@@ -35,8 +38,37 @@ OBS_LEN = 10
 FUT_LEN = 10
 TTL_LEN = OBS_LEN + FUT_LEN
 
+# Per-process limit of concurrent VLM requests, set with VLM_MAX_CONCURRENCY
+VLM_MAX_CONCURRENCY = int(os.environ.get("VLM_MAX_CONCURRENCY", 4))
+vlm_semaphore = threading.BoundedSemaphore(VLM_MAX_CONCURRENCY)
+# The scene, object and intent descriptions are independent and requested concurrently
+vlm_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="vlm")
+
+
+def set_vlm_concurrency(n):
+    global vlm_semaphore
+    vlm_semaphore = threading.BoundedSemaphore(max(1, n))
+
+
+# Persistent VLM response cache, enabled with --vlm_cache
+vlm_cache = None
+
+
+def set_vlm_cache(path, max_mb=1024, mode="readwrite"):
+    global vlm_cache
+    vlm_cache = VLMCache(path, max_mb=max_mb, mode=mode) if path else None
+
+
+def vlm_inference(text=None, images=None, sys_message="You are a autonomous driving labeller.", model_name="qwen2.5-vl-3b-instruct",
+                  sent_bytes=None):
+    # sent_bytes: per frame list of the image bytes actually sent to the VLM, cache hits excluded
+    # identical model, system message, prompt and images are served from the cache
+    key = vlm_cache.key(model_name, sys_message, text, images) if vlm_cache else None
+    if key:
+        cached = vlm_cache.get(key)
+        if cached is not None:
+            return cached
 
-def vlm_inference(text=None, images=None, sys_message="You are a autonomous driving labeller.", model_name="qwen2.5-vl-3b-instruct"):
     image_content = [
         {
             "type": "image_url",
@@ -45,22 +77,28 @@ def vlm_inference(text=None, images=None, sys_message="You are a autonomous driv
         for base64_image in images
     ]
 
-    completion = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {
-                "role": "system",
-                "content": [{"type":"text","text": sys_message}]},
-            {
-                "role": "user",
-                "content": image_content + [{"type": "text", "text": text}],
-            }
-        ],
-    )
-    return completion.choices[0].message.content
-
-
-def SceneDescription(obs_images, model_name="qwen2.5-vl-3b-instruct"):
+    with vlm_semaphore:
+        completion = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {
+                    "role": "system",
+                    "content": [{"type":"text","text": sys_message}]},
+                {
+                    "role": "user",
+                    "content": image_content + [{"type": "text", "text": text}],
+                }
+            ],
+        )
+    if images and sent_bytes is not None:
+        sent_bytes.append(sum(len(im) for im in images))  # list.append is thread safe
+    response = completion.choices[0].message.content
+    if key:
+        vlm_cache.put(key, model_name, response)
+    return response
+
+
+def SceneDescription(obs_images, model_name="qwen2.5-vl-3b-instruct", sent_bytes=None):
     prompt = f"""You are a autonomous driving labeller. 
     You are processing 6 synchronized vehicle camera images captured within 0.5 seconds. Strictly follow this spatial order and reference system:
         1. Image 1: Front view (180° forward-facing)
@@ -72,11 +110,11 @@ def SceneDescription(obs_images, model_name="qwen2.5-vl-3b-instruct"):
         Don't forget the order of the images. Always reference images as 'Image X (view name)'. 
     Imagine you are driving the car. Describe the driving scene according to traffic lights, movements of other cars or pedestrians and lane markings."""
 
-    result = vlm_inference(text=prompt, images=obs_images, model_name=model_name)
+    result = vlm_inference(text=prompt, images=obs_images, model_name=model_name, sent_bytes=sent_bytes)
     return result
 
 
-def DescribeObjects(obs_images, model_name="qwen2.5-vl-3b-instruct"):
+def DescribeObjects(obs_images, model_name="qwen2.5-vl-3b-instruct", sent_bytes=None):
     prompt = f"""You are a autonomous driving labeller. 
     You are processing 6 synchronized vehicle camera images captured within 0.5 seconds. Strictly follow this spatial order and reference system:
         1. Image 1: Front view (180° forward-facing)
@@ -88,11 +126,11 @@ def DescribeObjects(obs_images, model_name="qwen2.5-vl-3b-instruct"):
         Don't forget the order of the images. Always reference images as 'Image X (view name)'. 
     Imagine you are driving the car. What other road users should you pay attention to in the driving scene? List two or three of them, specifying its location within the image of the driving scene and provide a short description of the that road user on what it is doing, and why it is important to you."""
 
-    result = vlm_inference(text=prompt, images=obs_images, model_name=model_name)
+    result = vlm_inference(text=prompt, images=obs_images, model_name=model_name, sent_bytes=sent_bytes)
     return result
 
 
-def DescribeOrUpdateIntent(obs_images, prev_intent=None, model_name="qwen2.5-vl-3b-instruct"):
+def DescribeOrUpdateIntent(obs_images, prev_intent=None, model_name="qwen2.5-vl-3b-instruct", sent_bytes=None):
     prompt = f"""You are a autonomous driving labeller. You are processing 6 synchronized vehicle camera images captured within 0.5 seconds. Strictly follow this spatial order and reference system:
         1. Image 1: Front view (180° forward-facing)
         2. Image 2: Front-left view (45° left-front quadrant, covers left turn signal area)
@@ -103,16 +141,21 @@ def DescribeOrUpdateIntent(obs_images, prev_intent=None, model_name="qwen2.5-vl-
         Don't forget the order of the images. Always reference images as 'Image X (view name)'. 
     Imagine you are driving the car. What is your driving intention in the next 5 seconds? Provide a short description of your intended action and explain why you choose this action based on the current driving scene."""
     
-    result = vlm_inference(text=prompt, images=obs_images, model_name=model_name)
+    result = vlm_inference(text=prompt, images=obs_images, model_name=model_name, sent_bytes=sent_bytes)
     return result
 
 
-def GenerateMotion(obs_images, obs_waypoints, obs_velocities, obs_curvatures, given_intent, model_name="qwen2.5-vl-3b-instruct"):
-    scene_description, object_description, intent_description = None, None, None
+def GenerateMotion(obs_images, obs_waypoints, obs_velocities, obs_curvatures, given_intent, model_name="qwen2.5-vl-3b-instruct",
+                   sent_bytes=None):
+    # The three descriptions run concurrently, only the motion call waits for all of them
+    scene_future = vlm_executor.submit(SceneDescription, obs_images, model_name=model_name, sent_bytes=sent_bytes)
+    object_future = vlm_executor.submit(DescribeObjects, obs_images, model_name=model_name, sent_bytes=sent_bytes)
+    intent_future = vlm_executor.submit(DescribeOrUpdateIntent, obs_images, prev_intent=given_intent, model_name=model_name,
+                                        sent_bytes=sent_bytes)
 
-    scene_description = SceneDescription(obs_images, model_name=model_name)
-    object_description = DescribeObjects(obs_images, model_name=model_name)
-    intent_description = DescribeOrUpdateIntent(obs_images, prev_intent=given_intent, model_name=model_name)
+    scene_description = scene_future.result()
+    object_description = object_future.result()
+    intent_description = intent_future.result()
     print(f'Scene Description: {scene_description}')
     print(f'Object Description: {object_description}')
     print(f'Intent Description: {intent_description}')
@@ -136,13 +179,18 @@ def GenerateMotion(obs_images, obs_waypoints, obs_velocities, obs_curvatures, gi
     The 5 second historical velocities and curvatures of the ego car are {obs_speed_curvature_str}. 
     Infer the association between these numbers and the image sequence. Generate the predicted future speeds and curvatures in the format [speed_1, curvature_1], [speed_2, curvature_2],..., [speed_10, curvature_10]. Write the raw text not markdown or latex. Future speeds and curvatures:"""
 
-    result = vlm_inference(text=prompt, images=[obs_images[0]], sys_message=sys_message, model_name=model_name)
+    result = vlm_inference(text=prompt, images=[obs_images[0]], sys_message=sys_message, model_name=model_name,
+                           sent_bytes=sent_bytes)
 
     return result, scene_description, object_description, intent_description
 
 
-def process_scene(dataroot, version, scene_filter=None):
-    """Process a specific scene from the NuScenes dataset"""
+def process_scene(dataroot, version, scene_filter=None, vlm_long_side=0, vlm_jpeg_quality=0, vlm_gray=False):
+    """Process a specific scene from the NuScenes dataset
+
+    vlm_long_side, vlm_jpeg_quality and vlm_gray downscale and re-encode the
+    images sent to the VLM, see PrepareImagesForVLM.
+    """
     
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     timestamp = f"Qwen_results/{timestamp}"
@@ -166,39 +214,27 @@ def process_scene(dataroot, version, scene_filter=None):
         if scene_filter and name not in scene_filter:
             continue
 
-        # Get all image and pose in this scene
-        front_camera_images = []
-        front_left_camera_images = []
-        front_right_camera_images = []
-        back_camera_images = []
-        back_left_camera_images = []
-        back_right_camera_images = []
+        # Get all image paths and poses in this scene, images are read when their frame is processed
+        camera_paths = []
+        camera_tokens = []
         ego_poses = []
         camera_params = []
         curr_sample_token = first_sample_token
         while True:
             sample = nusc.get('sample', curr_sample_token)
 
-            # Get the front camera image of the sample.
+            # Get the camera images of the sample.
             cam_front_data = nusc.get('sample_data', sample['data']['CAM_FRONT'])
             cam_front_left_data = nusc.get('sample_data', sample['data']['CAM_FRONT_LEFT'])
             cam_front_right_data = nusc.get('sample_data', sample['data']['CAM_FRONT_RIGHT'])
             cam_back_data = nusc.get('sample_data', sample['data']['CAM_BACK'])
             cam_back_left_data = nusc.get('sample_data', sample['data']['CAM_BACK_LEFT'])
             cam_back_right_data = nusc.get('sample_data', sample['data']['CAM_BACK_RIGHT'])
+            cams_data = (cam_front_data, cam_front_left_data, cam_front_right_data,
+                         cam_back_data, cam_back_left_data, cam_back_right_data)
 
-            with open(os.path.join(nusc.dataroot, cam_front_data['filename']), "rb") as image_file:
-                front_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_front_left_data['filename']), "rb") as image_file:
-                front_left_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_front_right_data['filename']), "rb") as image_file:
-                front_right_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_back_data['filename']), "rb") as image_file:
-                back_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_back_left_data['filename']), "rb") as image_file:
-                back_left_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_back_right_data['filename']), "rb") as image_file:
-                back_right_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
+            camera_paths.append([os.path.join(nusc.dataroot, cam_data['filename']) for cam_data in cams_data])
+            camera_tokens.append([cam_data['token'] for cam_data in cams_data])
 
             # Get the ego pose of the sample.
             pose = nusc.get('ego_pose', cam_front_data['ego_pose_token'])
@@ -212,7 +248,9 @@ def process_scene(dataroot, version, scene_filter=None):
                 break
             curr_sample_token = sample['next']
 
-        scene_length = len(front_camera_images)
+        # Read and encode the images on demand, with an LRU cache and background prefetching
+        camera_images = LazyCameraImages(camera_paths, camera_tokens)
+        scene_length = len(camera_images)
         print(f"Scene {name} has {scene_length} frames")
 
         if scene_length < TTL_LEN:
@@ -252,28 +290,17 @@ def process_scene(dataroot, version, scene_filter=None):
         ade2s_list = []
         ade3s_list = []
         for i in range(scene_length - TTL_LEN):
-            # Get the raw image data.
-            obs_images = []
-            obs_images.append(front_camera_images[i+OBS_LEN-1])
-            obs_images.append(front_left_camera_images[i+OBS_LEN-1])
-            obs_images.append(front_right_camera_images[i+OBS_LEN-1])
-            obs_images.append(back_camera_images[i+OBS_LEN-1])
-            obs_images.append(back_left_camera_images[i+OBS_LEN-1])
-            obs_images.append(back_right_camera_images[i+OBS_LEN-1])
+            # Get the raw image data: front, front left, front right, back, back left and back right.
+            obs_images = camera_images[i+OBS_LEN-1]
             
+            # Decode the camera images of the frame once, they are saved for the frontend
+            # and the front one is reused below
+            obs_frames = [cv2.imdecode(np.frombuffer(base64.b64decode(im), dtype=np.uint8), cv2.IMREAD_COLOR)
+                          for im in obs_images]
+
             # Save all the camera images for the frontend
-            cv2.imwrite(f"{timestamp}/{name}_{i}_front.jpg", 
-                       cv2.imdecode(np.frombuffer(base64.b64decode(front_camera_images[i+OBS_LEN-1]), dtype=np.uint8), cv2.IMREAD_COLOR))
-            cv2.imwrite(f"{timestamp}/{name}_{i}_front_left.jpg", 
-                       cv2.imdecode(np.frombuffer(base64.b64decode(front_left_camera_images[i+OBS_LEN-1]), dtype=np.uint8), cv2.IMREAD_COLOR))
-            cv2.imwrite(f"{timestamp}/{name}_{i}_front_right.jpg", 
-                       cv2.imdecode(np.frombuffer(base64.b64decode(front_right_camera_images[i+OBS_LEN-1]), dtype=np.uint8), cv2.IMREAD_COLOR))
-            cv2.imwrite(f"{timestamp}/{name}_{i}_back.jpg", 
-                       cv2.imdecode(np.frombuffer(base64.b64decode(back_camera_images[i+OBS_LEN-1]), dtype=np.uint8), cv2.IMREAD_COLOR))
-            cv2.imwrite(f"{timestamp}/{name}_{i}_back_left.jpg", 
-                       cv2.imdecode(np.frombuffer(base64.b64decode(back_left_camera_images[i+OBS_LEN-1]), dtype=np.uint8), cv2.IMREAD_COLOR))
-            cv2.imwrite(f"{timestamp}/{name}_{i}_back_right.jpg", 
-                       cv2.imdecode(np.frombuffer(base64.b64decode(back_right_camera_images[i+OBS_LEN-1]), dtype=np.uint8), cv2.IMREAD_COLOR))
+            for view, frame in zip(["front", "front_left", "front_right", "back", "back_left", "back_right"], obs_frames):
+                cv2.imwrite(f"{timestamp}/{name}_{i}_{view}.jpg", frame)
             
             obs_ego_poses = ego_poses[i:i+OBS_LEN]
             obs_camera_params = camera_params[i:i+OBS_LEN]
@@ -286,10 +313,8 @@ def process_scene(dataroot, version, scene_filter=None):
             obs_start_world = obs_ego_traj_world[0]
             fut_start_world = obs_ego_traj_world[-1]
             
-            curr_image = obs_images[0]
-
             # Allocate the images.
-            img = cv2.imdecode(np.frombuffer(base64.b64decode(curr_image), dtype=np.uint8), cv2.IMREAD_COLOR)
+            img = obs_frames[0]
             # Note: Assuming YOLO3D is imported properly in the frontend context
             # img = yolo3d_nuScenes(img, calib=obs_camera_params[-1])[0]
             
@@ -297,12 +322,17 @@ def process_scene(dataroot, version, scene_filter=None):
             # In the future, consider making this modular to properly import YOLO3D when available
             img_with_detection = img.copy()  # We're using a copy of the image without detection for now
 
+            # Prepare the VLM images once per frame, they are shared by all four requests.
+            vlm_images = PrepareImagesForVLM(obs_images, vlm_long_side, vlm_jpeg_quality, vlm_gray)
+
             # Assemble the prompt.
+            sent_bytes = []
             (prediction,
             scene_description,
             object_description,
-            updated_intent) = GenerateMotion(obs_images, obs_ego_traj_world, obs_ego_velocities,
-                                            obs_ego_curvatures, prev_intent)
+            updated_intent) = GenerateMotion(vlm_images, obs_ego_traj_world, obs_ego_velocities,
+                                            obs_ego_curvatures, prev_intent, sent_bytes=sent_bytes)
+            print(f"Frame {i}: {sum(sent_bytes) / 1024:.0f} KB of images sent to the VLM")
 
             # Process the output.
             prev_intent = updated_intent  # Stateful intent
@@ -375,6 +405,8 @@ def process_scene(dataroot, version, scene_filter=None):
                 f.write(f"Intent Description: {updated_intent}\n")
                 f.write(f"Average Displacement Error: {ade}\n")
 
+        camera_images.close()
+
         mean_ade1s = np.mean(ade1s_list)
         mean_ade2s = np.mean(ade2s_list)
         mean_ade3s = np.mean(ade3s_list)
@@ -395,6 +427,9 @@ def process_scene(dataroot, version, scene_filter=None):
 
         WriteImageSequenceToVideo(cam_images_sequence, f"{timestamp}/{name}")
 
+        if vlm_cache:
+            print(vlm_cache.report())
+
     return timestamp
 
 
@@ -404,14 +439,28 @@ def main():
     parser.add_argument('--dataroot', type=str, required=True, help='Path to the NuScenes dataset')
     parser.add_argument('--version', type=str, required=True, help='Version of the NuScenes dataset')
     parser.add_argument('--model', type=str, default='qwen2.5-vl-3b-instruct', help='Model to use for VLM inference')
+    parser.add_argument('--vlm_concurrency', type=int, default=VLM_MAX_CONCURRENCY, help='Concurrent VLM requests per process')
+    parser.add_argument('--vlm_cache', type=str, default='', help='SQLite file caching VLM responses, disabled if empty')
+    parser.add_argument('--vlm_cache_mode', type=str, default='readwrite', choices=['readwrite', 'readonly', 'refresh'], help='refresh: re-request and overwrite cached responses')
+    parser.add_argument('--vlm_cache_mb', type=float, default=1024, help='Cache size limit in MB, least recently used entries are evicted')
+    parser.add_argument('--vlm_long_side', type=int, default=0, help='Longest side of the images sent to the VLM, 0 keeps the size')
+    parser.add_argument('--vlm_jpeg_quality', type=int, default=0, help='JPEG quality of the re-encoded images, 0 sends the original files')
+    parser.add_argument('--vlm_gray', action='store_true', help='Send grayscale images to the VLM')
     args = parser.parse_args()
+    set_vlm_concurrency(args.vlm_concurrency)
+    set_vlm_cache(args.vlm_cache, args.vlm_cache_mb, args.vlm_cache_mode)
 
     scene_filter = None
     if args.scene:
         scene_filter = [args.scene]
     
     # Process the scene(s)
-    output_dir = process_scene(args.dataroot, args.version, scene_filter)
+    try:
+        output_dir = process_scene(args.dataroot, args.version, scene_filter,
+                                   args.vlm_long_side, args.vlm_jpeg_quality, args.vlm_gray)
+    finally:
+        if vlm_cache:
+            vlm_cache.close()
     print(f"Results saved to: {output_dir}")
 
 
@@ -3,6 +3,9 @@ import os.path
 import re
 import argparse
 import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from math import atan2
 
@@ -16,8 +19,9 @@ from pyquaternion import Quaternion
 from scipy.integrate import cumulative_trapezoid
 
 import json
-from YOLO3D.inference import yolo3d_nuScenes
-from utils import EstimateCurvatureFromTrajectory, IntegrateCurvatureForPoints, OverlayTrajectory, WriteImageSequenceToVideo
+from YOLO3D.inference import yolo3d_nuScenes, yolo3d_nuScenes_multicam
+from vlm_cache import VLMCache
+from utils import EstimateCurvatureFromTrajectory, IntegrateCurvatureForPoints, LazyCameraImages, OverlayTrajectory, PrepareImagesForVLM, WriteImageSequenceToVideo
 
 # 从环境变量获取API密钥
 api_key = os.environ.get("QIANWEN_API_KEY", "")
@@ -34,8 +38,37 @@ OBS_LEN = 10
 FUT_LEN = 10
 TTL_LEN = OBS_LEN + FUT_LEN
 
+# 每个进程同时进行的VLM请求上限，可通过 --vlm_concurrency 或 VLM_MAX_CONCURRENCY 设置
+VLM_MAX_CONCURRENCY = int(os.environ.get("VLM_MAX_CONCURRENCY", 4))
+vlm_semaphore = threading.BoundedSemaphore(VLM_MAX_CONCURRENCY)
+# 场景、物体和意图描述互不依赖，在线程池中并发请求
+vlm_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="vlm")
+
+
+def set_vlm_concurrency(n):
+    global vlm_semaphore
+    vlm_semaphore = threading.BoundedSemaphore(max(1, n))
+
+
+# VLM响应的持久化缓存，通过 --vlm_cache 启用
+vlm_cache = None
+
+
+def set_vlm_cache(path, max_mb=1024, mode="readwrite"):
+    global vlm_cache
+    vlm_cache = VLMCache(path, max_mb=max_mb, mode=mode) if path else None
+
+
+def vlm_inference(text=None, images=None, sys_message="You are a autonomous driving labeller.", model_name="qwen2.5-vl-7b-instruct",
+                  sent_bytes=None):
+    # sent_bytes: 每帧一个列表，记录实际发送给VLM的图像字节数，缓存命中不计入
+    # 相同的模型、系统消息、提示和图像直接返回缓存的响应
+    key = vlm_cache.key(model_name, sys_message, text, images) if vlm_cache else None
+    if key:
+        cached = vlm_cache.get(key)
+        if cached is not None:
+            return cached
 
-def vlm_inference(text=None, images=None, sys_message="You are a autonomous driving labeller.", model_name="qwen2.5-vl-7b-instruct"):
     image_content = [
         {
             "type": "image_url",
@@ -44,24 +77,30 @@ def vlm_inference(text=None, images=None, sys_message="You are a autonomous driv
         for base64_image in images
     ]
 
-    completion = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {
-                "role": "system",
-                "content": [{"type":"text","text": sys_message}]
-            },
-            {
-                "role": "user",
-                "content": image_content + [{"type": "text", "text": text}],
-            }
-        ],
-    )
+    with vlm_semaphore:
+        completion = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {
+                    "role": "system",
+                    "content": [{"type":"text","text": sys_message}]
+                },
+                {
+                    "role": "user",
+                    "content": image_content + [{"type": "text", "text": text}],
+                }
+            ],
+        )
     
-    return completion.choices[0].message.content
+    if images and sent_bytes is not None:
+        sent_bytes.append(sum(len(im) for im in images))  # list.append 是线程安全的
+    response = completion.choices[0].message.content
+    if key:
+        vlm_cache.put(key, model_name, response)
+    return response
 
 
-def SceneDescription(obs_images, model_name="qwen2.5-vl-7b-instruct"):
+def SceneDescription(obs_images, model_name="qwen2.5-vl-7b-instruct", sent_bytes=None):
     prompt = """You are a autonomous driving labeller. 
     You are processing 6 synchronized vehicle camera images captured within 0.5 seconds. Strictly follow this spatial order and reference system:
         1. Image 1: Front view (180° forward-facing)
@@ -73,10 +112,10 @@ def SceneDescription(obs_images, model_name="qwen2.5-vl-7b-instruct"):
         Don't forget the order of the images. Always reference images as 'Image X (view name)'. 
     Imagine you are driving the car. Describe the driving scene according to traffic lights, movements of other cars or pedestrians and lane markings."""
 
-    return vlm_inference(text=prompt, images=obs_images, model_name=model_name)
+    return vlm_inference(text=prompt, images=obs_images, model_name=model_name, sent_bytes=sent_bytes)
 
 
-def DescribeObjects(obs_images, model_name="qwen2.5-vl-7b-instruct"):
+def DescribeObjects(obs_images, model_name="qwen2.5-vl-7b-instruct", sent_bytes=None):
     prompt = """You are a autonomous driving labeller. 
     You are processing 6 synchronized vehicle camera images captured within 0.5 seconds. Strictly follow this spatial order and reference system:
         1. Image 1: Front view (180° forward-facing)
@@ -88,10 +127,10 @@ def DescribeObjects(obs_images, model_name="qwen2.5-vl-7b-instruct"):
         Don't forget the order of the images. Always reference images as 'Image X (view name)'. 
     Imagine you are driving the car. What other road users should you pay attention to in the driving scene? List two or three of them, specifying its location within the image of the driving scene and provide a short description of the that road user on what it is doing, and why it is important to you."""
 
-    return vlm_inference(text=prompt, images=obs_images, model_name=model_name)
+    return vlm_inference(text=prompt, images=obs_images, model_name=model_name, sent_bytes=sent_bytes)
 
 
-def DescribeOrUpdateIntent(obs_images, prev_intent=None, model_name="qwen2.5-vl-7b-instruct"):
+def DescribeOrUpdateIntent(obs_images, prev_intent=None, model_name="qwen2.5-vl-7b-instruct", sent_bytes=None):
     prompt = """You are a autonomous driving labeller. You are processing 6 synchronized vehicle camera images captured within 0.5 seconds. Strictly follow this spatial order and reference system:
             1. Image 1: Front view (180° forward-facing)
             2. Image 2: Front-left view (45° left-front quadrant, covers left turn signal area)
@@ -101,19 +140,32 @@ def DescribeOrUpdateIntent(obs_images, prev_intent=None, model_name="qwen2.5-vl-
             6. Image 6: Back-right view (45° right-back quadrant, covers right back turn signal area)
             Don't forget the order of the images. Always reference images as 'Image X (view name)'. 
         Imagine you are driving the car. What is your driving intention in the next 5 seconds? Provide a short description of your intended action and explain why you choose this action based on the current driving scene."""
+    # 仅在 --chain_intent 时传入上一帧的意图
+    if prev_intent:
+        prompt += f"""
+        Your driving intention 0.5 seconds ago was: {prev_intent}. Keep it if it still fits the current driving scene, otherwise update it."""
 
-    return vlm_inference(text=prompt, images=obs_images, model_name=model_name)
+    return vlm_inference(text=prompt, images=obs_images, model_name=model_name, sent_bytes=sent_bytes)
 
 
-def GenerateMotion(obs_images, obs_waypoints, obs_velocities, obs_curvatures, given_intent, model_name="qwen2.5-vl-7b-instruct"):
-    # 获取场景描述
-    scene_description = SceneDescription(obs_images, model_name=model_name)
-    
-    # 获取物体描述
-    object_description = DescribeObjects(obs_images, model_name=model_name)
-    
-    # 获取意图描述
-    intent_description = DescribeOrUpdateIntent(obs_images, prev_intent=given_intent, model_name=model_name)
+def SubmitDescriptions(obs_images, model_name="qwen2.5-vl-7b-instruct", sent_bytes=None):
+    """提交场景和物体描述请求，二者不依赖其他帧，可以提前发出"""
+    return (vlm_executor.submit(SceneDescription, obs_images, model_name=model_name, sent_bytes=sent_bytes),
+            vlm_executor.submit(DescribeObjects, obs_images, model_name=model_name, sent_bytes=sent_bytes))
+
+
+def GenerateMotion(obs_images, obs_waypoints, obs_velocities, obs_curvatures, given_intent, model_name="qwen2.5-vl-7b-instruct",
+                   description_futures=None, sent_bytes=None):
+    # 并发获取场景、物体和意图描述，运动预测只需要等待三者全部完成
+    # description_futures: 调度器提前提交的场景和物体描述请求
+    # sent_bytes: 本帧的上传字节数列表，见 vlm_inference
+    scene_future, object_future = description_futures or SubmitDescriptions(obs_images, model_name=model_name, sent_bytes=sent_bytes)
+    intent_future = vlm_executor.submit(DescribeOrUpdateIntent, obs_images, prev_intent=given_intent, model_name=model_name,
+                                        sent_bytes=sent_bytes)
+
+    scene_description = scene_future.result()
+    object_description = object_future.result()
+    intent_description = intent_future.result()
     
     print(f'Scene Description: {scene_description}')
     print(f'Object Description: {object_description}')
@@ -139,7 +191,7 @@ def GenerateMotion(obs_images, obs_waypoints, obs_velocities, obs_curvatures, gi
     The 5 second historical velocities and curvatures of the ego car are {obs_speed_curvature_str}. 
     Infer the association between these numbers and the image sequence. Generate the predicted future speeds and curvatures in the format [speed_1, curvature_1], [speed_2, curvature_2],..., [speed_10, curvature_10]. Write the raw text not markdown or latex. Future speeds and curvatures:"""
 
-    result = vlm_inference(text=prompt, images=obs_images, sys_message=sys_message, model_name=model_name)
+    result = vlm_inference(text=prompt, images=obs_images, sys_message=sys_message, model_name=model_name, sent_bytes=sent_bytes)
     # for rho in range(3):
     #     result = vlm_inference(text=prompt, images=obs_images, sys_message=sys_message, model_name=model_name)
     #     if not "unable" in result and not "sorry" in result and "[" in result:
@@ -147,6 +199,36 @@ def GenerateMotion(obs_images, obs_waypoints, obs_velocities, obs_curvatures, gi
     return result, scene_description, object_description, intent_description
 
 
+# YOLO3D模型不是线程安全的，并发的帧依次使用
+yolo3d_lock = threading.Lock()
+
+
+def Detect3D(obs_images, calib, all_calibs=None, multi_cam=False):
+    """解码当前帧的前视图像并运行YOLO3D，返回 (绘制了3D框的前视图像, 检测结果)"""
+    img = cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[0]), dtype=np.uint8), cv2.IMREAD_COLOR)
+    with yolo3d_lock:
+        if multi_cam:
+            # 六个相机联合检测，结果合并到自车坐标系
+            cam_imgs = [cv2.imdecode(np.frombuffer(base64.b64decode(im), dtype=np.uint8), cv2.IMREAD_COLOR)
+                        for im in obs_images]
+            imgs, detections = yolo3d_nuScenes_multicam(cam_imgs, all_calibs)
+            return imgs[0], detections
+        imgs, detections = yolo3d_nuScenes(img, calib=calib, return_detections=True)
+        return imgs[0], detections[0]
+
+
+def ordered_map(fn, items, max_inflight=1):
+    """按输入顺序依次返回 fn(item) 的结果，同时最多有 max_inflight 个在后台执行"""
+    with ThreadPoolExecutor(max_workers=max(1, max_inflight), thread_name_prefix="frame") as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= max_inflight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--plot", type=bool, default=True)
@@ -155,7 +237,21 @@ if __name__ == '__main__':
     parser.add_argument("--model", type=str, default='qwen2.5-vl-7b-instruct', help='Model to use for VLM inference')
     parser.add_argument("--scene", type=str, default='', help='指定要处理的场景，例如 "scene-0061"，留空处理所有场景')
     parser.add_argument("--max_frames", type=int, default=20, help='每个场景最多处理的帧数，0表示不限制')
+    parser.add_argument("--multi_cam", action="store_true", help='Run YOLO3D jointly on all six cameras, merged in the ego frame')
+    parser.add_argument("--vlm_concurrency", type=int, default=VLM_MAX_CONCURRENCY, help='每个进程同时进行的VLM请求上限')
+    parser.add_argument("--max_inflight", type=int, default=1, help='同时处理的帧数，结果仍按帧顺序写出')
+    parser.add_argument("--vlm_cache", type=str, default="", help='VLM响应缓存的SQLite文件，为空时不缓存')
+    parser.add_argument("--vlm_cache_mode", type=str, default="readwrite", choices=["readwrite", "readonly", "refresh"], help='refresh: 重新请求并覆盖缓存')
+    parser.add_argument("--vlm_cache_mb", type=float, default=1024, help='缓存上限(MB)，超出后按最近最少使用淘汰')
+    parser.add_argument("--vlm_long_side", type=int, default=0, help='发送给VLM的图像最长边(像素)，0表示不缩放')
+    parser.add_argument("--vlm_jpeg_quality", type=int, default=0, help='重新编码的JPEG质量，0表示不重新编码')
+    parser.add_argument("--vlm_gray", action="store_true", help='以灰度图发送给VLM')
+    parser.add_argument("--image_cache", type=int, default=16, help='内存中缓存的帧数(每帧六张图像)')
+    parser.add_argument("--image_prefetch", type=int, default=4, help='后台预读的后续帧数')
+    parser.add_argument("--chain_intent", action="store_true", help='把上一帧的意图传给意图描述，此时只有场景和物体描述及YOLO3D提前执行')
     args = parser.parse_args()
+    set_vlm_concurrency(args.vlm_concurrency)
+    set_vlm_cache(args.vlm_cache, args.vlm_cache_mb, args.vlm_cache_mode)
     
     print("启动轨迹预测任务...")
 
@@ -170,281 +266,302 @@ if __name__ == '__main__':
     
     print(f"Number of scenes: {len(scenes)}")
 
-    for scene in scenes:
-        token = scene['token']
-        first_sample_token = scene['first_sample_token']
-        last_sample_token = scene['last_sample_token']
-        name = scene['name']
-        description = scene['description']
-
-        # 如果指定了特定场景，则只处理该场景
-        if name not in ["scene-0061"]:
-            continue
-        # if args.scene and name != args.scene:
-        #     print(f"跳过场景 {name}，因为用户指定只处理 {args.scene}")
-        #     continue
-
-        # 收集场景中的所有图像和姿态
-        front_camera_images = []
-        front_left_camera_images = []
-        front_right_camera_images = []
-        back_camera_images = []
-        back_left_camera_images = []
-        back_right_camera_images = []
-        ego_poses = []
-        camera_params = []
-        curr_sample_token = first_sample_token
-        
-        while True:
-            sample = nusc.get('sample', curr_sample_token)
-
-            # 获取样本的相机图像
-            cam_front_data = nusc.get('sample_data', sample['data']['CAM_FRONT'])
-            cam_front_left_data = nusc.get('sample_data', sample['data']['CAM_FRONT_LEFT'])
-            cam_front_right_data = nusc.get('sample_data', sample['data']['CAM_FRONT_RIGHT'])
-            cam_back_data = nusc.get('sample_data', sample['data']['CAM_BACK'])
-            cam_back_left_data = nusc.get('sample_data', sample['data']['CAM_BACK_LEFT'])
-            cam_back_right_data = nusc.get('sample_data', sample['data']['CAM_BACK_RIGHT'])
-
-            # 读取并编码图像
-            with open(os.path.join(nusc.dataroot, cam_front_data['filename']), "rb") as image_file:
-                front_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_front_left_data['filename']), "rb") as image_file:
-                front_left_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_front_right_data['filename']), "rb") as image_file:
-                front_right_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_back_data['filename']), "rb") as image_file:
-                back_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_back_left_data['filename']), "rb") as image_file:
-                back_left_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-            with open(os.path.join(nusc.dataroot, cam_back_right_data['filename']), "rb") as image_file:
-                back_right_camera_images.append(base64.b64encode(image_file.read()).decode('utf-8'))
-
-            # 获取样本的自车姿态
-            pose = nusc.get('ego_pose', cam_front_data['ego_pose_token'])
-            ego_poses.append(pose)
-
-            # 获取样本的相机参数
-            camera_params.append(nusc.get('calibrated_sensor', cam_front_data['calibrated_sensor_token']))
-
-            # 前进到下一个样本
-            if curr_sample_token == last_sample_token:
-                break
-            curr_sample_token = sample['next']
-
-        scene_length = len(front_camera_images)
-        print(f"Scene {name} has {scene_length} frames")
-
-        if scene_length < TTL_LEN:
-            print(f"Scene {name} has less than {TTL_LEN} frames, skipping...")
-            continue
-
-        # 计算插值轨迹
-        ego_poses_world = [ego_poses[t]['translation'][:3] for t in range(scene_length)]
-        ego_poses_world = np.array(ego_poses_world)
+    try:
+        for scene in scenes:
+            token = scene['token']
+            first_sample_token = scene['first_sample_token']
+            last_sample_token = scene['last_sample_token']
+            name = scene['name']
+            description = scene['description']
+
+            # 如果指定了特定场景，则只处理该场景
+            if name not in ["scene-0061"]:
+                continue
+            # if args.scene and name != args.scene:
+            #     print(f"跳过场景 {name}，因为用户指定只处理 {args.scene}")
+            #     continue
+
+            # 收集场景中的图像路径和姿态，图像在处理到对应帧时才读取
+            camera_paths = []
+            camera_tokens = []
+            ego_poses = []
+            camera_params = []
+            all_camera_params = []
+            curr_sample_token = first_sample_token
         
-        # 计算速度
-        ego_velocities = np.zeros_like(ego_poses_world)
-        ego_velocities[1:] = ego_poses_world[1:] - ego_poses_world[:-1]
-        ego_velocities[0] = ego_velocities[1]
-
-        # 计算曲率
-        ego_curvatures = EstimateCurvatureFromTrajectory(ego_poses_world)
-        ego_velocities_norm = np.linalg.norm(ego_velocities, axis=1)
-        estimated_points = IntegrateCurvatureForPoints(ego_curvatures, ego_velocities_norm, ego_poses_world[0],
-                                                       atan2(ego_velocities[0][1], ego_velocities[0][0]), scene_length)
-
-        # 如果需要绘图，则绘制插值轨迹
-        if args.plot:
-            plt.figure()
-            plt.plot(ego_poses_world[:, 0], ego_poses_world[:, 1], 'r-', label='GT')
-            plt.quiver(ego_poses_world[:, 0], ego_poses_world[:, 1], ego_velocities[:, 0], ego_velocities[:, 1], color='b')
-            plt.plot(estimated_points[:, 0], estimated_points[:, 1], 'g-', label='Reconstruction')
-            plt.legend()
-            plt.savefig(f"{timestamp}/{name}_interpolation.jpg")
-            plt.close()
-
-        # 获取自车轨迹
-        ego_traj_world = [ego_poses[t]['translation'][:3] for t in range(scene_length)]
-
-        prev_intent = None
-        cam_images_sequence = []
-        ade1s_list = []
-        ade2s_list = []
-        ade3s_list = []
+            while True:
+                sample = nusc.get('sample', curr_sample_token)
+
+                # 获取样本的相机图像
+                cam_front_data = nusc.get('sample_data', sample['data']['CAM_FRONT'])
+                cam_front_left_data = nusc.get('sample_data', sample['data']['CAM_FRONT_LEFT'])
+                cam_front_right_data = nusc.get('sample_data', sample['data']['CAM_FRONT_RIGHT'])
+                cam_back_data = nusc.get('sample_data', sample['data']['CAM_BACK'])
+                cam_back_left_data = nusc.get('sample_data', sample['data']['CAM_BACK_LEFT'])
+                cam_back_right_data = nusc.get('sample_data', sample['data']['CAM_BACK_RIGHT'])
+                cams_data = (cam_front_data, cam_front_left_data, cam_front_right_data,
+                             cam_back_data, cam_back_left_data, cam_back_right_data)
+
+                # 记录图像路径
+                camera_paths.append([os.path.join(nusc.dataroot, cam_data['filename']) for cam_data in cams_data])
+                camera_tokens.append([cam_data['token'] for cam_data in cams_data])
+
+                # 获取样本的自车姿态
+                pose = nusc.get('ego_pose', cam_front_data['ego_pose_token'])
+                ego_poses.append(pose)
+
+                # 获取样本的相机参数
+                camera_params.append(nusc.get('calibrated_sensor', cam_front_data['calibrated_sensor_token']))
+                all_camera_params.append([
+                    nusc.get('calibrated_sensor', cam_data['calibrated_sensor_token']) for cam_data in cams_data
+                ])
+
+                # 前进到下一个样本
+                if curr_sample_token == last_sample_token:
+                    break
+                curr_sample_token = sample['next']
+
+            # 按需读取和编码图像，LRU缓存并在后台预取后续帧
+            camera_images = LazyCameraImages(camera_paths, camera_tokens, cache_size=args.image_cache, prefetch=args.image_prefetch)
+            scene_length = len(camera_images)
+            print(f"Scene {name} has {scene_length} frames")
+
+            if scene_length < TTL_LEN:
+                print(f"Scene {name} has less than {TTL_LEN} frames, skipping...")
+                continue
+
+            # 计算插值轨迹
+            ego_poses_world = [ego_poses[t]['translation'][:3] for t in range(scene_length)]
+            ego_poses_world = np.array(ego_poses_world)
         
-        # 处理场景中的每一帧
-        for i in range(scene_length - TTL_LEN):
-            # 检查是否达到了最大帧数限制
-            if args.max_frames > 0 and i >= args.max_frames:
-                print(f"已达到最大帧数限制({args.max_frames})，停止处理更多帧")
-                break
-                
-            # 显示处理进度
-            print(f"正在处理第 {i+1}/{min(scene_length - TTL_LEN, args.max_frames if args.max_frames > 0 else scene_length - TTL_LEN)} 帧")
-            
-            # 每处理4帧后触发垃圾回收
-            if i > 0 and i % 4 == 0:
-                import gc
-                gc.collect()
+            # 计算速度
+            ego_velocities = np.zeros_like(ego_poses_world)
+            ego_velocities[1:] = ego_poses_world[1:] - ego_poses_world[:-1]
+            ego_velocities[0] = ego_velocities[1]
+
+            # 计算曲率
+            ego_curvatures = EstimateCurvatureFromTrajectory(ego_poses_world)
+            ego_velocities_norm = np.linalg.norm(ego_velocities, axis=1)
+            estimated_points = IntegrateCurvatureForPoints(ego_curvatures, ego_velocities_norm, ego_poses_world[0],
+                                                           atan2(ego_velocities[0][1], ego_velocities[0][0]), scene_length)
+
+            # 如果需要绘图，则绘制插值轨迹
+            if args.plot:
+                plt.figure()
+                plt.plot(ego_poses_world[:, 0], ego_poses_world[:, 1], 'r-', label='GT')
+                plt.quiver(ego_poses_world[:, 0], ego_poses_world[:, 1], ego_velocities[:, 0], ego_velocities[:, 1], color='b')
+                plt.plot(estimated_points[:, 0], estimated_points[:, 1], 'g-', label='Reconstruction')
+                plt.legend()
+                plt.savefig(f"{timestamp}/{name}_interpolation.jpg")
+                plt.close()
+
+            # 获取自车轨迹
+            ego_traj_world = [ego_poses[t]['translation'][:3] for t in range(scene_length)]
+
+            prev_intent = None
+            cam_images_sequence = []
+            ade1s_list = []
+            ade2s_list = []
+            ade3s_list = []
+
+            num_frames = scene_length - TTL_LEN
+            if args.max_frames > 0 and num_frames > args.max_frames:
+                print(f"已达到最大帧数限制({args.max_frames})，只处理前 {args.max_frames} 帧")
+                num_frames = args.max_frames
+
+            def frame_obs_images(i):
+                # 前、左前、右前、后、左后、右后六个视角
+                return camera_images[i+OBS_LEN-1]
+
+            def run_frame(i):
+                # 不依赖其他帧的部分：YOLO3D，以及不串联意图时的全部VLM请求
+                obs_images = frame_obs_images(i)
+                # 每帧只缩放和编码一次，四次VLM请求共用，YOLO3D仍使用原图
+                vlm_images = PrepareImagesForVLM(obs_images, args.vlm_long_side, args.vlm_jpeg_quality, args.vlm_gray)
+                # 本帧所有VLM请求实际上传的图像字节数
+                sent_bytes = []
+                if args.chain_intent:
+                    futures = SubmitDescriptions(vlm_images, model_name=args.model, sent_bytes=sent_bytes)
+                img, detections = Detect3D(obs_images, camera_params[i+OBS_LEN-1], all_camera_params[i+OBS_LEN-1], args.multi_cam)
+                if args.chain_intent:
+                    return obs_images, img, detections, vlm_images, futures, sent_bytes
+                motion = GenerateMotion(vlm_images, ego_traj_world[i:i+OBS_LEN], ego_velocities[i:i+OBS_LEN],
+                                        ego_curvatures[i:i+OBS_LEN], None, model_name=args.model, sent_bytes=sent_bytes)
+                return obs_images, img, detections, vlm_images, motion, sent_bytes
+
+            try:
+                # 处理场景中的每一帧，最多 max_inflight 帧并发，结果按帧顺序处理
+                for i, (obs_images, img, detections, vlm_images, motion, sent_bytes) in enumerate(ordered_map(run_frame, range(num_frames), args.max_inflight)):
+                    # 显示处理进度
+                    print(f"正在处理第 {i+1}/{num_frames} 帧")
             
-            # 获取观察图像
-            obs_images = []
-            obs_images.append(front_camera_images[i+OBS_LEN-1])
-            obs_images.append(front_left_camera_images[i+OBS_LEN-1])
-            obs_images.append(front_right_camera_images[i+OBS_LEN-1])
-            obs_images.append(back_camera_images[i+OBS_LEN-1])
-            obs_images.append(back_left_camera_images[i+OBS_LEN-1])
-            obs_images.append(back_right_camera_images[i+OBS_LEN-1])
+                    # 每处理4帧后触发垃圾回收
+                    if i > 0 and i % 4 == 0:
+                        import gc
+                        gc.collect()
             
-            # 获取观察数据
-            obs_ego_poses = ego_poses[i:i+OBS_LEN]
-            obs_camera_params = camera_params[i:i+OBS_LEN]
-            obs_ego_traj_world = ego_traj_world[i:i+OBS_LEN]
-            fut_ego_traj_world = ego_traj_world[i+OBS_LEN:i+TTL_LEN]
-            obs_ego_velocities = ego_velocities[i:i+OBS_LEN]
-            obs_ego_curvatures = ego_curvatures[i:i+OBS_LEN]
-
-            # 获取自车位置
-            obs_start_world = obs_ego_traj_world[0]
-            fut_start_world = obs_ego_traj_world[-1]
+                    # 观察图像由 run_frame 读取后一并返回，避免超出图像缓存时重复读取
             
-            # 当前图像
-            curr_image = obs_images[0]
-
-            # 解码图像并应用YOLO3D
-            img = cv2.imdecode(np.frombuffer(base64.b64decode(curr_image), dtype=np.uint8), cv2.IMREAD_COLOR)
-            img = yolo3d_nuScenes(img, calib=obs_camera_params[-1])[0]
-
-            # 生成运动预测
-            (prediction, 
-                scene_description, 
-                object_description, 
-                updated_intent) = GenerateMotion(
-                obs_images, obs_ego_traj_world, obs_ego_velocities, obs_ego_curvatures, prev_intent, model_name=args.model
-            )
-
-            # 处理输出
-            prev_intent = updated_intent  # 更新意图状态
-            pred_waypoints = prediction.replace("Future speeds and curvatures:", "").strip()
-            coordinates = re.findall(r"\[([-+]?\d*\.?\d+),\s*([-+]?\d*\.?\d+)\]", pred_waypoints)
+                    # 获取观察数据
+                    obs_ego_poses = ego_poses[i:i+OBS_LEN]
+                    obs_camera_params = camera_params[i:i+OBS_LEN]
+                    obs_ego_traj_world = ego_traj_world[i:i+OBS_LEN]
+                    fut_ego_traj_world = ego_traj_world[i+OBS_LEN:i+TTL_LEN]
+                    obs_ego_velocities = ego_velocities[i:i+OBS_LEN]
+                    obs_ego_curvatures = ego_curvatures[i:i+OBS_LEN]
+
+                    # 获取自车位置
+                    obs_start_world = obs_ego_traj_world[0]
+                    fut_start_world = obs_ego_traj_world[-1]
+
+                    # 生成运动预测，串联意图时意图和运动预测请求按帧顺序进行
+                    if args.chain_intent:
+                        motion = GenerateMotion(
+                            vlm_images, obs_ego_traj_world, obs_ego_velocities, obs_ego_curvatures, prev_intent,
+                            model_name=args.model, description_futures=motion, sent_bytes=sent_bytes
+                        )
+                    (prediction, 
+                        scene_description, 
+                        object_description, 
+                        updated_intent) = motion
+
+                    # 本帧实际上传的图像字节数，缓存命中的请求不计入，此时本帧的请求均已完成
+                    image_bytes = sum(sent_bytes)
+                    raw_bytes = 4 * sum(len(im) for im in obs_images)
+                    print(f"图像上传: 本帧 {image_bytes / 1024:.0f} KB (不缩放、不缓存时为 {raw_bytes / 1024:.0f} KB)")
+
+                    # 处理输出
+                    prev_intent = updated_intent  # 更新意图状态
+                    pred_waypoints = prediction.replace("Future speeds and curvatures:", "").strip()
+                    coordinates = re.findall(r"\[([-+]?\d*\.?\d+),\s*([-+]?\d*\.?\d+)\]", pred_waypoints)
             
-            if not coordinates:
-                print(f"警告: 未从响应中解析出有效坐标: {pred_waypoints}")
-                coordinates = [('5.0', '0.0')] * 10
+                    if not coordinates:
+                        print(f"警告: 未从响应中解析出有效坐标: {pred_waypoints}")
+                        coordinates = [('5.0', '0.0')] * 10
             
-            speed_curvature_pred = [[float(v), float(k)] for v, k in coordinates]
-            speed_curvature_pred = speed_curvature_pred[:10]
-            print(f"Got {len(speed_curvature_pred)} future actions: {speed_curvature_pred}")
-
-            # 预测
-            pred_len = min(FUT_LEN, len(speed_curvature_pred))
-            pred_curvatures = np.array(speed_curvature_pred)[:, 1] / 100
-            pred_speeds = np.array(speed_curvature_pred)[:, 0]
-            pred_traj = np.zeros((pred_len, 3))
-            pred_traj[:pred_len, :2] = IntegrateCurvatureForPoints(
-                pred_curvatures,
-                pred_speeds,
-                fut_start_world,
-                atan2(obs_ego_velocities[-1][1], obs_ego_velocities[-1][0]), 
-                pred_len
-            )
-
-            # 叠加轨迹
-            check_flag = OverlayTrajectory(img, pred_traj.tolist(), obs_camera_params[-1], obs_ego_poses[-1], color=(255, 0, 0), args=args)
-
-            # 计算ADE
-            fut_ego_traj_world = np.array(fut_ego_traj_world)
-            ade = np.mean(np.linalg.norm(fut_ego_traj_world[:pred_len] - pred_traj, axis=1))
+                    speed_curvature_pred = [[float(v), float(k)] for v, k in coordinates]
+                    speed_curvature_pred = speed_curvature_pred[:10]
+                    print(f"Got {len(speed_curvature_pred)} future actions: {speed_curvature_pred}")
+
+                    # 预测
+                    pred_len = min(FUT_LEN, len(speed_curvature_pred))
+                    pred_curvatures = np.array(speed_curvature_pred)[:, 1] / 100
+                    pred_speeds = np.array(speed_curvature_pred)[:, 0]
+                    pred_traj = np.zeros((pred_len, 3))
+                    pred_traj[:pred_len, :2] = IntegrateCurvatureForPoints(
+                        pred_curvatures,
+                        pred_speeds,
+                        fut_start_world,
+                        atan2(obs_ego_velocities[-1][1], obs_ego_velocities[-1][0]), 
+                        pred_len
+                    )
+
+                    # 叠加轨迹
+                    check_flag = OverlayTrajectory(img, pred_traj.tolist(), obs_camera_params[-1], obs_ego_poses[-1], color=(255, 0, 0), args=args)
+
+                    # 计算ADE
+                    fut_ego_traj_world = np.array(fut_ego_traj_world)
+                    ade = np.mean(np.linalg.norm(fut_ego_traj_world[:pred_len] - pred_traj, axis=1))
             
-            pred1_len = min(pred_len, 2)
-            ade1s = np.mean(np.linalg.norm(fut_ego_traj_world[:pred1_len] - pred_traj[1:pred1_len+1], axis=1))
-            ade1s_list.append(ade1s)
-
-            pred2_len = min(pred_len, 4)
-            ade2s = np.mean(np.linalg.norm(fut_ego_traj_world[:pred2_len] - pred_traj[:pred2_len], axis=1))
-            ade2s_list.append(ade2s)
-
-            pred3_len = min(pred_len, 6)
-            ade3s = np.mean(np.linalg.norm(fut_ego_traj_world[:pred3_len] - pred_traj[:pred3_len], axis=1))
-            ade3s_list.append(ade3s)
-
-            # 写入图像
-            if args.plot:
-                cam_images_sequence.append(img.copy())
-                cv2.imwrite(f"{timestamp}/{name}_{i}_front_cam.jpg", img)
+                    pred1_len = min(pred_len, 2)
+                    ade1s = np.mean(np.linalg.norm(fut_ego_traj_world[:pred1_len] - pred_traj[1:pred1_len+1], axis=1))
+                    ade1s_list.append(ade1s)
+
+                    pred2_len = min(pred_len, 4)
+                    ade2s = np.mean(np.linalg.norm(fut_ego_traj_world[:pred2_len] - pred_traj[:pred2_len], axis=1))
+                    ade2s_list.append(ade2s)
+
+                    pred3_len = min(pred_len, 6)
+                    ade3s = np.mean(np.linalg.norm(fut_ego_traj_world[:pred3_len] - pred_traj[:pred3_len], axis=1))
+                    ade3s_list.append(ade3s)
+
+                    # 写入图像
+                    if args.plot:
+                        cam_images_sequence.append(img.copy())
+                        cv2.imwrite(f"{timestamp}/{name}_{i}_front_cam.jpg", img)
                 
-                # 保存六个视角的原始图像
-                cv2.imwrite(f"{timestamp}/{name}_{i}_front.jpg", 
-                        cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[0]), dtype=np.uint8), cv2.IMREAD_COLOR))
-                cv2.imwrite(f"{timestamp}/{name}_{i}_front_left.jpg", 
-                        cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[1]), dtype=np.uint8), cv2.IMREAD_COLOR))
-                cv2.imwrite(f"{timestamp}/{name}_{i}_front_right.jpg", 
-                        cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[2]), dtype=np.uint8), cv2.IMREAD_COLOR))
-                cv2.imwrite(f"{timestamp}/{name}_{i}_back.jpg", 
-                        cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[3]), dtype=np.uint8), cv2.IMREAD_COLOR))
-                cv2.imwrite(f"{timestamp}/{name}_{i}_back_left.jpg", 
-                        cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[4]), dtype=np.uint8), cv2.IMREAD_COLOR))
-                cv2.imwrite(f"{timestamp}/{name}_{i}_back_right.jpg", 
-                        cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[5]), dtype=np.uint8), cv2.IMREAD_COLOR))
-
-                # 绘制轨迹
-                plt.figure(figsize=(8, 6))
-                plt.plot(fut_ego_traj_world[:, 0], fut_ego_traj_world[:, 1], 'r-', label='GT')
-                plt.plot(pred_traj[:, 0], pred_traj[:, 1], 'b-', label='Pred')
-                plt.legend()
-                plt.title(f"Scene: {name}, Frame: {i}, ADE: {ade}")
-                plt.savefig(f"{timestamp}/{name}_{i}_traj.jpg")
-                plt.close()
-
-                # 保存轨迹数据
-                np.save(f"{timestamp}/{name}_{i}_pred_traj.npy", pred_traj)
-                np.save(f"{timestamp}/{name}_{i}_pred_curvatures.npy", pred_curvatures)
-                np.save(f"{timestamp}/{name}_{i}_pred_speeds.npy", pred_speeds)
-
-                # 保存描述信息
-                with open(f"{timestamp}/{name}_{i}_logs.txt", 'w', encoding='utf-8') as f:
-                    f.write(f"Scene Description: {scene_description}\n")
-                    f.write(f"Object Description: {object_description}\n")
-                    f.write(f"Intent Description: {updated_intent}\n")
-                    f.write(f"Average Displacement Error: {ade}\n")
+                        # 保存六个视角的原始图像
+                        cv2.imwrite(f"{timestamp}/{name}_{i}_front.jpg", 
+                                cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[0]), dtype=np.uint8), cv2.IMREAD_COLOR))
+                        cv2.imwrite(f"{timestamp}/{name}_{i}_front_left.jpg", 
+                                cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[1]), dtype=np.uint8), cv2.IMREAD_COLOR))
+                        cv2.imwrite(f"{timestamp}/{name}_{i}_front_right.jpg", 
+                                cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[2]), dtype=np.uint8), cv2.IMREAD_COLOR))
+                        cv2.imwrite(f"{timestamp}/{name}_{i}_back.jpg", 
+                                cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[3]), dtype=np.uint8), cv2.IMREAD_COLOR))
+                        cv2.imwrite(f"{timestamp}/{name}_{i}_back_left.jpg", 
+                                cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[4]), dtype=np.uint8), cv2.IMREAD_COLOR))
+                        cv2.imwrite(f"{timestamp}/{name}_{i}_back_right.jpg", 
+                                cv2.imdecode(np.frombuffer(base64.b64decode(obs_images[5]), dtype=np.uint8), cv2.IMREAD_COLOR))
+
+                        # 绘制轨迹
+                        plt.figure(figsize=(8, 6))
+                        plt.plot(fut_ego_traj_world[:, 0], fut_ego_traj_world[:, 1], 'r-', label='GT')
+                        plt.plot(pred_traj[:, 0], pred_traj[:, 1], 'b-', label='Pred')
+                        plt.legend()
+                        plt.title(f"Scene: {name}, Frame: {i}, ADE: {ade}")
+                        plt.savefig(f"{timestamp}/{name}_{i}_traj.jpg")
+                        plt.close()
+
+                        # 保存轨迹数据
+                        detections.save(f"{timestamp}/{name}_{i}_detections.npz")
+                        np.save(f"{timestamp}/{name}_{i}_pred_traj.npy", pred_traj)
+                        np.save(f"{timestamp}/{name}_{i}_pred_curvatures.npy", pred_curvatures)
+                        np.save(f"{timestamp}/{name}_{i}_pred_speeds.npy", pred_speeds)
+
+                        # 保存描述信息
+                        with open(f"{timestamp}/{name}_{i}_logs.txt", 'w', encoding='utf-8') as f:
+                            f.write(f"Scene Description: {scene_description}\n")
+                            f.write(f"Object Description: {object_description}\n")
+                            f.write(f"Intent Description: {updated_intent}\n")
+                            f.write(f"Average Displacement Error: {ade}\n")
+                            f.write(f"Image Bytes Sent: {image_bytes}\n")
             
-            # 每处理10帧保存一次中间结果
-            if i > 0 and i % 10 == 0:
-                interim_result = {
-                    "name": name,
-                    "token": token,
-                    "frames_processed": i+1,
-                    "ade1s": np.mean(ade1s_list) if ade1s_list else 0,
-                    "ade2s": np.mean(ade2s_list) if ade2s_list else 0,
-                    "ade3s": np.mean(ade3s_list) if ade3s_list else 0,
-                }
+                    # 每处理10帧保存一次中间结果
+                    if i > 0 and i % 10 == 0:
+                        interim_result = {
+                            "name": name,
+                            "token": token,
+                            "frames_processed": i+1,
+                            "ade1s": np.mean(ade1s_list) if ade1s_list else 0,
+                            "ade2s": np.mean(ade2s_list) if ade2s_list else 0,
+                            "ade3s": np.mean(ade3s_list) if ade3s_list else 0,
+                        }
                 
-                with open(f"{timestamp}/interim_results.jsonl", "a") as f:
-                    f.write(json.dumps(interim_result))
-                    f.write("\n")
+                        with open(f"{timestamp}/interim_results.jsonl", "a") as f:
+                            f.write(json.dumps(interim_result))
+                            f.write("\n")
                 
-                print(f"已保存中间结果，当前处理了 {i+1} 帧")
-
-        # 计算并保存最终ADE结果
-        mean_ade1s = np.mean(ade1s_list)
-        mean_ade2s = np.mean(ade2s_list)
-        mean_ade3s = np.mean(ade3s_list)
-        aveg_ade = np.mean([mean_ade1s, mean_ade2s, mean_ade3s])
-
-        result = {
-            "name": name,
-            "token": token,
-            "ade1s": mean_ade1s,
-            "ade2s": mean_ade2s,
-            "ade3s": mean_ade3s,
-            "avgade": aveg_ade
-        }
-
-        with open(f"{timestamp}/ade_results.jsonl", "a") as f:
-            f.write(json.dumps(result))
-            f.write("\n")
+                        print(f"已保存中间结果，当前处理了 {i+1} 帧")
+            finally:
+                # 出错时也停止后台预读
+                camera_images.close()
+
+            # 计算并保存最终ADE结果
+            mean_ade1s = np.mean(ade1s_list)
+            mean_ade2s = np.mean(ade2s_list)
+            mean_ade3s = np.mean(ade3s_list)
+            aveg_ade = np.mean([mean_ade1s, mean_ade2s, mean_ade3s])
+
+            result = {
+                "name": name,
+                "token": token,
+                "ade1s": mean_ade1s,
+                "ade2s": mean_ade2s,
+                "ade3s": mean_ade3s,
+                "avgade": aveg_ade
+            }
 
-        if args.plot:
-            WriteImageSequenceToVideo(cam_images_sequence, f"{timestamp}/{name}")
+            with open(f"{timestamp}/ade_results.jsonl", "a") as f:
+                f.write(json.dumps(result))
+                f.write("\n")
 
+            if args.plot:
+                WriteImageSequenceToVideo(cam_images_sequence, f"{timestamp}/{name}")
+
+            if vlm_cache:
+                print(vlm_cache.report())
+    finally:
+        # 释放SQLite连接
+        if vlm_cache:
+            vlm_cache.close()
@@ -4,6 +4,9 @@ import time
 import random
 import io
 import base64
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 from math import atan2
 import cv2
 import numpy as np
@@ -304,4 +307,112 @@ def WriteImageSequenceToVideo(cam_images_sequence: list, filename):
         video_writer.write(img)
 
     # Release the video writer
-    video_writer.release()
\ No newline at end of file
+    video_writer.release()
+
+def PrepareImagesForVLM(images: list, long_side=0, quality=0, grayscale=False):
+    """ Downscale and re-encode base64 JPEGs before they are sent to the VLM.
+
+    long_side: longest side in pixels, never upscaled (0 keeps the size).
+    quality: JPEG quality of the re-encoded image (0 means 95).
+    Images are returned unchanged when no option is set.
+    """
+    if not long_side and not quality and not grayscale:
+        return list(images)
+
+    prepared = []
+    for image in images:
+        img = cv2.imdecode(np.frombuffer(base64.b64decode(image), dtype=np.uint8),
+                           cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
+        h, w = img.shape[:2]
+        if long_side and max(h, w) > long_side:
+            scale = long_side / max(h, w)
+            img = cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+        elif not quality and not grayscale:
+            # already small enough, keep the original file
+            prepared.append(image)
+            continue
+        _, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality or 95])
+        prepared.append(base64.b64encode(buffer.tobytes()).decode('utf-8'))
+    return prepared
+
+
+class LazyCameraImages:
+    """ Camera images of a scene, read and base64-encoded on demand.
+
+    Only the file paths (and sample_data tokens) of every frame are stored. Indexing returns the
+    base64 images of all cameras of a frame, served from a small LRU cache of frames. Each access
+    prefetches the next `prefetch` frames in a background thread; prefetched frames go into the
+    same cache, and queued prefetches outside the window of the latest access are cancelled.
+    """
+
+    def __init__(self, paths: list, tokens: list = None, cache_size=16, prefetch=4):
+        self.paths = paths  # per frame, one file path per camera
+        self.tokens = tokens
+        self.cache_size = max(1, cache_size)
+        self.prefetch = prefetch
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.lock = threading.RLock()  # RLock: done callbacks may run in the submitting thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="camera-prefetch")
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        window = range(index, min(index + 1 + self.prefetch, len(self)))
+        with self.lock:
+            for j, future in list(self.pending.items()):
+                if j not in window:
+                    future.cancel()  # only queued ones, the done callback drops them from pending
+            for j in window[1:]:
+                self._submit(j)
+        return self._load(index)
+
+    def _read(self, index):
+        images = []
+        for path in self.paths[index]:
+            with open(path, "rb") as image_file:
+                images.append(base64.b64encode(image_file.read()).decode('utf-8'))
+        return images
+
+    def _submit(self, index):
+        if index in self.cache or index in self.pending:
+            return
+        future = self.executor.submit(self._read, index)
+        self.pending[index] = future
+        future.add_done_callback(lambda f: self._prefetched(index, f))
+
+    def _prefetched(self, index, future):
+        with self.lock:
+            if self.pending.get(index) is future:
+                del self.pending[index]
+            if not future.cancelled() and future.exception() is None:
+                self._store(index, future.result())
+
+    def _store(self, index, images):
+        self.cache[index] = images
+        self.cache.move_to_end(index)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _load(self, index):
+        with self.lock:
+            if index in self.cache:
+                self.cache.move_to_end(index)
+                return self.cache[index]
+            future = self.pending.get(index)
+        # read outside the lock, waiting for the prefetch if one is queued or running
+        images = None
+        if future is not None:
+            try:
+                images = future.result()
+            except CancelledError:
+                pass  # dropped from the prefetch window by another access
+        if images is None:
+            images = self._read(index)
+        with self.lock:
+            self._store(index, images)
+        return images
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
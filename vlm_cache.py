@@ -0,0 +1,117 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_MODES = ("readwrite", "readonly", "refresh")
+
+
+class VLMCache:
+    """ Persistent VLM response cache in SQLite, keyed by a hash of the whole request.
+
+    Modes:
+        readwrite: serve hits, store misses.
+        readonly: serve hits, never write (i.e. a shared cache).
+        refresh: never serve hits, overwrite entries with the new responses.
+
+    Entries are evicted least recently used first once the stored responses exceed max_mb.
+    """
+
+    def __init__(self, path, max_mb=1024, mode="readwrite"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown VLM cache mode {mode}, expected one of {', '.join(CACHE_MODES)}")
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # one connection shared by the VLM worker threads, serialized by self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created REAL, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(model_name, sys_message, text, images):
+        """ SHA-256 of the model name, system message, prompt and images (base64 strings map 1:1 to the image bytes). """
+        h = hashlib.sha256()
+        for part in [model_name, sys_message, text or "", *(images or [])]:
+            part = part.encode("utf-8")
+            h.update(len(part).to_bytes(8, "little"))  # length prefix, so parts cannot run into each other
+            h.update(part)
+        return h.hexdigest()
+
+    def get(self, key):
+        """ Cached response or None. """
+        with self.lock:
+            row = None
+            if self.mode != "refresh":
+                row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode == "readwrite":
+                self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+            return row[0]
+
+    def put(self, key, model_name, response):
+        if self.mode == "readonly" or response is None:
+            return
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)", (key, model_name, response, size, now, now)
+            )
+            self.writes += 1
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed, stale = 0, []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        requests = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_mb": size / 1024 / 1024,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"VLM cache ({s['mode']}): {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.0%}), "
+                f"{s['writes']} writes, {s['evictions']} evictions, {s['entries']} entries, {s['size_mb']:.1f} MB")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()